@@ -1,11 +1,16 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status, Response, Cookie
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from . import models, schemas
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import metrics, models, schemas
 from .database import get_db
+from .user_cache import UserCache
 from fastapi.security import APIKeyCookie
 
 # Change these values in production and store them securely
@@ -17,6 +22,42 @@ COOKIE_NAME = "access_token"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
 cookie_scheme = APIKeyCookie(name=COOKIE_NAME, auto_error=False)
 
+# bcrypt takes a few hundred ms of CPU per hash and releases the GIL while it
+# runs. Hashing in a small dedicated pool keeps a burst of logins from
+# stalling the event loop or filling the threadpool FastAPI uses for sync work.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+user_cache = UserCache.from_env()
+
+async def hash_password(password: str) -> str:
+    with metrics.track_stage("password_hash"):
+        return await asyncio.get_running_loop().run_in_executor(
+            _password_executor, models.User.hash_password, password
+        )
+
+async def verify_password(user: models.User, password: str) -> bool:
+    with metrics.track_stage("password_hash"):
+        return await asyncio.get_running_loop().run_in_executor(
+            _password_executor, user.verify_password, password
+        )
+
+def user_snapshot(user: models.User) -> dict:
+    return {column.key: getattr(user, column.key) for column in models.User.__table__.columns}
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def invalidate_cached_user(mapper, connection, target: models.User) -> None:
+    # ORM flushes only; bulk UPDATE statements on users must call user_cache.invalidate
+    user_cache.invalidate(target.id)
+
+def collect_user_cache_metrics():
+    stats = user_cache.stats()
+    return [("auth_user_cache_lookups_total", "counter", "Authenticated user lookups by cache result",
+             [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])])]
+
+metrics.registry.add_collector(collect_user_cache_metrics)
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -76,19 +117,28 @@ async def get_token_from_cookie_or_header(
 
 async def get_current_user(
     token: str = Depends(get_token_from_cookie_or_header),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> models.User:
+    """The token's user as a transient copy, served from user_cache when fresh.
+
+    The object is not attached to ``db``; handlers that modify the user must
+    load it with ``db.get`` first.
+    """
     token_data = verify_token(token)
-    user = db.query(models.User).filter(models.User.id == token_data.user_id).first()
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    return user
+    snapshot = user_cache.get(token_data.user_id)
+    if snapshot is None:
+        user = await db.get(models.User, token_data.user_id)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        snapshot = user_snapshot(user)
+        user_cache.put(user.id, snapshot)
+    return models.User(**snapshot)
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[models.User]:
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if not user or not user.verify_password(password):
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[models.User]:
+    user = await db.scalar(select(models.User).where(models.User.email == email))
+    if not user or not await verify_password(user, password):
         return None
     return user 
\ No newline at end of file
@@ -0,0 +1,227 @@
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from . import rag
+from .retry import is_rate_limit_error, retry_after_seconds, retry_rate_limited
+from .shards import ShardedStore
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_RETRIES = int(os.getenv("BATCH_MAX_RETRIES", "5"))
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "1000"))
+BATCH_K = 15
+
+
+def parse_batch(lines: Iterable[str], default_region: Optional[str] = None,
+                allow_region: bool = True) -> List[Dict[str, Any]]:
+    """Parse JSONL questions: {"query": ..., "id": optional, "region": optional}.
+
+    Plain-text lines are accepted as bare questions. Lines that cannot be
+    used are kept with an ``error`` so they show up in the output.
+    """
+    items = []
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        item: Dict[str, Any] = {"line": line_number, "id": None, "region": default_region}
+        try:
+            record = json.loads(line) if line.startswith("{") else {"query": line}
+            query = record.get("query") or record.get("question")
+            if not isinstance(query, str) or not query.strip():
+                raise ValueError("missing 'query'")
+            item["id"] = record.get("id")
+            item["query"] = query.strip()
+            if allow_region and record.get("region"):
+                item["region"] = record["region"]
+        except (ValueError, AttributeError) as e:
+            item["error"] = f"invalid line: {str(e)}"
+        items.append(item)
+    return items
+
+
+def matrix_search(vectorstore, vectors: np.ndarray, k: int) -> List[List[Tuple[Any, float]]]:
+    """Search many query vectors with one FAISS call per shard.
+
+    Returns, per query, (document, distance) pairs like
+    ``similarity_search_with_score_by_vector``.
+    """
+    if isinstance(vectorstore, ShardedStore):
+        per_shard = [matrix_search(shard, vectors, k) for shard in vectorstore.shards.values()]
+        return [
+            sorted((hit for shard_hits in per_shard for hit in shard_hits[row]), key=lambda hit: hit[1])[:k]
+            for row in range(len(vectors))
+        ]
+
+    queries = np.ascontiguousarray(vectors, dtype=np.float32)
+    if getattr(vectorstore, "_normalize_L2", False):
+        faiss.normalize_L2(queries)
+    distances, labels = vectorstore.index.search(queries, k)
+    results = []
+    for row_distances, row_labels in zip(distances, labels):
+        hits = []
+        for distance, label in zip(row_distances, row_labels):
+            if label == -1:
+                continue
+            doc_id = vectorstore.index_to_docstore_id[int(label)]
+            hits.append((vectorstore.docstore.search(doc_id), float(distance)))
+        results.append(hits)
+    return results
+
+
+class RateLimitGate:
+    """Shared pause for all workers of a batch after a rate-limit response.
+
+    When one request is throttled every worker waits out the same window,
+    instead of each of them hitting the limit again.
+    """
+
+    def __init__(self):
+        self.resume_at = 0.0
+        self.throttled = 0
+
+    async def wait(self) -> None:
+        delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        self.throttled += 1
+        self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+
+async def retrieve_batch(items: List[Dict[str, Any]]) -> None:
+    """Fill in refined_query, query_embedding, retrieved_docs and vectorstore for each item.
+
+    Section lookups skip embedding. Every other refined query goes into one
+    batched embeddings call, and each shard set is searched once with the
+    whole query matrix.
+    """
+    pending = [item for item in items if "error" not in item]
+    for item in pending:
+        # Batch questions carry no history, so the rewrite gate answers locally
+        item["refined_query"] = await rag.atranslate_query(item["query"], None)
+        item["vectorstore"] = await rag.aroute_vectorstore(item["region"])
+        item["query_embedding"] = None
+        item["retrieved_docs"] = rag.section_lookup_documents(item["vectorstore"], item["refined_query"], BATCH_K)
+
+    to_embed = [item for item in pending if not item["retrieved_docs"]]
+    if not to_embed:
+        return
+    queries = [item["refined_query"] for item in to_embed]
+    # Batches embedded before a 429 are in the embedding cache, so a retry only sends the rest
+    vectors = await retry_rate_limited(
+        lambda: rag.embedding_model().aembed_documents(queries), BATCH_MAX_RETRIES, "Batch embeddings"
+    )
+    for item, vector in zip(to_embed, vectors):
+        item["query_embedding"] = vector
+
+    groups: Dict[int, List[Dict[str, Any]]] = {}
+    for item in to_embed:
+        groups.setdefault(id(item["vectorstore"]), []).append(item)
+    for group in groups.values():
+        vectorstore = group[0]["vectorstore"]
+        matrix = np.asarray([item["query_embedding"] for item in group], dtype=np.float32)
+        hits = await asyncio.to_thread(matrix_search, vectorstore, matrix, BATCH_K)
+        for item, item_hits in zip(group, hits):
+            dense_docs = rag.serialize_documents(*zip(*item_hits)) if item_hits else []
+            item["retrieved_docs"] = rag.fuse_lexical_results(vectorstore, item["refined_query"], dense_docs, BATCH_K)
+
+
+async def answer_item(item: Dict[str, Any], semaphore: asyncio.Semaphore, gate: RateLimitGate,
+                      max_retries: int = BATCH_MAX_RETRIES) -> Dict[str, Any]:
+    """Generate one answer, retrying rate-limited calls"""
+    record = {"line": item["line"], "id": item["id"], "query": item.get("query"), "region": item["region"]}
+    if "error" in item:
+        return {**record, "error": item["error"]}
+
+    start = time.perf_counter()
+    async with semaphore:
+        for attempt in range(max_retries + 1):
+            await gate.wait()
+            try:
+                result = await rag.aanswer_from_documents(
+                    item["vectorstore"], item["query"], item["region"], item["refined_query"],
+                    item["query_embedding"], item["retrieved_docs"], None
+                )
+                break
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == max_retries:
+                    return {**record, "error": str(e), "seconds": round(time.perf_counter() - start, 3)}
+                delay = retry_after_seconds(e, attempt)
+                print(f"Batch line {item['line']} rate limited, retrying in {delay:.1f}s")
+                gate.pause(delay)
+
+    return {
+        **record,
+        "refined_query": result["refined_query"],
+        "response": result["response"],
+        "confidence": result["confidence"],
+        "response_type": result["response_type"],
+        "sources": result["sources"],
+        "cache_hit": result["cache_hit"],
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+async def arun_batch(items: List[Dict[str, Any]], concurrency: int = BATCH_CONCURRENCY) -> AsyncIterator[Dict[str, Any]]:
+    """Answer a batch of questions; yields one result per item as it completes"""
+    try:
+        await retrieve_batch(items)
+    except Exception as e:
+        for item in items:
+            item.setdefault("error", f"retrieval failed: {str(e)}")
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    gate = RateLimitGate()
+    tasks = [asyncio.create_task(answer_item(item, semaphore, gate)) for item in items]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def astream_jsonl(items: List[Dict[str, Any]], concurrency: int = BATCH_CONCURRENCY) -> AsyncIterator[str]:
+    async for result in arun_batch(items, concurrency):
+        yield json.dumps(result, default=str) + "\n"
+
+
+async def _main(args) -> None:
+    with open(args.input, "r", encoding="utf-8") as f:
+        items = parse_batch(f, default_region=args.region)
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    start = time.perf_counter()
+    errors = 0
+    # Pipeline logging goes to stderr so stdout stays valid JSONL
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            async for result in arun_batch(items, args.concurrency):
+                errors += "error" in result
+                output.write(json.dumps(result, default=str) + "\n")
+                output.flush()
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        seconds = time.perf_counter() - start
+        print(f"Answered {len(items)} questions ({errors} errors) in {seconds:.1f}s, "
+              f"{len(items) / seconds if seconds else 0:.2f} questions/s")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions")
+    parser.add_argument("input", help="JSONL file, one {\"query\": ...} per line")
+    parser.add_argument("-o", "--output", help="write results here instead of stdout")
+    parser.add_argument("--region", help="default region for lines without one")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,213 @@
+import re
+import threading
+import weakref
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from .text_utils import SECTION_PATTERN, SECTION_SEARCH_PATTERN
+
+# Stored in the index manifest; bump when chunk boundaries or metadata change
+CHUNKER_VERSION = "sections-2"
+CHUNK_SIZE = 2000
+CHUNK_OVERLAP = 200
+
+# Page footers in the guidelines look like "2500-238" followed by "---"
+PAGE_MARKER = re.compile(r"^\s*2500-(\d+)\s*$")
+PAGE_RULE = re.compile(r"^\s*---\s*$")
+HEADING = re.compile(r"^(#{1,6})\s+(.*\S)\s*$")
+
+
+def normalize_section(section_id: str) -> str:
+    return section_id.strip().rstrip(".").lower()
+
+
+def section_ids_in(text: str) -> List[str]:
+    """Section ids that start a line (headings or numbered clauses), in order"""
+    ids = []
+    for line in text.splitlines():
+        match = SECTION_PATTERN.match(line.strip())
+        if match and match.group(1) not in ids:
+            ids.append(match.group(1))
+    return ids
+
+
+def _page_numbers(lines: List[str]) -> List[Optional[int]]:
+    """Page of every line; a footer marker closes the page it names"""
+    pages: List[Optional[int]] = [None] * len(lines)
+    start, last_page = 0, None
+    for idx, line in enumerate(lines):
+        match = PAGE_MARKER.match(line)
+        if match:
+            last_page = int(match.group(1))
+            for line_idx in range(start, idx + 1):
+                pages[line_idx] = last_page
+            start = idx + 1
+    trailing = last_page + 1 if last_page is not None else None
+    for line_idx in range(start, len(lines)):
+        pages[line_idx] = trailing
+    return pages
+
+
+def _blocks(text: str) -> List[Dict[str, Any]]:
+    """Split markdown into heading-delimited blocks with page and section info"""
+    lines = text.splitlines()
+    pages = _page_numbers(lines)
+    blocks: List[Dict[str, Any]] = []
+    current: Dict[str, Any] = {"lines": [], "pages": [], "level": 0, "heading": None}
+
+    for idx, line in enumerate(lines):
+        if PAGE_MARKER.match(line) or (PAGE_RULE.match(line) and idx > 0 and PAGE_MARKER.match(lines[idx - 1])):
+            continue
+        heading = HEADING.match(line)
+        if heading:
+            if any(l.strip() for l in current["lines"]):
+                blocks.append(current)
+            current = {"lines": [], "pages": [], "level": len(heading.group(1)), "heading": heading.group(2)}
+        current["lines"].append(line)
+        current["pages"].append(pages[idx])
+    if any(l.strip() for l in current["lines"]):
+        blocks.append(current)
+
+    for block in blocks:
+        filled = [idx for idx, line in enumerate(block["lines"]) if line.strip()]
+        first, last = filled[0], filled[-1]
+        block["text"] = "\n".join(block["lines"][first:last + 1]).strip()
+        # Page of each line of the text
+        block["line_pages"] = block["pages"][first:last + 1]
+        block["sections"] = section_ids_in(block["text"])
+        known_pages = [page for page in block["pages"] if page is not None]
+        block["page_start"] = known_pages[0] if known_pages else None
+        block["page_end"] = known_pages[-1] if known_pages else None
+    return blocks
+
+
+def _merge_blocks(blocks: List[Dict[str, Any]], chunk_size: int) -> List[List[Dict[str, Any]]]:
+    """Group consecutive small blocks of the same top-level section"""
+    groups: List[List[Dict[str, Any]]] = []
+    size = 0
+    for block in blocks:
+        starts_top_level = block["level"] in (1, 2)
+        if groups and not starts_top_level and size + len(block["text"]) + 2 <= chunk_size:
+            groups[-1].append(block)
+            size += len(block["text"]) + 2
+        else:
+            groups.append([block])
+            size = len(block["text"])
+    return groups
+
+
+def _span_pages(text: str, line_pages: List[Optional[int]], offset: int, piece: str) -> List[int]:
+    """Known pages of the lines of ``text`` that ``piece``, found at ``offset``, covers"""
+    first_line = text.count("\n", 0, offset)
+    last_line = first_line + piece.count("\n")
+    return [page for page in line_pages[first_line:last_line + 1] if page is not None]
+
+
+def split_markdown_sections(document: Document, chunk_size: int = CHUNK_SIZE,
+                            chunk_overlap: int = CHUNK_OVERLAP) -> List[Document]:
+    """Structure-aware chunking on markdown headings and section ids.
+
+    Each chunk holds whole (sub)sections where they fit. Oversized sections
+    are split further with the recursive splitter, and every piece keeps the
+    section it belongs to. Metadata: ``section`` (first section id),
+    ``sections`` (every section id starting a line in the chunk),
+    ``heading``, ``page_number`` and ``page_end`` (the pages that chunk's own
+    lines fall on).
+    """
+    fallback_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    chunks: List[Document] = []
+    last_section = None
+
+    for group in _merge_blocks(_blocks(document.page_content), chunk_size):
+        text = "\n\n".join(block["text"] for block in group)
+        pieces = [text] if len(text) <= chunk_size else fallback_splitter.split_text(text)
+        group_sections = [section for block in group for section in block["sections"]]
+        group_pages = [block[key] for block in group for key in ("page_start", "page_end") if block[key] is not None]
+        # Blocks are joined by a blank line, which belongs to no page
+        line_pages = [page for idx, block in enumerate(group) for page in ([None] if idx else []) + block["line_pages"]]
+
+        search_from = 0
+        for piece in pieces:
+            # Pieces come in order and may overlap, so each is searched for after the previous one's start
+            offset = text.find(piece, search_from)
+            pages = group_pages
+            if offset >= 0:
+                pages = _span_pages(text, line_pages, offset, piece) or group_pages
+                search_from = offset + 1
+            piece_sections = section_ids_in(piece)
+            # A piece cut from the middle of a section belongs to that section
+            section = (piece_sections or group_sections or [last_section])[0]
+            last_section = (piece_sections or group_sections or [last_section])[-1]
+            metadata = dict(document.metadata)
+            metadata.update({
+                "section": section,
+                "sections": piece_sections or ([section] if section else []),
+                "heading": group[0]["heading"],
+                "page_number": pages[0] if pages else None,
+                "page_end": pages[-1] if pages else None,
+            })
+            chunks.append(Document(page_content=piece, metadata=metadata))
+    return chunks
+
+
+class SectionIndex:
+    """Map from section id to the chunks that contain it"""
+
+    def __init__(self, docs: List[Dict[str, Any]]):
+        self.by_section: Dict[str, List[Dict[str, Any]]] = {}
+        for doc in docs:
+            sections = doc["metadata"].get("sections") or section_ids_in(doc["page_content"])
+            for section in sections:
+                self.by_section.setdefault(normalize_section(section), []).append(doc)
+
+    def lookup(self, section_id: str, limit: int = 15) -> List[Dict[str, Any]]:
+        """Chunks for a section: exact match first, then its subsections,
+        and if neither exists, the nearest parent section"""
+        key = normalize_section(section_id)
+        results: List[Dict[str, Any]] = []
+        seen = set()
+
+        def add(docs):
+            for doc in docs:
+                if doc["page_content"] not in seen and len(results) < limit:
+                    seen.add(doc["page_content"])
+                    results.append(doc)
+
+        add(self.by_section.get(key, []))
+        prefix = key + "."
+        for section in sorted(self.by_section):
+            if section.startswith(prefix):
+                add(self.by_section[section])
+
+        parts = key.split(".")
+        while not results and len(parts) > 2:
+            parts = parts[:-1]
+            add(self.by_section.get(".".join(parts), []))
+        return results
+
+
+def cited_sections(query: str) -> List[str]:
+    """Section ids cited anywhere in a query"""
+    return [match.rstrip(".") for match in SECTION_SEARCH_PATTERN.findall(query)]
+
+
+_section_indexes: "weakref.WeakKeyDictionary[Any, SectionIndex]" = weakref.WeakKeyDictionary()
+_section_indexes_lock = threading.Lock()
+
+
+def get_section_index(vectorstore) -> SectionIndex:
+    """Return the section map of a loaded vector store, built on first use"""
+    with _section_indexes_lock:
+        index = _section_indexes.get(vectorstore)
+        if index is None:
+            index = SectionIndex([
+                {"page_content": document.page_content, "metadata": dict(document.metadata)}
+                for document in getattr(vectorstore.docstore, "_dict", {}).values()
+            ])
+            _section_indexes[vectorstore] = index
+        return index
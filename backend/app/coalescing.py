@@ -0,0 +1,86 @@
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from .translation_gate import history_fingerprint, normalize_query
+
+COALESCE_ENABLED = os.getenv("RAG_COALESCE_ENABLED", "true").lower() == "true"
+
+
+def pipeline_key(user_query: str, user_region: Optional[str], conversation_history) -> Tuple[str, str, str]:
+    """Calls with equal keys produce the same answer.
+
+    The history is the bounded window the pipeline actually receives (summary
+    plus recent turns), which feeds both the query rewrite and the answer
+    prompt, so a caller is only ever given an answer built from its own context.
+    """
+    return str(user_region), normalize_query(user_query), history_fingerprint(conversation_history)
+
+
+@dataclass
+class Flight:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class SingleFlight:
+    """Shares one in-flight call among concurrent callers with the same key.
+
+    The first caller starts the call as a task; callers that arrive while it
+    runs await the same task and receive its result or exception. Nothing is
+    kept once the call finishes, so unlike a cache it never serves a stale
+    answer. The task is cancelled only when every caller waiting on it has
+    gone away (for example, all clients disconnected).
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._inflight: Dict[Hashable, Flight] = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return (result, shared); ``shared`` is True for callers that joined another's call"""
+        if not self.enabled:
+            return await call(), False
+
+        flight = self._inflight.get(key)
+        shared = flight is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            flight = self._inflight[key] = Flight(asyncio.create_task(call()))
+            flight.task.add_done_callback(lambda _: self._release(key, flight))
+            self.executions += 1
+
+        flight.waiters += 1
+        self.max_waiters = max(self.max_waiters, flight.waiters)
+        try:
+            return await asyncio.shield(flight.task), shared
+        except asyncio.CancelledError:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Later callers start afresh rather than join a cancelled run
+                self._release(key, flight)
+                flight.task.cancel()
+            raise
+
+    def _release(self, key: Hashable, flight: Flight) -> None:
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self.executions + self.coalesced
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._inflight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / calls, 4) if calls else 0.0,
+            "max_waiters": self.max_waiters,
+        }
+
+
+pipeline_flights = SingleFlight(enabled=COALESCE_ENABLED)
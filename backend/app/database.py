@@ -1,19 +1,110 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import asyncio
+import os
+import weakref
+from contextlib import asynccontextmanager
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./chat.db"
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Any SQLAlchemy URL; plain sqlite:// and postgresql:// URLs get their asyncio driver
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./chat.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+# How long a SQLite writer waits for the lock before failing with "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_database_url(url: str):
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername)
+    return parsed.set(drivername=driver) if driver else parsed
+
+
+def create_engine_from_url(url: str = DATABASE_URL):
+    """Pooled async engine; SQLite connections get WAL mode and tuned pragmas"""
+    parsed = async_database_url(url)
+    sqlite = parsed.get_backend_name() == "sqlite"
+    async_engine = create_async_engine(
+        parsed,
+        echo=DB_ECHO,
+        # A local file has no server to drop idle connections; skip the ping
+        pool_pre_ping=not sqlite,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+
+    if sqlite:
+        @event.listens_for(async_engine.sync_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            # WAL lets readers proceed while one writer commits; NORMAL sync is
+            # safe with WAL and avoids an fsync per transaction
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            cursor.execute("PRAGMA cache_size=-20000")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            cursor.close()
+
+    return async_engine
+
+
+engine = create_engine_from_url()
+# SQLite takes one writer at a time. Queueing commits within the process is
+# fairer than having every connection back off and retry on the file lock,
+# which starves some writers past the busy timeout under load.
+SERIALIZE_WRITES = engine.url.get_backend_name() == "sqlite"
+_write_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+
+
+def _write_lock() -> asyncio.Lock:
+    loop = asyncio.get_running_loop()
+    lock = _write_locks.get(loop)
+    if lock is None:
+        lock = _write_locks[loop] = asyncio.Lock()
+    return lock
+
+
+@asynccontextmanager
+async def serialized_write():
+    """Hold the process-wide SQLite write lock; a no-op on other backends.
+
+    For Core statements run on a connection of their own, which do not go
+    through ChatDBSession.commit.
+    """
+    if not SERIALIZE_WRITES:
+        yield
+        return
+    async with _write_lock():
+        yield
+
+
+class ChatDBSession(AsyncSession):
+    """AsyncSession whose commits (and with autoflush off, all writes) are serialized on SQLite"""
+
+    async def commit(self) -> None:
+        async with serialized_write():
+            await super().commit()
+
+
+# Objects stay usable after commit; attribute refreshes would need an await
+SessionLocal = async_sessionmaker(engine, class_=ChatDBSession, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close() 
\ No newline at end of file
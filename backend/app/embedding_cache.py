@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper backed by a persistent SQLite cache.
+
+    Vectors are stored as float32 blobs keyed on a hash of the model name and
+    the exact text, so unchanged chunks and repeated queries never hit the API
+    again. Cache misses are sent to the wrapped model in batches.
+    """
+
+    def __init__(self, underlying: Embeddings, path: str, namespace: Optional[str] = None,
+                 batch_size: int = 256):
+        self.underlying = underlying
+        self.path = path
+        self.namespace = namespace or getattr(underlying, "model", underlying.__class__.__name__)
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self.api_calls = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+        # Counted once here and kept up to date by _store, so stats() stays cheap to scrape.
+        # Rows other processes add later are not included.
+        self.entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _store(self, items: Dict[str, List[float]]) -> Dict[str, List[float]]:
+        """Persist new vectors; returns them at the stored float32 precision"""
+        arrays = {key: np.asarray(vector, dtype=np.float32) for key, vector in items.items()}
+        with self._lock:
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array.tobytes()) for key, array in arrays.items()]
+            )
+            self._conn.commit()
+            self.entries += max(cursor.rowcount, 0)
+        # Hits and misses must return identical vectors for the same text
+        return {key: array.tolist() for key, array in arrays.items()}
+
+    def _split(self, texts: List[str]):
+        """Return (keys, cached vectors, unique texts that still need embedding)"""
+        keys = [self._key(text) for text in texts]
+        cached = self._lookup(list(set(keys)))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        self.hits += len(texts) - sum(1 for key in keys if key in missing)
+        self.misses += len(missing)
+        return keys, cached, missing
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, cached, missing = self._split(texts)
+        missing_keys = list(missing)
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch_keys = missing_keys[start:start + self.batch_size]
+            vectors = self.underlying.embed_documents([missing[key] for key in batch_keys])
+            self.api_calls += 1
+            cached.update(self._store(dict(zip(batch_keys, vectors))))
+        return [cached[key] for key in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        # SQLite reads and commits block, so they run off the event loop
+        keys, cached, missing = await asyncio.to_thread(self._split, texts)
+        missing_keys = list(missing)
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch_keys = missing_keys[start:start + self.batch_size]
+            vectors = await self.underlying.aembed_documents([missing[key] for key in batch_keys])
+            self.api_calls += 1
+            cached.update(await asyncio.to_thread(self._store, dict(zip(batch_keys, vectors))))
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": self.entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "api_calls": self.api_calls,
+        }
@@ -0,0 +1,144 @@
+import os
+import threading
+import weakref
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .text_utils import SECTION_SEARCH_PATTERN
+
+# Fallback tuning; every tier is bounded by a token budget
+FALLBACK_K = int(os.getenv("FALLBACK_K", "40"))
+FALLBACK_TOKEN_BUDGET = int(os.getenv("FALLBACK_TOKEN_BUDGET", "12000"))
+FULL_DOC_TOKEN_LIMIT = int(os.getenv("FULL_DOC_TOKEN_LIMIT", "60000"))
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken, or estimate at ~4 characters per token"""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("o200k_base")
+                except Exception:
+                    _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def section_of(doc: Dict[str, Any]) -> Optional[str]:
+    """Section id of a chunk: its metadata if present, else the first id in its text"""
+    section = doc["metadata"].get("section")
+    if section:
+        return section
+    match = SECTION_SEARCH_PATTERN.search(doc["page_content"])
+    return match.group(1) if match else None
+
+
+def doc_key(doc: Dict[str, Any]) -> Tuple[Any, Any]:
+    return doc["metadata"].get("source"), doc["metadata"].get("chunk_index")
+
+
+class ChunkNeighborhood:
+    """Position and section lookups over every chunk of a vector store"""
+
+    def __init__(self, vectorstore):
+        self.by_position: Dict[Tuple[Any, int], Dict[str, Any]] = {}
+        self.by_section: Dict[str, List[Dict[str, Any]]] = {}
+        for document in getattr(vectorstore.docstore, "_dict", {}).values():
+            doc = {"page_content": document.page_content, "metadata": dict(document.metadata)}
+            source, chunk_index = doc_key(doc)
+            if chunk_index is not None:
+                self.by_position[(source, chunk_index)] = doc
+            section = section_of(doc)
+            if section:
+                self.by_section.setdefault(section, []).append(doc)
+
+    def neighbors(self, doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+        source, chunk_index = doc_key(doc)
+        if chunk_index is None:
+            return []
+        return [
+            self.by_position[(source, index)]
+            for index in (chunk_index - 1, chunk_index + 1)
+            if (source, index) in self.by_position
+        ]
+
+    def section_siblings(self, doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+        section = section_of(doc)
+        return self.by_section.get(section, []) if section else []
+
+
+_neighborhoods: "weakref.WeakKeyDictionary[Any, ChunkNeighborhood]" = weakref.WeakKeyDictionary()
+_neighborhoods_lock = threading.Lock()
+
+
+def get_neighborhood(vectorstore) -> ChunkNeighborhood:
+    """Return the (cached) neighborhood map of a loaded vector store"""
+    with _neighborhoods_lock:
+        neighborhood = _neighborhoods.get(vectorstore)
+        if neighborhood is None:
+            neighborhood = ChunkNeighborhood(vectorstore)
+            _neighborhoods[vectorstore] = neighborhood
+        return neighborhood
+
+
+def expand_context(vectorstore, retrieved_docs: List[Dict[str, Any]],
+                   wider_docs: List[Dict[str, Any]],
+                   token_budget: int = FALLBACK_TOKEN_BUDGET) -> Tuple[List[Dict[str, Any]], int]:
+    """Widen the context around the original hits within ``token_budget``.
+
+    Candidates are taken in priority order: the original hits, their
+    neighboring chunks, the other chunks of their sections, and finally the
+    results of the wider search. Returns (documents, tokens used).
+    """
+    neighborhood = get_neighborhood(vectorstore)
+    candidates: List[Dict[str, Any]] = list(retrieved_docs)
+    for doc in retrieved_docs:
+        candidates.extend(neighborhood.neighbors(doc))
+    for doc in retrieved_docs:
+        candidates.extend(neighborhood.section_siblings(doc))
+    candidates.extend(wider_docs)
+
+    selected, seen, used = [], set(), 0
+    for doc in candidates:
+        if doc["page_content"] in seen:
+            continue
+        tokens = count_tokens(doc["page_content"])
+        if used + tokens > token_budget:
+            continue
+        seen.add(doc["page_content"])
+        selected.append(doc)
+        used += tokens
+    return selected, used
+
+
+class FullDocumentCache:
+    """Keeps the full guidelines document in memory with its token count.
+
+    The file is re-read only when its modification time changes.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[float, str, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: Path) -> Tuple[str, int]:
+        """Return (text, token count) for ``path``"""
+        key = str(path)
+        mtime = path.stat().st_mtime
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != mtime:
+                text = path.read_text(encoding="utf-8")
+                entry = (mtime, text, count_tokens(text))
+                self._entries[key] = entry
+            return entry[1], entry[2]
+
+
+full_document_cache = FullDocumentCache()
@@ -0,0 +1,94 @@
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .service import rag_service
+
+# Only the most recent messages are sent verbatim; older ones are folded
+# into ChatSession.history_summary
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW_MESSAGES", "10"))
+SUMMARY_BATCH_LIMIT = int(os.getenv("HISTORY_SUMMARY_BATCH", "50"))
+
+# Sessions with a refresh in flight in this process
+_refreshing: Set[str] = set()
+
+
+async def load_conversation_history(db: AsyncSession, session: models.ChatSession,
+                                    until: Optional[datetime] = None) -> List[Dict[str, str]]:
+    """Return the rolling summary plus the last HISTORY_WINDOW messages.
+
+    Uses a LIMIT query, so the cost per turn does not grow with the session.
+    ``until`` leaves out messages sent after the one being answered, for
+    answers generated some time after the question arrived.
+    """
+    query = select(models.Message).where(models.Message.chat_session_id == session.id)
+    if until is not None:
+        query = query.where(models.Message.timestamp <= until)
+    recent = (await db.scalars(query.order_by(models.Message.timestamp.desc()).limit(HISTORY_WINDOW))).all()
+
+    history = [{"role": msg.sender, "content": msg.content} for msg in reversed(recent)]
+    if session.history_summary:
+        history.insert(0, {"role": "summary", "content": session.history_summary})
+    return history
+
+
+async def messages_to_summarize(db: AsyncSession, session: models.ChatSession) -> List[models.Message]:
+    """Messages that have left the window but are not in the summary yet"""
+    oldest_in_window = await db.scalar(select(models.Message).where(
+        models.Message.chat_session_id == session.id
+    ).order_by(models.Message.timestamp.desc()).offset(HISTORY_WINDOW - 1).limit(1))
+    if oldest_in_window is None:
+        return []
+
+    query = select(models.Message).where(
+        models.Message.chat_session_id == session.id,
+        models.Message.timestamp < oldest_in_window.timestamp
+    )
+    if session.summarized_until is not None:
+        query = query.where(models.Message.timestamp > session.summarized_until)
+    return (await db.scalars(query.order_by(models.Message.timestamp.asc()).limit(SUMMARY_BATCH_LIMIT))).all()
+
+
+async def refresh_history_summary(chat_session_id: str) -> None:
+    """Fold messages that left the history window into the session summary.
+
+    Runs as a background task after the response has been sent, with its own
+    database session. A refresh already running for the session in this
+    process makes this one a no-op, and the summary is only written if no
+    other process folded the same messages in the meantime.
+    """
+    from .database import SessionLocal, engine, serialized_write
+
+    if chat_session_id in _refreshing:
+        return
+    _refreshing.add(chat_session_id)
+    try:
+        async with SessionLocal() as db:
+            session = await db.get(models.ChatSession, chat_session_id)
+            if session is None:
+                return
+            evicted = await messages_to_summarize(db, session)
+            if not evicted:
+                return
+            previous_summary = session.history_summary
+            previous_until = session.summarized_until
+            turns = [{"role": msg.sender, "content": msg.content} for msg in evicted]
+            summarized_until = evicted[-1].timestamp
+            # Return the connection to the pool for the duration of the model call
+            await db.rollback()
+
+        summary = await rag_service.asummarize_history(previous_summary, turns)
+        async with serialized_write(), engine.begin() as conn:
+            await conn.execute(update(models.ChatSession).where(
+                models.ChatSession.id == chat_session_id,
+                models.ChatSession.summarized_until.is_(None) if previous_until is None
+                else models.ChatSession.summarized_until == previous_until
+            ).values(history_summary=summary, summarized_until=summarized_until))
+    except Exception as e:
+        print(f"Error updating history summary: {str(e)}")
+    finally:
+        _refreshing.discard(chat_session_id)
@@ -0,0 +1,146 @@
+import math
+import os
+from typing import Any, Dict, List, Optional
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+# flat (exact, default), hnsw, ivf, ivfpq, sq8, ivfsq8, or any faiss.index_factory string
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+# Matryoshka truncation of text-embedding-3 vectors (e.g. 256 or 1024); 0 keeps every dimension
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "0"))
+# Search-time knobs; 0 lets the factory pick from the index size
+FAISS_NLIST = int(os.getenv("FAISS_NLIST", "0"))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "8"))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "0"))
+
+
+class TruncatedEmbeddings(Embeddings):
+    """Keeps the first ``dimensions`` components of each vector and re-normalizes.
+
+    text-embedding-3 models are trained so that prefixes of the embedding are
+    embeddings themselves, so this trades a little recall for a much smaller
+    index. Wrap the cached model so the cache keeps full vectors and every
+    truncation setting shares it.
+    """
+
+    def __init__(self, underlying: Embeddings, dimensions: int):
+        self.underlying = underlying
+        self.dimensions = dimensions
+
+    def _truncate(self, vectors: List[List[float]]) -> List[List[float]]:
+        array = np.asarray(vectors, dtype=np.float32)[:, :self.dimensions]
+        norms = np.linalg.norm(array, axis=1, keepdims=True)
+        return (array / np.where(norms == 0, 1, norms)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._truncate(self.underlying.embed_documents(texts)) if texts else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._truncate([self.underlying.embed_query(text)])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._truncate(await self.underlying.aembed_documents(texts)) if texts else []
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self._truncate([await self.underlying.aembed_query(text)])[0]
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.underlying.stats() if hasattr(self.underlying, "stats") else {}
+        return {**stats, "dimensions": self.dimensions}
+
+
+def truncate_embeddings(embeddings: Embeddings, dimensions: int = EMBEDDING_DIMENSIONS) -> Embeddings:
+    return TruncatedEmbeddings(embeddings, dimensions) if dimensions else embeddings
+
+
+def factory_string(index_type: str, d: int, n: int, nlist: int = FAISS_NLIST,
+                   hnsw_m: int = FAISS_HNSW_M, pq_m: int = FAISS_PQ_M) -> str:
+    """Translate an index type into a faiss.index_factory description.
+
+    IVF list counts and PQ code sizes are derived from the number of vectors
+    so small corpora can still be trained (k-means needs more points than
+    centroids).
+    """
+    index_type = index_type.lower()
+    lists = nlist or max(1, min(int(4 * math.sqrt(n)), n // 39 or 1))
+    # PQ sub-quantizers must divide d; aim for 8-dimensional sub-vectors
+    sub_quantizers = pq_m or max(m for m in range(1, min(d, 64) + 1) if d % m == 0 and d // m >= 8)
+    pq_bits = max(1, min(8, int(math.log2(max(n // 39, 2)))))
+
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m}"
+    if index_type == "ivf":
+        return f"IVF{lists},Flat"
+    if index_type == "ivfpq":
+        return f"IVF{lists},PQ{sub_quantizers}x{pq_bits}"
+    if index_type == "pq":
+        return f"PQ{sub_quantizers}x{pq_bits}"
+    if index_type == "sq8":
+        return "SQ8"
+    if index_type == "ivfsq8":
+        return f"IVF{lists},SQ8"
+    # Anything else is passed through as a raw factory string
+    return index_type
+
+
+def configure_search(index, nprobe: int = FAISS_NPROBE, ef_search: int = FAISS_EF_SEARCH) -> None:
+    """Apply search-time parameters to a built or freshly loaded index"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        hnsw.efSearch = ef_search
+
+
+def build_index(vectors: np.ndarray, index_type: str = FAISS_INDEX_TYPE, add: bool = True, **kwargs):
+    """Create and train a FAISS index (L2 metric, like the default flat index)"""
+    n, d = vectors.shape
+    index = faiss.index_factory(d, factory_string(index_type, d, n, **kwargs), faiss.METRIC_L2)
+    if not index.is_trained:
+        index.train(vectors)
+    if add:
+        index.add(vectors)
+    configure_search(index)
+    return index
+
+
+def create_faiss(documents: List[Document], embeddings: Embeddings, ids: Optional[List[str]] = None,
+                 index_type: str = FAISS_INDEX_TYPE) -> FAISS:
+    """Build a LangChain FAISS store over ``documents`` with the configured index"""
+    if index_type.lower() == "flat":
+        return FAISS.from_documents(documents=documents, embedding=embeddings, ids=ids)
+
+    texts = [doc.page_content for doc in documents]
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    vectorstore = FAISS(
+        embedding_function=embeddings,
+        index=build_index(vectors, index_type, add=False),
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={}
+    )
+    vectorstore.add_embeddings(
+        list(zip(texts, vectors.tolist())),
+        metadatas=[doc.metadata for doc in documents],
+        ids=ids
+    )
+    return vectorstore
+
+
+def supports_removal(index) -> bool:
+    """HNSW graphs cannot delete vectors; such indexes are rebuilt instead"""
+    return getattr(faiss.downcast_index(index), "hnsw", None) is None
+
+
+def index_description(index_type: str = FAISS_INDEX_TYPE, dimensions: int = EMBEDDING_DIMENSIONS) -> str:
+    """Identifies the index layout in the manifest; a change forces a rebuild"""
+    return f"{index_type.lower()}/{dimensions or 'full'}"
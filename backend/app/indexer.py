@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_community.document_loaders import TextLoader
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from .index_factory import create_faiss, index_description, supports_removal
+from .persistence import save_store
+
+MANIFEST_NAME = "manifest.json"
+# Bump when the way chunk ids are derived changes; a mismatch re-chunks every source once
+CHUNK_ID_VERSION = "source-text/1"
+
+
+def file_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def chunk_hash(source: str, page_content: str, occurrence: int = 0) -> str:
+    """Id of a chunk from its source and text only.
+
+    Positional metadata (chunk index, page numbers) is left out so that an
+    edit near the top of a file does not change the ids of the chunks after
+    it. ``occurrence`` tells apart repeated identical chunks of one source.
+    """
+    payload = source + "\0" + page_content
+    if occurrence:
+        payload += f"\0{occurrence}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class IncrementalIndexer:
+    """Keeps a FAISS index in step with its source documents.
+
+    A manifest saved next to the index records, per source file, the file hash
+    and the content hashes of its chunks (which double as docstore ids). A sync
+    only re-splits files whose hash changed and applies the resulting chunk
+    adds and deletes to the index, so its cost follows the size of the edit
+    rather than the size of the corpus. Chunks that survive an edit keep their
+    vectors; only their positional metadata is refreshed.
+    """
+
+    def __init__(self, index_path: str, sources: List[Path], embeddings,
+                 prepare_documents: Callable[[List[Document]], List[Document]],
+                 docs_root: Optional[Path] = None, chunker_version: Optional[str] = None,
+                 index_type: str = "flat", index_layout: Optional[str] = index_description("flat", 0)):
+        self.index_path = index_path
+        self.sources = sources
+        self.embeddings = embeddings
+        self.prepare_documents = prepare_documents
+        self.docs_root = docs_root
+        # Changing how files are split invalidates every source's chunks
+        self.chunker_version = chunker_version
+        # Changing the index type or vector dimensions needs a fresh index
+        self.index_type = index_type
+        self.index_layout = index_layout
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.index_path, MANIFEST_NAME)
+
+    def load_manifest(self) -> Dict[str, Any]:
+        if not os.path.exists(self.manifest_path):
+            return {"sources": {}}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_manifest(self, manifest: Dict[str, Any]) -> None:
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def source_name(self, path: Path) -> str:
+        if self.docs_root is not None:
+            try:
+                return path.resolve().relative_to(self.docs_root.resolve()).as_posix()
+            except ValueError:
+                pass
+        return path.name
+
+    def prepare_source(self, path: Path) -> Dict[str, Document]:
+        """Split one source file into chunks keyed by content hash"""
+        name = self.source_name(path)
+        documents = TextLoader(str(path), encoding="utf-8").load()
+        for doc in documents:
+            doc.metadata["source"] = name
+        chunks = {}
+        occurrences: Dict[str, int] = {}
+        for split in self.prepare_documents(documents):
+            split.metadata["document_id"] = name
+            base = chunk_hash(name, split.page_content)
+            occurrence = occurrences.get(base, 0)
+            occurrences[base] = occurrence + 1
+            chunks[chunk_hash(name, split.page_content, occurrence)] = split
+        return chunks
+
+    def sync(self, vectorstore: Optional[FAISS]) -> Tuple[FAISS, Dict[str, Any]]:
+        """Bring ``vectorstore`` up to date with the sources and save it.
+
+        ``vectorstore`` is modified in place, so pass a private copy rather
+        than an instance that is serving queries. Without a manifest (e.g. an
+        index built before incremental indexing) the index is rebuilt once.
+        """
+        start = time.perf_counter()
+        manifest = self.load_manifest()
+        full_rebuild = vectorstore is None or not manifest["sources"] or manifest.get("index", index_description("flat", 0)) != self.index_layout
+        rechunk = (manifest.get("chunker") != self.chunker_version
+                   or manifest.get("chunk_ids") != CHUNK_ID_VERSION)
+
+        old_sources = {} if full_rebuild else manifest["sources"]
+        new_sources: Dict[str, Dict[str, Any]] = {}
+        new_chunks: Dict[str, Document] = {}
+        unchanged = 0
+
+        for path in self.sources:
+            name = self.source_name(path)
+            digest = file_hash(path)
+            previous = old_sources.get(name)
+            if previous and previous["sha256"] == digest and not rechunk:
+                new_sources[name] = previous
+                unchanged += 1
+                continue
+            chunks = self.prepare_source(path)
+            new_chunks.update(chunks)
+            new_sources[name] = {"sha256": digest, "chunks": list(chunks)}
+
+        old_ids = {chunk for entry in old_sources.values() for chunk in entry["chunks"]}
+        new_ids = {chunk for entry in new_sources.values() for chunk in entry["chunks"]}
+        to_delete = sorted(old_ids - new_ids)
+        to_add = [chunk for chunk in new_chunks if chunk not in old_ids]
+        refreshed: List[str] = []
+
+        if full_rebuild:
+            if not new_chunks:
+                raise ValueError("No documents were successfully processed")
+            vectorstore = create_faiss(list(new_chunks.values()), self.embeddings, list(new_chunks), self.index_type)
+        else:
+            docstore = vectorstore.docstore._dict
+            # Kept chunks of an edited file may have moved; update them in place
+            refreshed = [
+                chunk for chunk, doc in new_chunks.items()
+                if chunk in docstore and docstore[chunk].metadata != doc.metadata
+            ]
+            for chunk in refreshed:
+                docstore[chunk] = new_chunks[chunk]
+
+            if to_delete and not supports_removal(vectorstore.index):
+                # Rebuild from the kept chunks; their embeddings come from the cache
+                kept = {chunk: docstore[chunk] for chunk in sorted(old_ids - set(to_delete)) if chunk in docstore}
+                kept.update({chunk: new_chunks[chunk] for chunk in to_add})
+                vectorstore = create_faiss(list(kept.values()), self.embeddings, list(kept), self.index_type)
+            else:
+                if to_delete:
+                    vectorstore.delete(ids=to_delete)
+                if to_add:
+                    vectorstore.add_documents([new_chunks[chunk] for chunk in to_add], ids=to_add)
+
+        changed = (full_rebuild or rechunk or bool(to_delete or to_add or refreshed)
+                   or new_sources.keys() != old_sources.keys())
+        if changed:
+            save_store(vectorstore, self.index_path)
+            self.save_manifest({
+                "sources": new_sources,
+                "chunker": self.chunker_version,
+                "chunk_ids": CHUNK_ID_VERSION,
+                "index": self.index_layout,
+            })
+
+        report = {
+            "full_rebuild": full_rebuild,
+            "added": len(new_chunks) if full_rebuild else len(to_add),
+            "deleted": len(to_delete),
+            "refreshed": len(refreshed),
+            "unchanged_sources": unchanged,
+            "changed": changed,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+        print(f"Index sync: {report}")
+        return vectorstore, report
+
+
+if __name__ == "__main__":
+    # Sync the saved index with the documents in docs/
+    from . import rag
+
+    _, sync_report = rag.sync_vectorstore()
+    print(json.dumps(sync_report, indent=2))
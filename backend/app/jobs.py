@@ -0,0 +1,358 @@
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import metrics, models
+from .database import SessionLocal, engine, serialized_write
+from .history import load_conversation_history, refresh_history_summary
+from .retry import retry_after_seconds
+from .service import rag_service
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Running jobs renew their lease this often; one not renewed for JOB_STALE_SECONDS
+# belonged to a worker that died and is queued again
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "90"))
+JOB_RECOVER_INTERVAL = float(os.getenv("JOB_RECOVER_INTERVAL", "30"))
+
+PENDING, RUNNING, COMPLETE, FAILED = "pending", "running", "complete", "failed"
+TERMINAL = (COMPLETE, FAILED)
+
+job_results = metrics.registry.counter(
+    "answer_jobs_total", "Answer job attempts by outcome (complete, retried, failed, error)", ("result",)
+)
+
+
+def add_ai_message(db: AsyncSession, session: models.ChatSession, rag_response: Dict[str, Any],
+                   message_id: Optional[str] = None) -> Dict[str, Any]:
+    """Stage the assistant's answer on ``db`` and return it as an AIMessageResponse dict"""
+    ai_message = models.Message(
+        id=message_id or str(uuid.uuid4()),
+        content=rag_response["response"],
+        sender="assistant",
+        chat_session_id=session.id,
+        timestamp=datetime.utcnow()
+    )
+    db.add(ai_message)
+
+    # Update session again with AI's message
+    session.last_message = rag_response["response"]
+    session.updated_at = datetime.utcnow()
+
+    return {
+        "id": ai_message.id,
+        "content": ai_message.content,
+        "sender": ai_message.sender,
+        "timestamp": ai_message.timestamp,
+        "chatSessionId": ai_message.chat_session_id,
+        "metadata": {
+            "confidence": rag_response["confidence"],
+            "response_type": rag_response["response_type"],
+            "sources": rag_response["sources"]
+        }
+    }
+
+
+async def save_ai_message(db: AsyncSession, session: models.ChatSession, rag_response: Dict[str, Any]) -> Dict[str, Any]:
+    """Persist the assistant's answer and return it as an AIMessageResponse dict"""
+    ai_response = add_ai_message(db, session, rag_response)
+    with metrics.track_stage("db_write"):
+        await db.commit()
+    return ai_response
+
+
+def new_job(chat_session_id: str, user_message_id: str, query: str, user_region: str) -> models.AnswerJob:
+    """Pending job answering a user message; commit it together with the message"""
+    now = datetime.utcnow()
+    return models.AnswerJob(
+        id=str(uuid.uuid4()),
+        chat_session_id=chat_session_id,
+        user_message_id=user_message_id,
+        query=query,
+        user_region=user_region,
+        status=PENDING,
+        attempts=0,
+        created_at=now,
+        updated_at=now,
+    )
+
+
+def job_to_dict(job: models.AnswerJob) -> Dict[str, Any]:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "error": job.error,
+        "chatSessionId": job.chat_session_id,
+        "aiResponse": json.loads(job.result) if job.result else None,
+    }
+
+
+class AnswerQueue:
+    """Generates assistant answers outside the request that asked for them.
+
+    Jobs are rows in answer_jobs, written in the same transaction as the
+    user's message, so a restart loses nothing: on start, pending jobs and
+    running ones whose process died are queued again. An asyncio queue feeds
+    ``workers`` tasks, which bounds how many answers are generated at once.
+    A running job renews its lease (``updated_at``) every
+    ``heartbeat_seconds``; every ``recover_interval`` running jobs whose
+    lease lapsed are queued again, whichever process they belonged to. A
+    failed attempt goes back to pending with its error and is retried after
+    a backoff, up to ``max_attempts``. The answer and the job's completion
+    are committed together.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_attempts: int = JOB_MAX_ATTEMPTS,
+                 stale_seconds: float = JOB_STALE_SECONDS, heartbeat_seconds: float = JOB_HEARTBEAT_SECONDS,
+                 recover_interval: float = JOB_RECOVER_INTERVAL):
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.stale_seconds = stale_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.recover_interval = recover_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._background: Set[asyncio.Task] = set()
+        self._running: Set[str] = set()
+        self._waiters: Dict[str, asyncio.Event] = {}
+        self.submitted = 0
+        self.recovered = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self.errors = 0
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        for job_id in await self._recover():
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._recover_periodically()))
+
+    async def stop(self) -> None:
+        # Interrupted jobs are picked up again by the next start, without losing an attempt
+        interrupted = list(self._running)
+        tasks = self._tasks + list(self._background)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        if interrupted:
+            await self._update(interrupted, status=PENDING, attempts=models.AnswerJob.attempts - 1)
+        self._queue = None
+
+    def submit(self, job_id: str) -> None:
+        """Queue a committed job; without a running queue it waits for the next start"""
+        self.submitted += 1
+        if self._queue is not None:
+            self._queue.put_nowait(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> None:
+        """Return when a job run by this process finishes, or after ``timeout``"""
+        event = self._waiters.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            if not event.is_set() and self._waiters.get(job_id) is event:
+                # Jobs of other processes are never signalled here; callers re-check the database
+                del self._waiters[job_id]
+
+    async def _recover(self, include_pending: bool = True) -> List[str]:
+        """Return running jobs whose lease lapsed to pending; returns the ids to queue.
+
+        At start every pending job is queued too. Later passes leave pending
+        jobs alone, as they are either queued already or waiting out a retry
+        backoff.
+        """
+        stale_before = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        stale = (models.AnswerJob.status == RUNNING, models.AnswerJob.updated_at < stale_before)
+        async with serialized_write(), engine.begin() as conn:
+            job_ids = list((await conn.scalars(select(models.AnswerJob.id).where(*stale))).all())
+            if job_ids:
+                await conn.execute(update(models.AnswerJob).where(
+                    models.AnswerJob.id.in_(job_ids), *stale
+                ).values(status=PENDING, updated_at=datetime.utcnow()))
+            if include_pending:
+                job_ids = list((await conn.scalars(select(models.AnswerJob.id).where(
+                    models.AnswerJob.status == PENDING
+                ).order_by(models.AnswerJob.created_at))).all())
+        self.recovered += len(job_ids)
+        if job_ids:
+            print(f"Queued {len(job_ids)} unfinished answer jobs")
+        return job_ids
+
+    async def _recover_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.recover_interval)
+            try:
+                for job_id in await self._recover(include_pending=False):
+                    self._queue.put_nowait(job_id)
+            except Exception as e:
+                print(f"Answer job recovery failed: {str(e)}")
+
+    async def _heartbeat(self, job_id: str) -> None:
+        """Renew a running job's lease until cancelled"""
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                async with serialized_write(), engine.begin() as conn:
+                    await conn.execute(update(models.AnswerJob).where(
+                        models.AnswerJob.id == job_id,
+                        models.AnswerJob.status == RUNNING
+                    ).values(updated_at=datetime.utcnow()))
+            except Exception:
+                # The next beat tries again; a lease that lapses only means the job may run twice
+                pass
+
+    async def _update(self, job_ids: List[str], **values: Any) -> int:
+        async with serialized_write(), engine.begin() as conn:
+            result = await conn.execute(update(models.AnswerJob).where(
+                models.AnswerJob.id.in_(job_ids)
+            ).values(updated_at=datetime.utcnow(), **values))
+        return result.rowcount
+
+    async def _claim(self, job_id: str) -> Optional[int]:
+        """Mark a pending job running and return its attempt number; None if another worker or process has it"""
+        async with serialized_write(), engine.begin() as conn:
+            result = await conn.execute(update(models.AnswerJob).where(
+                models.AnswerJob.id == job_id,
+                models.AnswerJob.status == PENDING
+            ).values(status=RUNNING, attempts=models.AnswerJob.attempts + 1, updated_at=datetime.utcnow()))
+            if result.rowcount != 1:
+                return None
+            return await conn.scalar(select(models.AnswerJob.attempts).where(models.AnswerJob.id == job_id))
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                # Claiming or recording the outcome failed, so the database is
+                # unreachable; a pending job is tried again, a running one is
+                # picked up by recovery once its lease lapses
+                self.errors += 1
+                job_results.inc(result="error")
+                self._spawn(self._requeue_later(job_id, retry_after_seconds(e, 0)))
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        attempts = await self._claim(job_id)
+        if attempts is None:
+            return
+        self._running.add(job_id)
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            async with SessionLocal() as db:
+                try:
+                    job = await db.get(models.AnswerJob, job_id)
+                    session = await db.get(models.ChatSession, job.chat_session_id) if job else None
+                    if session is None:
+                        # The chat session was deleted; its jobs went with it
+                        return
+                    chat_session_id = session.id
+                    query, user_region = job.query, job.user_region
+                    user_message = await db.get(models.Message, job.user_message_id)
+                    conversation_history = await load_conversation_history(
+                        db, session, until=user_message.timestamp if user_message else None
+                    )
+                    # Return the connection to the pool for the duration of generation
+                    await db.rollback()
+
+                    rag_response = await rag_service.aprocess_query(
+                        user_query=query,
+                        user_region=user_region,
+                        conversation_history=conversation_history
+                    )
+
+                    # The rollback expired both rows; either may have been deleted since
+                    session = await db.get(models.ChatSession, chat_session_id)
+                    job = await db.get(models.AnswerJob, job_id)
+                    if session is None or job is None:
+                        return
+                    ai_response = add_ai_message(db, session, rag_response, message_id=job.id)
+                    job.status = COMPLETE
+                    job.error = None
+                    job.result = json.dumps(jsonable_encoder(ai_response))
+                    job.updated_at = datetime.utcnow()
+                    with metrics.track_stage("db_write"):
+                        await db.commit()
+                except Exception as e:
+                    await db.rollback()
+                    await self._fail(job_id, attempts, e)
+                    return
+
+            self.completed += 1
+            job_results.inc(result=COMPLETE)
+            self._notify(job_id)
+            self._spawn(refresh_history_summary(chat_session_id))
+        finally:
+            heartbeat.cancel()
+            self._running.discard(job_id)
+
+    async def _fail(self, job_id: str, attempts: int, error: Exception) -> None:
+        if attempts < self.max_attempts:
+            delay = retry_after_seconds(error, attempts - 1)
+            await self._update([job_id], status=PENDING, error=str(error))
+            self.retried += 1
+            job_results.inc(result="retried")
+            self._spawn(self._requeue_later(job_id, delay))
+            return
+
+        await self._update([job_id], status=FAILED, error=str(error))
+        self.failed += 1
+        job_results.inc(result=FAILED)
+        self._notify(job_id)
+
+    async def _requeue_later(self, job_id: str, delay: float) -> None:
+        await asyncio.sleep(delay)
+        if self._queue is not None:
+            self._queue.put_nowait(job_id)
+
+    def _spawn(self, coroutine) -> None:
+        task = asyncio.create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _notify(self, job_id: str) -> None:
+        event = self._waiters.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": len(self._running),
+            "submitted": self.submitted,
+            "recovered": self.recovered,
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "errors": self.errors,
+        }
+
+
+answer_queue = AnswerQueue()
+
+
+def collect_queue_metrics():
+    stats = answer_queue.stats()
+    return [
+        ("answer_jobs_queued", "gauge", "Answer jobs waiting for a worker", [({}, stats["queued"])]),
+        ("answer_jobs_running", "gauge", "Answer jobs being generated", [({}, stats["running"])]),
+    ]
+
+metrics.registry.add_collector(collect_queue_metrics)
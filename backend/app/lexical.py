@@ -0,0 +1,112 @@
+import math
+import os
+import threading
+import weakref
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+from .text_utils import SECTION_TOKEN_PATTERN, STOPWORDS, TOKEN_PATTERN, tokenize
+
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+
+def is_section_lookup(query: str) -> bool:
+    """True when a query is mostly section numbers (e.g. "2516.03.A" or "what does 2516.03 say")"""
+    words = [token for token in TOKEN_PATTERN.findall(query.lower()) if token not in STOPWORDS]
+    sections = [token for token in words if SECTION_TOKEN_PATTERN.match(token)]
+    return bool(sections) and len(sections) * 2 >= len(words)
+
+
+class BM25Index:
+    """In-memory inverted index with Okapi BM25 scoring"""
+
+    def __init__(self, docs: List[Dict[str, Any]], k1: float = 1.5, b: float = 0.75):
+        self.docs = docs
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lengths: List[int] = []
+
+        for doc_idx, doc in enumerate(docs):
+            counts = Counter(tokenize(doc["page_content"]))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((doc_idx, tf))
+
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        total = len(docs)
+        self.idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def search(self, query: str, k: int = 15) -> List[Tuple[Dict[str, Any], float]]:
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term]
+            for doc_idx, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_idx] / (self.avg_length or 1))
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.docs[doc_idx], score) for doc_idx, score in ranked]
+
+
+_indexes: "weakref.WeakKeyDictionary[Any, BM25Index]" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def get_bm25_index(vectorstore) -> BM25Index:
+    """Return the BM25 index over the chunks of a loaded vector store.
+
+    Built on first use from the same docstore FAISS searches and dropped
+    together with the vector store when it is swapped out.
+    """
+    with _indexes_lock:
+        index = _indexes.get(vectorstore)
+        if index is None:
+            docs = [
+                {"page_content": document.page_content, "metadata": dict(document.metadata)}
+                for document in getattr(vectorstore.docstore, "_dict", {}).values()
+            ]
+            index = BM25Index(docs)
+            _indexes[vectorstore] = index
+        return index
+
+
+def lexical_search(vectorstore, query: str, k: int = 15) -> List[Dict[str, Any]]:
+    """BM25 search over the vector store's chunks, serialized like dense results"""
+    return [
+        {
+            "page_content": doc["page_content"],
+            "metadata": dict(doc["metadata"]),
+            "score": None,
+            "bm25_score": score,
+        }
+        for doc, score in get_bm25_index(vectorstore).search(query, k)
+    ]
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict[str, Any]]], k: int = 15,
+                           rrf_k: int = RRF_K) -> List[Dict[str, Any]]:
+    """Merge ranked lists by summing 1 / (rrf_k + rank) per chunk"""
+    fused: Dict[str, Dict[str, Any]] = {}
+    scores: Dict[str, float] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = doc["page_content"]
+            if key not in fused:
+                fused[key] = dict(doc)
+            else:
+                # Keep whichever scores the other retrievers reported
+                for field, value in doc.items():
+                    if fused[key].get(field) is None:
+                        fused[key][field] = value
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+
+    ranked = sorted(fused, key=lambda key: scores[key], reverse=True)[:k]
+    return [{**fused[key], "rrf_score": scores[key]} for key in ranked]
@@ -1,20 +1,54 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Response
+from fastapi import FastAPI, Depends, HTTPException, status, Response, BackgroundTasks, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from . import models, schemas, auth
-from .database import engine, get_db
-from typing import List, Dict, Any
+from .database import engine, get_db, SessionLocal
+from typing import List, Dict, Any, Optional
 from datetime import datetime
+import json
+import asyncio
+import time
+from contextlib import asynccontextmanager
 import uuid
 
-# Import our RAG module
-from . import rag
+# The RAG subsystem is imported lazily by the service; see service.py
+from . import metrics
+from .service import rag_service
+from .history import load_conversation_history, refresh_history_summary
+from .migrations import init_database
+from .jobs import answer_queue, new_job, job_to_dict, save_ai_message, TERMINAL
+from .pagination import MESSAGES_PAGE_SIZE, SESSIONS_PAGE_SIZE, MAX_PAGE_SIZE, rows_after, page_rows
+from .shards import SHARD_EVICT_INTERVAL
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create database tables and apply pending migrations
+    await init_database(engine, models.Base.metadata)
+    # Import the models and load the FAISS index once so requests only pay for the search
+    await rag_service.start()
+    # Answer generation workers; also requeues jobs left unfinished by a previous run
+    await answer_queue.start()
+    eviction_task = asyncio.create_task(evict_idle_shards_periodically())
+    yield
+    eviction_task.cancel()
+    await answer_queue.stop()
+    await rag_service.stop()
+    await engine.dispose()
 
-app = FastAPI()
+async def evict_idle_shards_periodically():
+    """Release region shards nobody has searched for a while"""
+    while True:
+        await asyncio.sleep(SHARD_EVICT_INTERVAL)
+        try:
+            rag_service.evict_idle_shards()
+        except Exception as e:
+            print(f"Shard eviction failed: {str(e)}")
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -31,17 +65,17 @@ app.add_middleware(
 async def register(
     user: schemas.UserCreate,
     response: Response,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # Check if email already exists
-    if db.query(models.User).filter(models.User.email == user.email).first():
+    if await db.scalar(select(models.User.id).where(models.User.email == user.email)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
     # Check if username already exists
-    if db.query(models.User).filter(models.User.username == user.username).first():
+    if await db.scalar(select(models.User.id).where(models.User.username == user.username)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already taken"
@@ -53,11 +87,11 @@ async def register(
         email=user.email,
         username=user.username,
         region=user.region,
-        hashed_password=models.User.hash_password(user.password)
+        hashed_password=await auth.hash_password(user.password)
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
 
     # Create and set access token cookie
     access_token = auth.create_access_token(
@@ -71,9 +105,9 @@ async def register(
 async def login(
     response: Response,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = auth.authenticate_user(db, form_data.username, form_data.password)
+    user = await auth.authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -113,12 +147,22 @@ async def get_current_user_info(
 # Protected chat endpoints
 @app.get("/api/chat-sessions", response_model=List[schemas.ChatSession])
 async def get_chat_sessions(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(SESSIONS_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    sessions = db.query(models.ChatSession).filter(
-        models.ChatSession.user_id == current_user.id
-    ).order_by(models.ChatSession.updated_at.desc()).all()
+    """Most recently updated sessions first; older pages via the X-Next-Cursor header"""
+    query = select(models.ChatSession).where(models.ChatSession.user_id == current_user.id)
+    after = await rows_after(db, models.ChatSession, models.ChatSession.updated_at, cursor,
+                             models.ChatSession.user_id == current_user.id)
+    if after is not None:
+        query = query.where(after)
+    sessions = (await db.scalars(query.order_by(
+        models.ChatSession.updated_at.desc(), models.ChatSession.id.desc()
+    ).limit(limit + 1))).all()
+    sessions = page_rows(sessions, limit, response)
     
     return [{
         "id": session.id,
@@ -132,24 +176,26 @@ async def get_chat_sessions(
 @app.get("/api/messages", response_model=List[schemas.Message])
 async def get_messages(
     chat_session_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(MESSAGES_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
+    """The latest messages in chronological order; earlier pages via the X-Next-Cursor header"""
     # Verify the chat session belongs to the current user
-    session = db.query(models.ChatSession).filter(
-        models.ChatSession.id == chat_session_id,
-        models.ChatSession.user_id == current_user.id
-    ).first()
-    
-    if not session:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Chat session not found"
-        )
+    await get_user_chat_session(db, chat_session_id, current_user)
     
-    messages = db.query(models.Message).filter(
-        models.Message.chat_session_id == chat_session_id
-    ).order_by(models.Message.timestamp.asc()).all()
+    query = select(models.Message).where(models.Message.chat_session_id == chat_session_id)
+    after = await rows_after(db, models.Message, models.Message.timestamp, cursor,
+                             models.Message.chat_session_id == chat_session_id)
+    if after is not None:
+        query = query.where(after)
+    messages = (await db.scalars(query.order_by(
+        models.Message.timestamp.desc(), models.Message.id.desc()
+    ).limit(limit + 1))).all()
+    # Fetched newest first so the first page is the end of the conversation
+    messages = list(reversed(page_rows(messages, limit, response)))
     
     return [{
         "id": message.id,
@@ -163,7 +209,7 @@ async def get_messages(
 async def create_chat_session(
     session: schemas.ChatSessionCreate,
     current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # Verify the user is creating a session for themselves
     if session.userId != current_user.id:
@@ -179,8 +225,8 @@ async def create_chat_session(
         last_message=session.lastMessage
     )
     db.add(db_session)
-    db.commit()
-    db.refresh(db_session)
+    await db.commit()
+    await db.refresh(db_session)
     
     return {
         "id": db_session.id,
@@ -191,24 +237,21 @@ async def create_chat_session(
         "updatedAt": db_session.updated_at
     }
 
-@app.post("/api/messages", response_model=schemas.Message)
-async def create_message(
-    message: schemas.MessageCreate,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
-):
-    # Verify the chat session belongs to the current user
-    session = db.query(models.ChatSession).filter(
-        models.ChatSession.id == message.chatSessionId,
-        models.ChatSession.user_id == current_user.id
-    ).first()
+async def get_user_chat_session(db: AsyncSession, chat_session_id: str, user: models.User) -> models.ChatSession:
+    """Return the user's chat session or raise 404"""
+    session = await db.scalar(select(models.ChatSession).where(
+        models.ChatSession.id == chat_session_id,
+        models.ChatSession.user_id == user.id
+    ))
     
     if not session:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Chat session not found"
         )
-    
+    return session
+
+async def save_user_message(db: AsyncSession, session: models.ChatSession, message: schemas.MessageCreate) -> models.Message:
     db_message = models.Message(
         id=message.id,
         content=message.content,
@@ -222,131 +265,205 @@ async def create_message(
     session.last_message = message.content
     session.updated_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(db_message)
-    
-    # If the message is from the user, generate an AI response using RAG
+    with metrics.track_stage("db_write"):
+        await db.commit()
+    await db.refresh(db_message)
+    return db_message
+
+def message_to_dict(message: models.Message) -> Dict[str, Any]:
+    return {
+        "id": message.id,
+        "content": message.content,
+        "sender": message.sender,
+        "timestamp": message.timestamp,
+        "chatSessionId": message.chat_session_id
+    }
+
+@app.post("/api/messages", response_model=schemas.Message)
+async def create_message(
+    message: schemas.MessageCreate,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Save a message; answers to user messages are generated in the background.
+
+    The response carries ``pendingResponseId``, the id of the answer job and
+    of the assistant message it will create; follow it with /api/jobs/{id}.
+    """
+    # Verify the chat session belongs to the current user
+    session = await get_user_chat_session(db, message.chatSessionId, current_user)
+    job = None
     if message.sender == "user":
+        # Committed together with the message, so a saved question always gets answered
+        job = new_job(session.id, message.id, message.content, current_user.region)
+        db.add(job)
+    db_message = await save_user_message(db, session, message)
+    if job is None:
+        return message_to_dict(db_message)
+
+    answer_queue.submit(job.id)
+    return {**message_to_dict(db_message), "pendingResponseId": job.id}
+
+@app.get("/api/jobs/{job_id}", response_model=schemas.AnswerJob)
+async def get_answer_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=60, description="Seconds to wait for the job to finish"),
+    current_user: models.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Status of an answer job, with the assistant message once complete.
+
+    With ``wait`` the request is held until the job finishes or the time is
+    up (long polling), instead of the client polling in a loop.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        job = await db.scalar(select(models.AnswerJob).join(models.ChatSession).where(
+            models.AnswerJob.id == job_id,
+            models.ChatSession.user_id == current_user.id
+        ))
+        if job is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Job not found"
+            )
+        remaining = deadline - time.monotonic()
+        if job.status in TERMINAL or remaining <= 0:
+            return job_to_dict(job)
+        # Hold no connection while waiting; jobs run by other processes are seen on the next check
+        await db.rollback()
+        await answer_queue.wait(job_id, min(remaining, 1.0))
+
+def format_sse(event: str, data: Any) -> str:
+    """Encode one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+@app.post("/api/messages/stream")
+async def create_message_stream(
+    message: schemas.MessageCreate,
+    background_tasks: BackgroundTasks,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Save a user message and stream the AI answer as Server-Sent Events.
+
+    Events: ``message`` (the saved user message), ``refined_query``,
+    ``sources``, ``token`` (answer deltas), ``reroute``, then ``done`` with the
+    persisted AI message, or ``error``.
+    """
+    session = await get_user_chat_session(db, message.chatSessionId, current_user)
+    db_message = await save_user_message(db, session, message)
+    user_message = message_to_dict(db_message)
+    conversation_history = await load_conversation_history(db, session)
+    await db.commit()
+    user_region = current_user.region
+    chat_session_id = session.id
+
+    async def event_stream():
+        yield format_sse("message", user_message)
+        if message.sender != "user":
+            return
         try:
-            # Get conversation history for this session
-            conversation_history = []
-            history_messages = db.query(models.Message).filter(
-                models.Message.chat_session_id == message.chatSessionId
-            ).order_by(models.Message.timestamp.asc()).all()
-            
-            for msg in history_messages:
-                conversation_history.append({
-                    "role": msg.sender,
-                    "content": msg.content
-                })
-            
-            # Process the query with our RAG system
-            rag_response = rag.process_query(
+            async for event in rag_service.astream_query(
                 user_query=message.content,
-                user_region=current_user.region,
+                user_region=user_region,
                 conversation_history=conversation_history
-            )
-            
-            # Create AI response message
-            ai_message_id = str(uuid.uuid4())
-            ai_message = models.Message(
-                id=ai_message_id,
-                content=rag_response["response"],
-                sender="assistant",
-                chat_session_id=message.chatSessionId,
-                timestamp=datetime.utcnow()
-            )
-            db.add(ai_message)
-            
-            # Update session again with AI's message
-            session.last_message = rag_response["response"]
-            session.updated_at = datetime.utcnow()
-            db.commit()
-            db.refresh(ai_message)
-            
-            # Also return the AI message in the response
-            return {
-                "id": db_message.id,
-                "content": db_message.content,
-                "sender": db_message.sender,
-                "timestamp": db_message.timestamp,
-                "chatSessionId": db_message.chat_session_id,
-                "aiResponse": {
-                    "id": ai_message.id,
-                    "content": ai_message.content,
-                    "sender": ai_message.sender,
-                    "timestamp": ai_message.timestamp,
-                    "chatSessionId": ai_message.chat_session_id,
-                    "metadata": {
-                        "confidence": rag_response["confidence"],
-                        "response_type": rag_response["response_type"],
-                        "sources": rag_response["sources"]
-                    }
-                }
-            }
+            ):
+                if event["event"] != "result":
+                    yield format_sse(event["event"], event["data"])
+                    continue
+
+                # The request-scoped session is closed once streaming starts,
+                # so persist the final answer with a session of our own
+                async with SessionLocal() as stream_db:
+                    stream_session = await stream_db.get(models.ChatSession, chat_session_id)
+                    ai_response = await save_ai_message(stream_db, stream_session, event["data"])
+                background_tasks.add_task(refresh_history_summary, chat_session_id)
+                yield format_sse("done", ai_response)
         except Exception as e:
-            # If RAG fails, don't stop the user's message from being saved
-            print(f"Error generating AI response: {str(e)}")
-            pass
-    
-    return {
-        "id": db_message.id,
-        "content": db_message.content,
-        "sender": db_message.sender,
-        "timestamp": db_message.timestamp,
-        "chatSessionId": db_message.chat_session_id
-    }
+            print(f"Error streaming AI response: {str(e)}")
+            yield format_sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background_tasks
+    )
 
 @app.patch("/api/chat-sessions/{session_id}")
 async def update_chat_session_title(
     session_id: str,
     title: dict,
     current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    session = db.query(models.ChatSession).filter(
-        models.ChatSession.id == session_id,
-        models.ChatSession.user_id == current_user.id
-    ).first()
-    
-    if not session:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Chat session not found"
-        )
-    
+    session = await get_user_chat_session(db, session_id, current_user)
     session.title = title["title"]
     session.updated_at = datetime.utcnow()
-    db.commit()
+    await db.commit()
     return {"status": "success"}
 
 @app.delete("/api/chat-sessions/{session_id}")
 async def delete_chat_session(
     session_id: str,
     current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    session = db.query(models.ChatSession).filter(
-        models.ChatSession.id == session_id,
-        models.ChatSession.user_id == current_user.id
-    ).first()
-    
-    if not session:
+    session = await get_user_chat_session(db, session_id, current_user)
+    await db.delete(session)
+    await db.commit()
+    return {"status": "success"}
+
+@app.get("/api/vectorstore/status")
+async def vectorstore_status(
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    return rag_service.vectorstore_stats()
+
+@app.get("/api/rag/stats")
+async def rag_stats(
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    return rag_service.stats()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Pipeline stage timings, token usage, routing and cache counters for Prometheus"""
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled")
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.post("/api/rag-batch")
+async def rag_batch(
+    request: Request,
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Answer a JSONL body of questions; results stream back as JSONL in completion order"""
+    body = (await request.body()).decode("utf-8", errors="replace")
+    # batch imports the RAG module; load it off the event loop first
+    await rag_service.aload()
+    from . import batch
+    # Users only ever search their own region, whatever the lines say
+    items = batch.parse_batch(body.splitlines(), default_region=current_user.region, allow_region=False)
+    if not items:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Chat session not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No questions in request body"
         )
-    
-    db.delete(session)
-    db.commit()
-    return {"status": "success"}
+    if len(items) > batch.BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {batch.BATCH_MAX_QUESTIONS} questions per batch"
+        )
+    return StreamingResponse(batch.astream_jsonl(items), media_type="application/x-ndjson")
 
 # Add a direct RAG API endpoint for testing
 @app.post("/api/rag-query")
 async def rag_query(
     query: schemas.RAGQuery,
     current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     try:
         # Get conversation history if a chat session is provided
@@ -354,30 +471,14 @@ async def rag_query(
         
         if query.chatSessionId:
             # First verify this session belongs to the user
-            session = db.query(models.ChatSession).filter(
-                models.ChatSession.id == query.chatSessionId,
-                models.ChatSession.user_id == current_user.id
-            ).first()
-            
-            if not session:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Chat session not found"
-                )
-            
-            # Get conversation history
-            history_messages = db.query(models.Message).filter(
-                models.Message.chat_session_id == query.chatSessionId
-            ).order_by(models.Message.timestamp.asc()).all()
+            session = await get_user_chat_session(db, query.chatSessionId, current_user)
             
-            for msg in history_messages:
-                conversation_history.append({
-                    "role": msg.sender,
-                    "content": msg.content
-                })
+            # Get the bounded conversation history
+            conversation_history = await load_conversation_history(db, session)
+            await db.commit()
         
         # Process the query
-        rag_response = rag.process_query(
+        rag_response = await rag_service.aprocess_query(
             user_query=query.query,
             user_region=current_user.region,
             conversation_history=conversation_history
@@ -0,0 +1,210 @@
+import asyncio
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Upper bounds in seconds; model calls dominate, so the buckets reach well past a minute
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelValues = Tuple[str, ...]
+# (name, type, help, [(labels, value)]) as produced by a collector callback
+Sample = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels.get(label, "")) for label in self.labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(dict(zip(self.labels, key)))} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels, as Prometheus expects"""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (last is +Inf)], sum, count
+        self._values: Dict[LabelValues, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(tuple(str(labels.get(label, "")) for label in self.labels))
+        return entry[2] if entry else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self._values.items()):
+                labels = dict(zip(self.labels, key))
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                    cumulative += bucket_count
+                    bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-local metrics rendered in the Prometheus text exposition format.
+
+    Counters and histograms are updated inline by the pipeline. Components
+    that already keep their own statistics (caches, the translation gate) are
+    read through collector callbacks at scrape time instead of being counted
+    twice.
+    """
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], List[Sample]]] = []
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = STAGE_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], List[Sample]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                samples = collector()
+            except Exception as e:
+                print(f"Metrics collector failed: {str(e)}")
+                continue
+            for name, kind, help, values in samples:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in values:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "rag_stage_seconds", "Time spent in each pipeline stage", ("stage",)
+)
+stage_errors = registry.counter(
+    "rag_stage_errors_total", "Pipeline stages that raised", ("stage",)
+)
+llm_requests = registry.counter(
+    "llm_requests_total", "Chat model calls", ("model",)
+)
+llm_tokens = registry.counter(
+    "llm_tokens_total", "Tokens reported by the chat model provider", ("model", "kind")
+)
+routing_decisions = registry.counter(
+    "rag_responses_total", "Answers by the path that produced them (rag, expanded_rag, full_doc, rag_fallback, cache)",
+    ("response_type",)
+)
+retrieval_paths = registry.counter(
+    "rag_retrieval_total", "Retrievals by path (section lookup or vector search)", ("path",)
+)
+
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[None]:
+    """Time a block of sync or async code as one pipeline stage"""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except (asyncio.CancelledError, GeneratorExit):
+        # Discarded work (a losing speculative fallback, a closed stream) is not a stage run
+        raise
+    except Exception:
+        stage_errors.inc(stage=stage)
+        stage_seconds.observe(time.perf_counter() - start, stage=stage)
+        raise
+    else:
+        stage_seconds.observe(time.perf_counter() - start, stage=stage)
+
+
+def record_response(response_type: str, cache_hit: bool = False) -> None:
+    if METRICS_ENABLED:
+        routing_decisions.inc(response_type="cache" if cache_hit else response_type)
+
+
+def record_retrieval(path: str) -> None:
+    if METRICS_ENABLED:
+        retrieval_paths.inc(path=path)
+
+
+def record_llm_usage(model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+    if not METRICS_ENABLED:
+        return
+    llm_requests.inc(model=model)
+    if prompt_tokens:
+        llm_tokens.inc(prompt_tokens, model=model, kind="prompt")
+    if completion_tokens:
+        llm_tokens.inc(completion_tokens, model=model, kind="completion")
+
+
+def render() -> str:
+    return registry.render()
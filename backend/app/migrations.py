@@ -0,0 +1,61 @@
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Schema changes that create_all cannot apply to existing tables. Each
+# migration runs once, in order, and is recorded in schema_migrations.
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl_type: str) -> None:
+    columns = {col["name"] for col in inspect(conn).get_columns(table)}
+    if column not in columns:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def _create_index(conn: Connection, name: str, table: str, columns: str) -> None:
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def add_history_summary(conn: Connection) -> None:
+    """Rolling conversation summary on chat sessions"""
+    _add_column(conn, "chat_sessions", "history_summary", "TEXT")
+    _add_column(conn, "chat_sessions", "summarized_until", "TIMESTAMP")
+
+
+def add_listing_indexes(conn: Connection) -> None:
+    """Composite indexes for message history and session listings"""
+    _create_index(conn, "ix_messages_session_timestamp", "messages", "chat_session_id, timestamp, id")
+    _create_index(conn, "ix_chat_sessions_user_updated", "chat_sessions", "user_id, updated_at, id")
+
+
+MIGRATIONS = [
+    (1, add_history_summary),
+    (2, add_listing_indexes),
+]
+
+
+def _applied_versions(conn: Connection) -> set:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY)"
+    ))
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+async def run_migrations(engine: AsyncEngine) -> None:
+    async with engine.begin() as conn:
+        applied = await conn.run_sync(_applied_versions)
+
+    for version, migration in MIGRATIONS:
+        if version in applied:
+            continue
+        async with engine.begin() as conn:
+            await conn.run_sync(migration)
+            await conn.execute(text("INSERT INTO schema_migrations (version) VALUES (:version)"), {"version": version})
+        print(f"Applied migration {version}: {migration.__doc__}")
+
+
+async def init_database(engine: AsyncEngine, metadata: MetaData) -> None:
+    """Create missing tables, then apply pending migrations"""
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+    await run_migrations(engine)
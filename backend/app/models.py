@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, String, DateTime, ForeignKey, Boolean, Index, Integer
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from .database import Base
@@ -32,12 +32,18 @@ class ChatSession(Base):
     title = Column(String, nullable=False)
     user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     last_message = Column(String)
+    history_summary = Column(String)  # Rolling summary of messages outside the history window
+    summarized_until = Column(DateTime)  # Timestamp of the newest message folded into the summary
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
     messages = relationship("Message", back_populates="chat_session", cascade="all, delete-orphan")
+    answer_jobs = relationship("AnswerJob", cascade="all, delete-orphan")
     user = relationship("User", back_populates="chat_sessions")
 
+    # Serves the per-user session list, newest first; id breaks ties for the cursor
+    __table_args__ = (Index("ix_chat_sessions_user_updated", "user_id", "updated_at", "id"),)
+
 class Message(Base):
     __tablename__ = "messages"
 
@@ -47,4 +53,29 @@ class Message(Base):
     timestamp = Column(DateTime, server_default=func.now())
     chat_session_id = Column(String, ForeignKey("chat_sessions.id", ondelete="CASCADE"))
 
-    chat_session = relationship("ChatSession", back_populates="messages") 
\ No newline at end of file
+    chat_session = relationship("ChatSession", back_populates="messages")
+
+    # Serves history loads and message pages of one session in timestamp order
+    __table_args__ = (Index("ix_messages_session_timestamp", "chat_session_id", "timestamp", "id"),)
+
+class AnswerJob(Base):
+    """Generation of one assistant message, run by the answer queue (see jobs.py)"""
+    __tablename__ = "answer_jobs"
+
+    id = Column(String, primary_key=True)  # Also the id of the assistant message once it is saved
+    chat_session_id = Column(String, ForeignKey("chat_sessions.id", ondelete="CASCADE"), nullable=False)
+    user_message_id = Column(String, nullable=False)
+    query = Column(String, nullable=False)
+    user_region = Column(String, nullable=False)
+    status = Column(String, nullable=False)  # 'pending', 'running', 'complete' or 'failed'
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(String)  # Last failure, kept while retrying
+    result = Column(String)  # The AIMessageResponse as JSON once complete
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # Recovery on startup looks for pending and stale running jobs
+        Index("ix_answer_jobs_status_updated", "status", "updated_at"),
+        Index("ix_answer_jobs_session", "chat_session_id"),
+    )
@@ -0,0 +1,37 @@
+import os
+from typing import Any, List, Optional
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Keyset pagination for the list endpoints. Pages are ordered newest first by
+# a timestamp column with the id as tie-breaker; the cursor is the id of the
+# last row of the previous page and is returned in the X-Next-Cursor header.
+MESSAGES_PAGE_SIZE = int(os.getenv("MESSAGES_PAGE_SIZE", "100"))
+SESSIONS_PAGE_SIZE = int(os.getenv("SESSIONS_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+async def rows_after(db: AsyncSession, model, sort_column, cursor: Optional[str], *scope):
+    """Condition selecting the rows that follow ``cursor`` in (sort_column, id) descending order.
+
+    The cursor row's sort value is read inside the query, so the comparison is
+    against the stored value and never depends on how timestamps round-trip
+    through Python. ``scope`` restricts the cursor to the listing it came from.
+    """
+    if cursor is None:
+        return None
+    if await db.scalar(select(model.id).where(model.id == cursor, *scope)) is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    anchor = select(sort_column).where(model.id == cursor).scalar_subquery()
+    return or_(sort_column < anchor, and_(sort_column == anchor, model.id < cursor))
+
+
+def page_rows(rows: List[Any], limit: int, response: Response) -> List[Any]:
+    """Trim a query fetched with ``limit + 1`` rows and set the next cursor if more remain"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = rows[-1].id
+    return rows
@@ -0,0 +1,121 @@
+import json
+import os
+import sqlite3
+from typing import Optional
+
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.sqlite"
+# Memory-map the vectors when serving so workers share them through the page cache
+FAISS_MMAP = os.getenv("FAISS_MMAP", "true").lower() == "true"
+
+
+def has_store(path: str) -> bool:
+    return os.path.exists(os.path.join(path, INDEX_FILE)) and os.path.exists(os.path.join(path, DOCSTORE_FILE))
+
+
+def save_store(vectorstore: FAISS, path: str) -> None:
+    """Write the index and a SQLite docstore; no pickle involved.
+
+    Both files are written under temporary names and renamed into place, so
+    processes that have the old index mapped keep reading a consistent file.
+    """
+    os.makedirs(path, exist_ok=True)
+    index_path = os.path.join(path, INDEX_FILE)
+    faiss.write_index(vectorstore.index, index_path + ".tmp")
+
+    docstore_path = os.path.join(path, DOCSTORE_FILE)
+    tmp_docstore = docstore_path + ".tmp"
+    if os.path.exists(tmp_docstore):
+        os.remove(tmp_docstore)
+    conn = sqlite3.connect(tmp_docstore)
+    try:
+        conn.execute(
+            "CREATE TABLE chunks (position INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, "
+            "page_content TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        conn.executemany(
+            "INSERT INTO chunks (position, id, page_content, metadata) VALUES (?, ?, ?, ?)",
+            (
+                (position, doc_id, document.page_content, json.dumps(document.metadata, default=str))
+                for position, doc_id in sorted(vectorstore.index_to_docstore_id.items())
+                for document in [vectorstore.docstore.search(doc_id)]
+            )
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(index_path + ".tmp", index_path)
+    os.replace(tmp_docstore, docstore_path)
+
+
+def load_store(path: str, embeddings: Embeddings, mmap: bool = FAISS_MMAP) -> Optional[FAISS]:
+    """Load a store written by ``save_store``; None if there is none at ``path``.
+
+    With ``mmap`` the vectors are mapped read-only rather than copied into
+    the process. Such a store must not be modified; load with ``mmap=False``
+    to get a copy that can take adds and deletes.
+
+    Only flat code arrays are mapped (flat, sq8 and pq indexes, and the
+    vectors under hnsw); IVF inverted lists and HNSW graphs are still read
+    into each process, and so is the docstore. An index faiss cannot map is
+    read normally.
+    """
+    if not has_store(path):
+        return None
+
+    index_path = os.path.join(path, INDEX_FILE)
+    if mmap:
+        try:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            print(f"Cannot memory-map {index_path}, loading a copy: {e}")
+            index = faiss.read_index(index_path)
+    else:
+        index = faiss.read_index(index_path)
+
+    conn = sqlite3.connect(f"file:{os.path.join(path, DOCSTORE_FILE)}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("SELECT position, id, page_content, metadata FROM chunks ORDER BY position").fetchall()
+    finally:
+        conn.close()
+
+    if len(rows) != index.ntotal:
+        raise ValueError(f"Docstore has {len(rows)} chunks but the index has {index.ntotal} vectors")
+
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore({
+            doc_id: Document(page_content=page_content, metadata=json.loads(metadata))
+            for _, doc_id, page_content, metadata in rows
+        }),
+        index_to_docstore_id={position: doc_id for position, doc_id, _, _ in rows}
+    )
+
+
+def convert_pickle_store(path: str, embeddings: Embeddings) -> FAISS:
+    """One-off conversion of a LangChain ``save_local`` store (index.pkl).
+
+    This is the only place that unpickles, so only run it on indexes you built.
+    """
+    vectorstore = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+    save_store(vectorstore, path)
+    return vectorstore
+
+
+if __name__ == "__main__":
+    # Convert an existing pickle-based index in place
+    import sys
+
+    from . import rag
+
+    target = sys.argv[1] if len(sys.argv) > 1 else rag.VECTORSTORE_PATH
+    converted = convert_pickle_store(target, rag.embedding_model())
+    print(f"Converted {target}: {converted.index.ntotal} vectors")
@@ -1,8 +1,10 @@
 import os
 import json
+import asyncio
 import uuid
+import threading
 from pathlib import Path
-from typing import List, Dict, Any, TypedDict, Optional
+from typing import List, Dict, Any, TypedDict, Optional, AsyncIterator, Tuple
 import re
 import hashlib
 import numpy as np
@@ -14,11 +16,36 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough, RunnableLambda
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import TextLoader
 from langsmith import traceable
 from langchain_core.documents import Document
 from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .vectorstore import VectorStoreRegistry, DEFAULT_STORE
+from .semantic_cache import SemanticCache, chunk_id
+from .embedding_cache import CachedEmbeddings
+from .indexer import IncrementalIndexer
+from .persistence import FAISS_MMAP, load_store, save_store
+from .shards import (
+    REGION_STORE_PREFIX, REGIONS_DIR, SHARD_IDLE_SECONDS, ShardedStore, region_slug, region_store_name
+)
+from .index_factory import (
+    FAISS_INDEX_TYPE, configure_search, create_faiss, index_description, truncate_embeddings
+)
+from .translation_gate import translation_gate
+from .coalescing import pipeline_flights, pipeline_key
+from .speculation import (
+    SPECULATIVE_FALLBACK, fallback_predictor, speculation_stats
+)
+from .lexical import (
+    HYBRID_RETRIEVAL, is_section_lookup, lexical_search, reciprocal_rank_fusion
+)
+from .chunking import CHUNKER_VERSION, cited_sections, get_section_index, split_markdown_sections
+from .rerank import reranker, rerank_documents, rerank_stats
+from .fallback import (
+    FALLBACK_K, FULL_DOC_TOKEN_LIMIT, expand_context, full_document_cache
+)
+from .metrics import record_llm_usage, record_response, record_retrieval, registry as metrics_registry, track_stage
 
 # Load environment variables
 load_dotenv()
@@ -49,13 +76,37 @@ class EnhancedRAGResponse(TypedDict):
     sources: List[Source]
     needs_rerouting: bool
 
+class TokenUsageHandler(BaseCallbackHandler):
+    """Counts chat model calls and their token usage in the metrics registry"""
+
+    def on_llm_end(self, response, **kwargs: Any) -> None:
+        llm_output = response.llm_output or {}
+        model = llm_output.get("model_name") or "unknown"
+        token_usage = llm_output.get("token_usage") or {}
+        if token_usage:
+            record_llm_usage(model, token_usage.get("prompt_tokens"), token_usage.get("completion_tokens"))
+            return
+
+        # Streaming results carry usage on the message instead of llm_output
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or {}
+                metadata = getattr(message, "response_metadata", None) or {}
+                record_llm_usage(metadata.get("model_name") or model, usage.get("input_tokens"), usage.get("output_tokens"))
+
+token_usage_handler = TokenUsageHandler()
+
 # Initialize OpenAI models
 def get_llm(model_name="gpt-4o", temperature=0.1):
     """Get LLM based on specified model"""
     return ChatOpenAI(
         model=model_name,
         temperature=temperature,
-        openai_api_key=os.getenv("OPENAI_API_KEY")
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        # Streamed calls only report token usage when asked to
+        stream_usage=True,
+        callbacks=[token_usage_handler]
     )
 
 def get_fast_llm():
@@ -63,20 +114,59 @@ def get_fast_llm():
     return ChatOpenAI(
         model="gpt-4o-mini",
         temperature=0.1,
-        openai_api_key=os.getenv("OPENAI_API_KEY")
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        # Streamed calls only report token usage when asked to
+        stream_usage=True,
+        callbacks=[token_usage_handler]
     )
 
 def get_embeddings():
-    """Get embeddings model"""
-    return OpenAIEmbeddings(
-        model="text-embedding-3-large",
-        openai_api_key=os.getenv("OPENAI_API_KEY")
+    """Get embeddings model, wrapped in the persistent embedding cache"""
+    cached = CachedEmbeddings(
+        OpenAIEmbeddings(
+            model="text-embedding-3-large",
+            openai_api_key=os.getenv("OPENAI_API_KEY")
+        ),
+        path=os.getenv("EMBEDDING_CACHE_PATH", str(Path(__file__).parent.parent / "embedding_cache.sqlite"))
     )
+    # The cache keeps full vectors; truncation (if configured) is applied on top
+    return truncate_embeddings(cached)
+
+# Global instances, created on first use so importing this module stays cheap.
+# Assigning them directly (benchmarks, tests) replaces the real clients.
+llm = None
+fast_llm = None
+embeddings = None
+_clients_lock = threading.Lock()
 
-# Global instances
-llm = get_llm()
-fast_llm = get_fast_llm()
-embeddings = get_embeddings()
+def chat_model():
+    global llm
+    with _clients_lock:
+        if llm is None:
+            llm = get_llm()
+        return llm
+
+def fast_chat_model():
+    global fast_llm
+    with _clients_lock:
+        if fast_llm is None:
+            fast_llm = get_fast_llm()
+        return fast_llm
+
+def embedding_model():
+    global embeddings
+    with _clients_lock:
+        if embeddings is None:
+            embeddings = get_embeddings()
+        return embeddings
+
+# Loaded indexes live here for the life of the process
+VECTORSTORE_PATH = "backend/faiss_index"
+vectorstore_registry = VectorStoreRegistry()
+
+# Answers for near-duplicate questions; stale as soon as the index changes
+semantic_cache = SemanticCache.from_env()
+vectorstore_registry.add_swap_listener(lambda name, version: semantic_cache.invalidate())
 
 # Document preparation
 @traceable(name="document_preparation")
@@ -85,42 +175,24 @@ def prepare_documents(documents: List[Document]) -> List[Document]:
     if not documents:
         raise ValueError("No input documents provided to prepare_documents")
         
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=2000,
-        chunk_overlap=200
-    )
-    
     processed_docs = []
-    last_seen_page_number = None
     
     for doc_idx, doc in enumerate(documents):
         if not doc.page_content.strip():
             print(f"Warning: Empty document at index {doc_idx}")
             continue
             
-        splits = text_splitter.split_documents([doc])
+        # Split on headings and section ids; page numbers come from the page footers
+        splits = split_markdown_sections(doc)
         
         if not splits:
             print(f"Warning: No splits generated for document at index {doc_idx}")
             continue
             
         for chunk_idx, split_doc in enumerate(splits):
-            # Try to extract page number from content if available
-            page_match = re.search(r'2500-(\d+)\n---', split_doc.page_content)
-            if page_match:
-                page_number = int(page_match.group(1))
-                last_seen_page_number = page_number
-            else:
-                if last_seen_page_number is not None:
-                    page_number = last_seen_page_number + 1
-                    last_seen_page_number = page_number
-                else:
-                    page_number = 1
-                    last_seen_page_number = 1
-            
             split_doc.metadata.update({
                 'document_id': f'doc_{doc_idx}',
-                'page_number': page_number
+                'chunk_index': chunk_idx
             })
             processed_docs.append(split_doc)
     
@@ -137,76 +209,235 @@ def create_vector_store(document_splits: List[Document]) -> FAISS:
         if not document_splits:
             raise ValueError("No documents provided for vector store creation")
             
-        vectorstore = FAISS.from_documents(
-            documents=document_splits, 
-            embedding=embeddings
-        )
+        vectorstore = create_faiss(document_splits, embedding_model())
         return vectorstore
     except Exception as e:
         print(f"Error creating vector store: {str(e)}")
         raise
 
 def save_vectorstore(vectorstore: FAISS, path: str = "faiss_index"):
-    """Save the FAISS index to disk"""
-    vectorstore.save_local(path)
+    """Save the FAISS index and its SQLite docstore to disk"""
+    save_store(vectorstore, path)
+
+def load_vectorstore(path: str = "faiss_index", mmap: bool = FAISS_MMAP) -> Optional[FAISS]:
+    """Load the FAISS index from disk; memory-mapped stores are read-only"""
+    vectorstore = load_store(path, embedding_model(), mmap=mmap)
+    if vectorstore is None:
+        if os.path.exists(os.path.join(path, "index.pkl")):
+            print(f"Ignoring pickle index at {path}; run 'python -m app.persistence' to convert it")
+        return None
+    configure_search(vectorstore.index)
+    return vectorstore
+
+def get_guidelines_path() -> Path:
+    """Return the path of the guidelines document, creating a sample if missing"""
+    project_root = Path(__file__).parent.parent.parent
+    docs_path = project_root / "docs" / "hotel_guidelines.md"
+
+    # If the docs directory doesn't exist, create it
+    docs_dir = project_root / "docs"
+    if not docs_dir.exists():
+        docs_dir.mkdir(parents=True)
+
+    # If the file doesn't exist, create a sample file
+    if not docs_path.exists():
+        with open(docs_path, "w", encoding="utf-8") as f:
+            f.write("# Hotel Construction Guidelines\n\n"
+                    "## Section 2500: General Requirements\n\n"
+                    "### 2500-1\n---\n"
+                    "All hotel construction must adhere to brand standards and local building codes.\n\n"
+                    "### 2500-2\n---\n"
+                    "Fire safety systems must be installed according to international standards.\n\n"
+                    "### 2500-3\n---\n"
+                    "Energy efficiency requirements must meet or exceed LEED Silver certification.\n\n")
+
+    return docs_path
+
+@traceable(name="build_vectorstore")
+def build_vectorstore(region: Optional[str] = None) -> FAISS:
+    """Build the vector store (a region shard if ``region`` is given) and save it"""
+    vectorstore, _ = get_indexer(region).sync(None)
+    if FAISS_MMAP:
+        # Serve the saved copy so its vectors are shared through the page cache
+        return load_vectorstore(get_index_path(region))
+    return vectorstore
+
+def get_source_paths(region: Optional[str] = None) -> List[Path]:
+    """Return the markdown sources of the global shard (docs/) or a region shard"""
+    docs_dir = get_guidelines_path().parent
+    if region:
+        docs_dir = docs_dir / REGIONS_DIR / region
+    return sorted(docs_dir.glob("*.md"))
 
-def load_vectorstore(path: str = "faiss_index") -> Optional[FAISS]:
-    """Load the FAISS index from disk"""
-    if os.path.exists(path):
-        return FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
-    return None
+def get_index_path(region: Optional[str] = None) -> str:
+    return os.path.join(VECTORSTORE_PATH, REGIONS_DIR, region) if region else VECTORSTORE_PATH
+
+def store_name(region: Optional[str] = None) -> str:
+    return region_store_name(region) if region else DEFAULT_STORE
+
+# Scanned on first use and again on every sync, not per query
+_regions: Optional[List[str]] = None
+
+def available_regions(refresh: bool = False) -> List[str]:
+    """Regions that have their own documents in docs/regions/"""
+    global _regions
+    if _regions is None or refresh:
+        regions_dir = get_guidelines_path().parent / REGIONS_DIR
+        _regions = sorted(
+            path.name for path in regions_dir.iterdir() if path.is_dir() and any(path.glob("*.md"))
+        ) if regions_dir.is_dir() else []
+    return _regions
+
+def get_indexer(region: Optional[str] = None) -> IncrementalIndexer:
+    return IncrementalIndexer(
+        index_path=get_index_path(region),
+        sources=get_source_paths(region),
+        embeddings=embedding_model(),
+        prepare_documents=prepare_documents,
+        docs_root=get_guidelines_path().parent,
+        chunker_version=CHUNKER_VERSION,
+        index_type=FAISS_INDEX_TYPE,
+        index_layout=index_description()
+    )
+
+@traceable(name="sync_vectorstore")
+def sync_vectorstore(region: Optional[str] = None):
+    """Apply source document edits to the saved index and hot-swap it in.
+
+    Works on a fresh copy loaded from disk so queries keep using the current
+    index until the updated one is swapped in. Returns (vectorstore, report).
+    """
+    index_path = get_index_path(region)
+    available_regions(refresh=True)
+    # The indexer edits the store in place, so it gets a writable copy
+    vectorstore, report = get_indexer(region).sync(load_vectorstore(index_path, mmap=False))
+    if FAISS_MMAP and report["changed"]:
+        vectorstore = load_vectorstore(index_path)
+    if report["changed"] or not vectorstore_registry.is_loaded(store_name(region)):
+        # Only a changed index makes cached answers stale
+        vectorstore_registry.swap(store_name(region), vectorstore, report["seconds"], notify=report["changed"])
+    return vectorstore, report
 
 @traceable(name="initialize_vectorstore")
-def initialize_vectorstore() -> FAISS:
+def initialize_vectorstore(region: Optional[str] = None) -> FAISS:
     """Initialize or load the vector store"""
     try:
         # Try loading existing vectorstore
-        vectorstore = FAISS.load_local(
-            "backend/faiss_index", 
-            embeddings,
-            allow_dangerous_deserialization=True
-        )
+        vectorstore = load_vectorstore(get_index_path(region))
         if vectorstore:
             return vectorstore
-            
-        # Initialize if not found - ensure the docs directory exists
-        project_root = Path(__file__).parent.parent.parent
-        docs_path = project_root / "docs" / "hotel_guidelines.md"
-        
-        # If the docs directory doesn't exist, create it
-        docs_dir = project_root / "docs"
-        if not docs_dir.exists():
-            docs_dir.mkdir(parents=True)
-        
-        # If the file doesn't exist, create a sample file
-        if not docs_path.exists():
-            with open(docs_path, "w", encoding="utf-8") as f:
-                f.write("# Hotel Construction Guidelines\n\n"
-                        "## Section 2500: General Requirements\n\n"
-                        "### 2500-1\n---\n"
-                        "All hotel construction must adhere to brand standards and local building codes.\n\n"
-                        "### 2500-2\n---\n"
-                        "Fire safety systems must be installed according to international standards.\n\n"
-                        "### 2500-3\n---\n"
-                        "Energy efficiency requirements must meet or exceed LEED Silver certification.\n\n")
-        
-        loader = TextLoader(str(docs_path), encoding="utf-8")
-        documents = loader.load()
-        document_splits = prepare_documents(documents)
-        vectorstore = create_vector_store(document_splits)
-        
-        # Save the vectorstore
-        save_vectorstore(vectorstore, "backend/faiss_index")
-        
-        return vectorstore
+
+        # Initialize if not found
+        return build_vectorstore(region)
     except Exception as e:
         print(f"Error initializing vector store: {str(e)}")
         raise
 
+def get_vectorstore(region: Optional[str] = None) -> FAISS:
+    """Return the in-memory vector store (global, or one region shard), loading it on first use"""
+    return vectorstore_registry.get(store_name(region), lambda: initialize_vectorstore(region))
+
+def reload_vectorstore() -> FAISS:
+    """Re-read the saved index from disk and hot-swap it in"""
+    return vectorstore_registry.load(DEFAULT_STORE, initialize_vectorstore)
+
+def rebuild_vectorstore() -> FAISS:
+    """Bring the global index and every loaded region shard up to date and hot-swap them in"""
+    vectorstore, _ = sync_vectorstore()
+    for region in available_regions():
+        if vectorstore_registry.is_loaded(store_name(region)):
+            sync_vectorstore(region)
+    return vectorstore
+
+# Composite views per region, rebuilt when one of their shards is swapped or evicted
+_region_views: Dict[str, ShardedStore] = {}
+
+def route_vectorstore(user_region: Optional[str]):
+    """Return the store to search for a user: the global shard plus their region's shard.
+
+    Users whose region has no documents of its own search the global shard only.
+    """
+    global_store = get_vectorstore()
+    region = region_slug(user_region)
+    if region is None or region not in available_regions():
+        return global_store
+
+    shards = {DEFAULT_STORE: global_store, store_name(region): get_vectorstore(region)}
+    view = _region_views.get(region)
+    if view is None or view.members != tuple(id(shard) for shard in shards.values()):
+        view = ShardedStore(shards)
+        _region_views[region] = view
+    return view
+
+async def aroute_vectorstore(user_region: Optional[str]):
+    """Async ``route_vectorstore``; loading a shard from disk runs off the event loop"""
+    region = region_slug(user_region)
+    if vectorstore_registry.is_loaded(DEFAULT_STORE) and (
+            region is None or vectorstore_registry.is_loaded(store_name(region))):
+        return route_vectorstore(user_region)
+    return await asyncio.to_thread(route_vectorstore, user_region)
+
+def evict_idle_shards() -> List[str]:
+    """Drop region shards that have not been searched for SHARD_IDLE_SECONDS"""
+    if SHARD_IDLE_SECONDS <= 0:
+        return []
+    evicted = vectorstore_registry.evict_idle(SHARD_IDLE_SECONDS)
+    for name in evicted:
+        # The view holds the shard too; drop it so the memory is released
+        _region_views.pop(name[len(REGION_STORE_PREFIX):], None)
+    return evicted
+
+def get_stats() -> Dict[str, Any]:
+    """Collect runtime statistics of the RAG subsystem"""
+    return {
+        "vectorstores": vectorstore_registry.stats(),
+        "regions": available_regions(),
+        "semantic_cache": semantic_cache.stats(),
+        "embedding_cache": embeddings.stats() if hasattr(embeddings, "stats") else None,
+        "speculative_fallback": speculation_stats.stats(),
+        "query_translation": translation_gate.stats(),
+        "rerank": rerank_stats.stats(),
+        "coalescing": pipeline_flights.stats(),
+    }
+
+def collect_cache_metrics():
+    """Expose the hit counters the caches already keep as Prometheus counters"""
+    semantic = semantic_cache.stats()
+    gate = translation_gate.stats()
+    lookups = [
+        ({"cache": "semantic", "result": "hit"}, semantic["hits"]),
+        ({"cache": "semantic", "result": "miss"}, semantic["misses"]),
+        ({"cache": "query_translation", "result": "hit"}, gate["cache_hits"]),
+        ({"cache": "query_translation", "result": "skipped"}, sum(gate["skipped"].values())),
+        ({"cache": "query_translation", "result": "miss"}, gate["llm_calls"]),
+    ]
+    if hasattr(embeddings, "stats"):
+        embedding = embeddings.stats()
+        lookups += [
+            ({"cache": "embedding", "result": "hit"}, embedding["hits"]),
+            ({"cache": "embedding", "result": "miss"}, embedding["misses"]),
+        ]
+    return [("rag_cache_lookups_total", "counter", "Cache lookups by cache and result", lookups)]
+
+def collect_coalescing_metrics():
+    flights = pipeline_flights.stats()
+    return [("rag_pipeline_runs_total", "counter",
+             "Pipeline calls by whether they ran or joined an identical in-flight run",
+             [({"mode": "executed"}, flights["executions"]), ({"mode": "coalesced"}, flights["coalesced"])])]
+
+metrics_registry.add_collector(collect_cache_metrics)
+metrics_registry.add_collector(collect_coalescing_metrics)
+
 # Query Translation
-@traceable(name="basic_query_translation")
-def basic_translate_query(query: str, conversation_history: List[Message] = None) -> str:
-    """Basic query translation with conversation history"""
+def format_history(conversation_history: List[Message] = None) -> str:
+    """Format conversation history as 'role: content' lines for prompts"""
+    return "\n".join([
+        f"{msg['role']}: {msg['content']}" 
+        for msg in (conversation_history or [])
+    ])
+
+def create_translation_chain():
+    """Create the query refinement chain"""
     translation_prompt = ChatPromptTemplate.from_template(
         """     
 You are a specialized query refiner in a Retrieval-Augmented Generation (RAG) system. Your task is to transform a user's original question into a clear, concise, and focused query optimized for similarity search against a document corpus.
@@ -233,38 +464,162 @@ user question:
 Your refined query:
         """
     )
-    
-    # Format conversation history
-    formatted_history = "\n".join([
-        f"{msg['role']}: {msg['content']}" 
-        for msg in (conversation_history or [])
-    ])
-    
-    translation_chain = translation_prompt | fast_llm | StrOutputParser()
-    return translation_chain.invoke({
+    return translation_prompt | fast_chat_model() | StrOutputParser()
+
+@traceable(name="basic_query_translation")
+def basic_translate_query(query: str, conversation_history: List[Message] = None) -> str:
+    """Basic query translation with conversation history"""
+    return create_translation_chain().invoke({
         "query": query,
-        "conversation_history": formatted_history
+        "conversation_history": format_history(conversation_history)
+    })
+
+@traceable(name="basic_query_translation")
+async def abasic_translate_query(query: str, conversation_history: List[Message] = None) -> str:
+    """Async query translation with conversation history"""
+    return await create_translation_chain().ainvoke({
+        "query": query,
+        "conversation_history": format_history(conversation_history)
+    })
+
+def create_summary_chain():
+    """Create the chain that folds old messages into the rolling summary"""
+    summary_prompt = ChatPromptTemplate.from_template(
+        """You maintain a running summary of a conversation about hotel building regulations.
+
+Update the existing summary with the new messages. Keep the topics, sections and requirements that were discussed and any decisions or open questions. Keep it under 200 words and return only the summary.
+
+Existing summary:
+
+{summary}
+
+New messages:
+
+{messages}
+
+Updated summary:"""
+    )
+    return summary_prompt | fast_chat_model() | StrOutputParser()
+
+@traceable(name="history_summary")
+async def asummarize_history(previous_summary: Optional[str], messages: List[Message]) -> str:
+    """Fold messages that left the history window into the rolling summary"""
+    return await create_summary_chain().ainvoke({
+        "summary": previous_summary or "(none)",
+        "messages": format_history(messages)
     })
 
+def translate_query(query: str, conversation_history: List[Message] = None) -> str:
+    """Refine the query, skipping the LLM call when a local check says it is not needed"""
+    refined_query = translation_gate.resolve(query, conversation_history)
+    if refined_query is None:
+        with track_stage("translation"):
+            refined_query = basic_translate_query(query, conversation_history)
+        translation_gate.store(query, conversation_history, refined_query)
+    return refined_query
+
+async def atranslate_query(query: str, conversation_history: List[Message] = None) -> str:
+    """Async version of ``translate_query``"""
+    refined_query = translation_gate.resolve(query, conversation_history)
+    if refined_query is None:
+        with track_stage("translation"):
+            refined_query = await abasic_translate_query(query, conversation_history)
+        translation_gate.store(query, conversation_history, refined_query)
+    return refined_query
+
 # Document Retrieval based on technique
 @traceable(name="document_retrieval")
-def retrieve_documents(vectorstore: FAISS, query: str, conversation_history: List[Message] = None) -> List[Dict]:
-    """Retrieve documents using basic retrieval"""
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 15})
-    docs = retriever.invoke(query)
-    
+def retrieve_documents(vectorstore: FAISS, query: str, conversation_history: List[Message] = None,
+                       query_embedding: Optional[List[float]] = None, k: int = 15) -> List[Dict]:
+    """Retrieve documents by vector similarity, fused with BM25 results when enabled"""
+    if query_embedding is None:
+        with track_stage("embedding"):
+            query_embedding = embedding_model().embed_query(query)
+    with track_stage("search"):
+        docs_and_scores = vectorstore.similarity_search_with_score_by_vector(query_embedding, k=k)
+        dense_docs = serialize_documents(*zip(*docs_and_scores)) if docs_and_scores else []
+        return fuse_lexical_results(vectorstore, query, dense_docs, k)
+
+@traceable(name="document_retrieval")
+async def aretrieve_documents(vectorstore: FAISS, query: str, conversation_history: List[Message] = None,
+                              query_embedding: Optional[List[float]] = None, k: int = 15) -> List[Dict]:
+    """Retrieve documents without blocking the event loop"""
+    if query_embedding is None:
+        with track_stage("embedding"):
+            query_embedding = await embedding_model().aembed_query(query)
+    with track_stage("search"):
+        docs_and_scores = await vectorstore.asimilarity_search_with_score_by_vector(query_embedding, k=k)
+        dense_docs = serialize_documents(*zip(*docs_and_scores)) if docs_and_scores else []
+        return fuse_lexical_results(vectorstore, query, dense_docs, k)
+
+def fuse_lexical_results(vectorstore: FAISS, query: Optional[str], dense_docs: List[Dict], k: int) -> List[Dict]:
+    """Merge dense results with local BM25 results through reciprocal rank fusion"""
+    if not HYBRID_RETRIEVAL or not query:
+        return dense_docs
+    return reciprocal_rank_fusion([dense_docs, lexical_search(vectorstore, query, k)], k=k)
+
+def section_lookup_documents(vectorstore: FAISS, refined_query: str, k: int = 15) -> List[Dict]:
+    """Retrieval without an embedding call for queries that cite section numbers.
+
+    Cited sections are read from the section map. Queries that are mostly
+    section numbers but miss the map (e.g. an index built without section
+    metadata) fall back to BM25. Returns an empty list when the fast path
+    does not apply.
+    """
+    section_index = get_section_index(vectorstore)
+    docs, seen = [], set()
+    for section in cited_sections(refined_query):
+        for doc in section_index.lookup(section, k):
+            if doc["page_content"] not in seen and len(docs) < k:
+                seen.add(doc["page_content"])
+                docs.append({"page_content": doc["page_content"], "metadata": dict(doc["metadata"]), "score": None})
+    if docs:
+        return docs
+
+    if not HYBRID_RETRIEVAL or not is_section_lookup(refined_query):
+        return []
+    return lexical_search(vectorstore, refined_query, k)
+
+def gather_documents(vectorstore: FAISS, refined_query: str, conversation_history: List[Message] = None):
+    """Return (query_embedding, retrieved_docs); the embedding is None on the lexical fast path"""
+    with track_stage("section_lookup"):
+        retrieved_docs = section_lookup_documents(vectorstore, refined_query)
+    if retrieved_docs:
+        record_retrieval("section_lookup")
+        return None, retrieved_docs
+    record_retrieval("vector")
+    with track_stage("embedding"):
+        query_embedding = embedding_model().embed_query(refined_query)
+    return query_embedding, retrieve_documents(vectorstore, refined_query, conversation_history, query_embedding)
+
+async def agather_documents(vectorstore: FAISS, refined_query: str, conversation_history: List[Message] = None):
+    """Async version of ``gather_documents``"""
+    with track_stage("section_lookup"):
+        retrieved_docs = section_lookup_documents(vectorstore, refined_query)
+    if retrieved_docs:
+        record_retrieval("section_lookup")
+        return None, retrieved_docs
+    record_retrieval("vector")
+    with track_stage("embedding"):
+        query_embedding = await embedding_model().aembed_query(refined_query)
+    return query_embedding, await aretrieve_documents(vectorstore, refined_query, conversation_history, query_embedding)
+
+def serialize_documents(docs: List[Document], scores: Optional[List[float]] = None) -> List[Dict]:
+    """Convert retrieved documents into plain dicts, with search scores when known"""
+    scores = scores or [None] * len(docs)
     return [
         {
             "page_content": doc.page_content,
-            "metadata": dict(doc.metadata)
+            "metadata": dict(doc.metadata),
+            "score": float(score) if score is not None else None
         }
-        for doc in docs
+        for doc, score in zip(docs, scores)
     ]
 
 # Create RAG Chain
 @traceable(name="create_rag_chain_with_reflection")
-def create_rag_chain(vectorstore: FAISS, conversation_history: List[Message] = None):
-    """Create the RAG chain with self-reflection and confidence assessment"""
+def create_rag_chain(vectorstore: FAISS, conversation_history: List[Message] = None, model=None):
+    """Create the RAG chain with self-reflection and confidence assessment (on ``chat_model()`` unless given)"""
     
     # Update prompt to include self-reflection and source formatting
     rag_prompt = ChatPromptTemplate.from_messages([
@@ -312,16 +667,15 @@ Provide your response in the specified JSON format.""")
     ])
 
     # Format conversation history
-    formatted_history = "\n".join([
-        f"{msg['role']}: {msg['content']}" 
-        for msg in (conversation_history or [])
-    ])
+    formatted_history = format_history(conversation_history)
     
     def format_docs(docs):
         formatted_docs = []
         for doc in docs:
             page_number = doc["metadata"].get("page_number", "Unknown")
-            formatted_doc = f"[Page {page_number}]\n{doc['page_content']}"
+            section = doc["metadata"].get("section")
+            label = f"Page {page_number}, Section {section}" if section else f"Page {page_number}"
+            formatted_doc = f"[{label}]\n{doc['page_content']}"
             formatted_docs.append(formatted_doc)
         return "\n\n---\n\n".join(formatted_docs)
 
@@ -332,15 +686,15 @@ Provide your response in the specified JSON format.""")
             conversation_history=lambda _: formatted_history,
         )
         | rag_prompt 
-        | llm
+        | (model or chat_model())
         | JsonOutputParser(pydantic_object=EnhancedRAGResponse)
     )
     
     return chain
 
 @traceable(name="create_full_doc_chain")
-def create_full_doc_chain(conversation_history: List[Message] = None):
-    """Create a chain for processing queries against the full document"""
+def create_full_doc_chain(conversation_history: List[Message] = None, user_region: Optional[str] = None):
+    """Create a chain for processing queries against every document a user's index covers"""
     
     full_doc_prompt = ChatPromptTemplate.from_messages([
        ("system", """You are an expert in building regulations at the Hilton hotel. Your job is to answer questions using only the documents provided. Follow the instructions below:
@@ -380,94 +734,443 @@ Please provide your answer based on the documents. also follow the guidelines ab
     ])
 
     try:
-        # Get path to hotel guidelines document
-        project_root = Path(__file__).parent.parent.parent
-        docs_path = project_root / "docs" / "hotel_guidelines.md"
-        
-        if not docs_path.exists():
-            return lambda x: "Documentation not found. Please contact the administrator."
-            
-        # Load full document
-        with open(docs_path, "r", encoding="utf-8") as f:
-            full_doc = f.read()
+        # Served from memory; only re-read when a file changes
+        full_doc, full_doc_tokens = load_full_document(user_region)
+        if not full_doc:
+            return RunnableLambda(lambda x: "Documentation not found. Please contact the administrator.")
+
+        if full_doc_tokens > FULL_DOC_TOKEN_LIMIT:
+            raise ValueError(
+                f"Full document has {full_doc_tokens} tokens, over the {FULL_DOC_TOKEN_LIMIT} token limit"
+            )
 
         # Create a simpler chain structure to avoid serialization issues
-        def run_chain(inputs):
-            formatted_history = "\n".join([
-                f"{msg['role']}: {msg['content']}" 
-                for msg in (conversation_history or [])
-            ])
-            
+        def build_messages(inputs):
             prompt_args = {
-                "conversation_history": formatted_history,
+                "conversation_history": format_history(conversation_history),
                 "question": inputs["question"],
                 "full_doc": full_doc
             }
-            
-            messages = full_doc_prompt.format_messages(**prompt_args)
-            response = fast_llm.invoke(messages)
-            return response.content
-            
-        return RunnableLambda(run_chain)
+            return full_doc_prompt.format_messages(**prompt_args)
+
+        # Piping through the model (rather than wrapping the call) keeps
+        # invoke, ainvoke and astream token streaming all available
+        return RunnableLambda(build_messages) | fast_chat_model() | StrOutputParser()
 
     except Exception as e:
         print(f"Error creating full document chain: {str(e)}")
         raise
 
 # Main RAG Pipeline
+CONFIDENCE_THRESHOLD = 0.7
+
+def assess_response(initial_response: Dict[str, Any]):
+    """Return (confidence, needs_rerouting, should_fallback) for a RAG response"""
+    confidence = float(initial_response.get("confidence", 0))
+    needs_rerouting = initial_response.get("needs_rerouting", False)
+    return confidence, needs_rerouting, bool(needs_rerouting or confidence < CONFIDENCE_THRESHOLD)
+
+def build_pipeline_result(user_query: str, user_region: str, refined_query: str,
+                          final_response: str, retrieved_docs: List[Dict],
+                          conversation_history: List[Message], confidence: float,
+                          response_type: str, sources: List[Source],
+                          cache_hit: bool = False) -> Dict[str, Any]:
+    """Assemble the dict returned by the pipeline"""
+    record_response(response_type, cache_hit)
+    return {
+        "original_query": user_query,
+        "refined_query": refined_query,
+        "response": final_response,
+        "retrieved_documents": retrieved_docs,
+        "conversation_history": conversation_history,
+        "confidence": confidence,
+        "response_type": response_type,
+        "sources": sources,
+        "region": user_region,
+        "cache_hit": cache_hit,
+        "coalesced": False
+    }
+
+def finish_answer(user_query: str, user_region: str, refined_query: str, query_embedding: Optional[List[float]],
+                  retrieved_docs: List[Dict], conversation_history: List[Message],
+                  outcome: Tuple[str, str, List[Source], float]) -> Dict[str, Any]:
+    """Build the pipeline result for a routed answer and remember it in the semantic cache"""
+    final_response, response_type, sources, confidence = outcome
+    result = build_pipeline_result(
+        user_query, user_region, refined_query, final_response, retrieved_docs,
+        conversation_history, confidence, response_type, sources
+    )
+    store_cached_answer(query_embedding, retrieved_docs, result)
+    return result
+
+def lookup_cached_answer(query_embedding: Optional[List[float]], retrieved_docs: List[Dict]) -> Optional[Dict[str, Any]]:
+    """Return a cached answer for a similar query that retrieved the same chunks"""
+    if query_embedding is None:
+        return None
+    cached = semantic_cache.lookup(query_embedding, [chunk_id(doc["page_content"]) for doc in retrieved_docs])
+    if cached:
+        print(f"Semantic cache hit with similarity={cached['similarity']:.3f}")
+    return cached
+
+def store_cached_answer(query_embedding: Optional[List[float]], retrieved_docs: List[Dict], result: Dict[str, Any]) -> None:
+    # A failed fallback is transient and should be retried, not cached
+    if query_embedding is None or result["response_type"] == "rag_fallback":
+        return
+    semantic_cache.store(
+        query_embedding,
+        [chunk_id(doc["page_content"]) for doc in retrieved_docs],
+        answer=result["response"],
+        sources=result["sources"],
+        confidence=result["confidence"],
+        response_type=result["response_type"],
+    )
+
+def select_context(refined_query: str, retrieved_docs: List[Dict]) -> List[Dict]:
+    """Rerank retrieved chunks and keep the best ones within RERANK_TOKEN_BUDGET"""
+    with track_stage("rerank"):
+        return rerank_documents(reranker, refined_query, retrieved_docs, stats=rerank_stats)
+
+async def aselect_context(refined_query: str, retrieved_docs: List[Dict]) -> List[Dict]:
+    """Async version of ``select_context``; model-based rerankers run in a thread"""
+    if reranker.blocking:
+        return await asyncio.to_thread(select_context, refined_query, retrieved_docs)
+    return select_context(refined_query, retrieved_docs)
+
+def full_document_sources(user_region: Optional[str] = None) -> List[Path]:
+    """Sources a user's index covers: docs/*.md plus their region's documents"""
+    region = region_slug(user_region)
+    return get_source_paths() + (get_source_paths(region) if region else [])
+
+def load_full_document(user_region: Optional[str] = None) -> Tuple[str, int]:
+    """Return (text, token count) of all of a user's sources"""
+    parts = [full_document_cache.get(path) for path in full_document_sources(user_region)]
+    return "\n\n".join(text for text, _ in parts), sum(tokens for _, tokens in parts)
+
+def full_doc_fallback_allowed(user_region: Optional[str] = None) -> bool:
+    """Whether the full document fits within FULL_DOC_TOKEN_LIMIT"""
+    full_doc, tokens = load_full_document(user_region)
+    return bool(full_doc) and tokens <= FULL_DOC_TOKEN_LIMIT
+
+def rag_outcome(response: Dict[str, Any], response_type: str = "rag") -> Tuple[str, str, List[Source], float]:
+    """Return (final_response, response_type, sources, confidence) for a RAG chain answer"""
+    return response["answer"], response_type, response.get("sources", []), float(response.get("confidence", 0))
+
+def route_response(initial_response: Dict[str, Any]) -> Tuple[float, bool]:
+    """Log the routing decision for a first answer; returns (confidence, should_fallback)"""
+    confidence, needs_rerouting, should_fallback = assess_response(initial_response)
+    if should_fallback:
+        print(f"Rerouting due to: needs_rerouting={needs_rerouting}, confidence={confidence}")
+    else:
+        print(f"Using RAG response with confidence={confidence}")
+    return confidence, should_fallback
+
+def fallback_failed(initial_response: Dict[str, Any], error: Exception) -> Tuple[str, str, List[Source], float]:
+    """Keep the first answer when every fallback tier failed"""
+    print(f"Fallback failed: {str(error)}")
+    return rag_outcome(initial_response, "rag_fallback")
+
+def widen_context(vectorstore: FAISS, retrieved_docs: List[Dict], wider_docs: List[Dict]) -> List[Dict]:
+    """Tier 1 context: the hits widened within FALLBACK_TOKEN_BUDGET"""
+    expanded_docs, tokens = expand_context(vectorstore, retrieved_docs, wider_docs)
+    print(f"Expanded fallback context: {len(expanded_docs)} chunks, {tokens} tokens")
+    return expanded_docs
+
+def escalate_to_full_document(expanded_response: Dict[str, Any], user_region: Optional[str]) -> bool:
+    """Whether tier 2 (the whole document) should replace the tier 1 answer"""
+    confidence, _, still_uncertain = assess_response(expanded_response)
+    if not still_uncertain or not full_doc_fallback_allowed(user_region):
+        return False
+    print(f"Expanded context still uncertain (confidence={confidence}), using full document")
+    return True
+
+@traceable(name="tiered_fallback")
+def run_fallback(vectorstore: FAISS, user_query: str, user_region: Optional[str], refined_query: str,
+                 query_embedding: Optional[List[float]], retrieved_docs: List[Dict],
+                 conversation_history: List[Message] = None):
+    """Tiered fallback for low-confidence answers.
+
+    Tier 1 re-answers over a widened context (larger k, neighboring chunks and
+    the rest of the hit sections) capped at FALLBACK_TOKEN_BUDGET, on the fast
+    model like the full-document tier. Only when
+    that is still not confident, and the document fits FULL_DOC_TOKEN_LIMIT,
+    does tier 2 send the whole document. Returns
+    (final_response, response_type, sources, confidence).
+    """
+    with track_stage("fallback"):
+        wider_docs = retrieve_documents(vectorstore, refined_query, conversation_history, query_embedding, k=FALLBACK_K)
+        expanded_response = create_rag_chain(vectorstore, conversation_history, fast_chat_model()).invoke({
+            "question": user_query,
+            "retrieved_docs": widen_context(vectorstore, retrieved_docs, wider_docs)
+        })
+        outcome = rag_outcome(expanded_response, "expanded_rag")
+        if not escalate_to_full_document(expanded_response, user_region):
+            return outcome
+
+        final_response = create_full_doc_chain(conversation_history, user_region).invoke({"question": user_query})
+        return final_response, "full_doc", [], outcome[3]  # Full doc chain doesn't provide sources
+
+async def astream_fallback(vectorstore: FAISS, user_query: str, user_region: Optional[str], refined_query: str,
+                           query_embedding: Optional[List[float]], retrieved_docs: List[Dict],
+                           conversation_history: List[Message] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Async ``run_fallback`` as events.
+
+    Yields ``token`` events for each tier's answer, ``reroute`` before tier 2,
+    and finally ``outcome`` with (final_response, response_type, sources,
+    confidence).
+    """
+    with track_stage("fallback"):
+        wider_docs = await aretrieve_documents(vectorstore, refined_query, conversation_history, query_embedding, k=FALLBACK_K)
+        expanded_response: Dict[str, Any] = {}
+        async for event in astream_rag_answer(create_rag_chain(vectorstore, conversation_history, fast_chat_model()), {
+            "question": user_query,
+            "retrieved_docs": widen_context(vectorstore, retrieved_docs, wider_docs)
+        }):
+            if event["event"] == "response":
+                expanded_response = event["data"]
+            else:
+                yield event
+        outcome = rag_outcome(expanded_response, "expanded_rag")
+        if escalate_to_full_document(expanded_response, user_region):
+            yield {"event": "reroute", "data": {"confidence": outcome[3], "tier": "full_doc"}}
+            chunks = []
+            async for chunk in create_full_doc_chain(conversation_history, user_region).astream({"question": user_query}):
+                chunks.append(chunk)
+                yield {"event": "token", "data": {"text": chunk}}
+            outcome = ("".join(chunks), "full_doc", [], outcome[3])
+        yield {"event": "outcome", "data": outcome}
+
+@traceable(name="tiered_fallback")
+async def arun_fallback(vectorstore: FAISS, user_query: str, user_region: Optional[str], refined_query: str,
+                        query_embedding: Optional[List[float]], retrieved_docs: List[Dict],
+                        conversation_history: List[Message] = None):
+    """Async version of ``run_fallback``"""
+    outcome = None
+    async for event in astream_fallback(vectorstore, user_query, user_region, refined_query, query_embedding,
+                                        retrieved_docs, conversation_history):
+        if event["event"] == "outcome":
+            outcome = event["data"]
+    return outcome
+
+async def astream_rag_answer(rag_chain, inputs: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+    """Stream a RAG chain as ``token`` events followed by a ``response`` event.
+
+    JsonOutputParser emits progressively larger partial objects; only the
+    newly generated part of the answer field is forwarded.
+    """
+    response: Dict[str, Any] = {}
+    streamed_answer = ""
+    async for partial in rag_chain.astream(inputs):
+        if not isinstance(partial, dict):
+            continue
+        response = partial
+        answer = partial.get("answer") or ""
+        if isinstance(answer, str) and len(answer) > len(streamed_answer):
+            yield {"event": "token", "data": {"text": answer[len(streamed_answer):]}}
+            streamed_answer = answer
+    response.setdefault("answer", streamed_answer)
+    yield {"event": "response", "data": response}
+
 @traceable(name="rag_pipeline_with_routing")
 def process_query(user_query: str, user_region: str, conversation_history: List[Message] = None):
     """Complete RAG pipeline with self-routing"""
     try:
-        # Initialize vectorstore
-        vectorstore = initialize_vectorstore()
+        with track_stage("pipeline"):
+            # Reuse the index loaded at startup; only the search runs per query
+            vectorstore = route_vectorstore(user_region)
+
+            # Initial RAG attempt
+            refined_query = translate_query(user_query, conversation_history)
+            query_embedding, retrieved_docs = gather_documents(vectorstore, refined_query, conversation_history)
 
-        # Initial RAG attempt
-        refined_query = basic_translate_query(user_query, conversation_history)
-        retrieved_docs = retrieve_documents(vectorstore, refined_query, conversation_history)
+            # Skip generation when a near-identical question over the same chunks was answered
+            cached = lookup_cached_answer(query_embedding, retrieved_docs)
+            if cached:
+                return build_pipeline_result(
+                    user_query, user_region, refined_query, cached["answer"], retrieved_docs,
+                    conversation_history, cached["confidence"], cached["response_type"],
+                    cached["sources"], cache_hit=True
+                )
         
-        rag_chain = create_rag_chain(vectorstore, conversation_history)
-        initial_response = rag_chain.invoke({
-            "question": user_query,
-            "retrieved_docs": retrieved_docs
-        })
+            # Only the most relevant chunks within the token budget reach the prompt
+            context_docs = select_context(refined_query, retrieved_docs)
+            rag_chain = create_rag_chain(vectorstore, conversation_history)
+            with track_stage("generation"):
+                initial_response = rag_chain.invoke({
+                    "question": user_query,
+                    "retrieved_docs": context_docs
+                })
 
-        # Convert confidence to float and handle routing
-        confidence = float(initial_response.get("confidence", 0))
-        needs_rerouting = initial_response.get("needs_rerouting", False)
+            outcome = rag_outcome(initial_response)
+            _, should_fallback = route_response(initial_response)
+            if should_fallback:
+                try:
+                    outcome = run_fallback(
+                        vectorstore, user_query, user_region, refined_query, query_embedding,
+                        retrieved_docs, conversation_history
+                    )
+                except Exception as e:
+                    outcome = fallback_failed(initial_response, e)
 
-        if needs_rerouting or confidence < 0.7:
-            try:
-                print(f"Rerouting due to: needs_rerouting={needs_rerouting}, confidence={confidence}")
-                full_doc_chain = create_full_doc_chain(conversation_history)
-                final_response = full_doc_chain.invoke({
-                    "question": user_query
-                })
-                response_type = "full_doc"
-                sources = []  # Full doc chain doesn't provide sources
-            except Exception as e:
-                print(f"Full doc chain failed: {str(e)}")
-                final_response = initial_response["answer"]
-                response_type = "rag_fallback"
-                sources = initial_response.get("sources", [])
-        else:
-            print(f"Using RAG response with confidence={confidence}")
-            final_response = initial_response["answer"]
-            response_type = "rag"
-            sources = initial_response.get("sources", [])
-
-        return {
-            "original_query": user_query,
-            "refined_query": refined_query,
-            "response": final_response,
-            "retrieved_documents": retrieved_docs,
-            "conversation_history": conversation_history,
-            "confidence": confidence,
-            "response_type": response_type,
-            "sources": sources,
-            "region": user_region
-        }
+            return finish_answer(user_query, user_region, refined_query, query_embedding,
+                                 retrieved_docs, conversation_history, outcome)
+
+    except Exception as e:
+        print(f"Pipeline error: {str(e)}")
+        raise Exception(f"Failed to process query: {str(e)}")
+
+@traceable(name="answer_from_documents")
+async def aanswer_from_documents(vectorstore: FAISS, user_query: str, user_region: str, refined_query: str,
+                                 query_embedding: Optional[List[float]], retrieved_docs: List[Dict],
+                                 conversation_history: List[Message] = None) -> Dict[str, Any]:
+    """Answer from already retrieved chunks: cache, rerank, generate and self-route"""
+    cached = lookup_cached_answer(query_embedding, retrieved_docs)
+    if cached:
+        return build_pipeline_result(
+            user_query, user_region, refined_query, cached["answer"], retrieved_docs,
+            conversation_history, cached["confidence"], cached["response_type"],
+            cached["sources"], cache_hit=True
+        )
+
+    context_docs = await aselect_context(refined_query, retrieved_docs)
+    rag_chain = create_rag_chain(vectorstore, conversation_history)
+    primary = rag_chain.ainvoke({
+        "question": user_query,
+        "retrieved_docs": context_docs
+    })
+
+    # Speculatively start the fallback alongside the primary chain when it
+    # looks likely to be needed; the loser is cancelled once routing is known
+    speculative = None
+    if SPECULATIVE_FALLBACK and fallback_predictor.predict(refined_query, retrieved_docs):
+        print("Speculatively launching fallback")
+        speculative = asyncio.create_task(arun_fallback(
+            vectorstore, user_query, user_region, refined_query, query_embedding, retrieved_docs, conversation_history
+        ))
+        # Retrieve the exception of a discarded run so it is not logged as unhandled
+        speculative.add_done_callback(lambda task: task.cancelled() or task.exception())
+    try:
+        with track_stage("generation"):
+            initial_response = await primary
+    except BaseException:
+        if speculative:
+            speculative.cancel()
+        raise
+
+    outcome = rag_outcome(initial_response)
+    _, should_fallback = route_response(initial_response)
+    speculation_stats.record(speculative is not None, should_fallback)
+    if speculative and not should_fallback:
+        speculative.cancel()
+
+    if should_fallback:
+        try:
+            outcome = await (speculative or arun_fallback(
+                vectorstore, user_query, user_region, refined_query, query_embedding,
+                retrieved_docs, conversation_history
+            ))
+        except Exception as e:
+            outcome = fallback_failed(initial_response, e)
+
+    return finish_answer(user_query, user_region, refined_query, query_embedding,
+                         retrieved_docs, conversation_history, outcome)
+
+async def aprocess_query(user_query: str, user_region: str, conversation_history: List[Message] = None):
+    """Async RAG pipeline with self-routing; every model call is awaited.
+
+    Concurrent calls with the same question, region and history share one
+    run (see coalescing.py); the callers that joined get ``coalesced`` set.
+    """
+    key = pipeline_key(user_query, user_region, conversation_history)
+    result, shared = await pipeline_flights.run(
+        key, lambda: arun_pipeline(user_query, user_region, conversation_history)
+    )
+    if not shared:
+        return result
+    print("Coalesced query with an identical in-flight request")
+    return {**result, "original_query": user_query, "coalesced": True}
+
+@traceable(name="rag_pipeline_with_routing")
+async def arun_pipeline(user_query: str, user_region: str, conversation_history: List[Message] = None):
+    """One run of the async pipeline, without coalescing"""
+    try:
+        with track_stage("pipeline"):
+            vectorstore = await aroute_vectorstore(user_region)
+
+            # Initial RAG attempt
+            refined_query = await atranslate_query(user_query, conversation_history)
+            query_embedding, retrieved_docs = await agather_documents(vectorstore, refined_query, conversation_history)
+
+            return await aanswer_from_documents(
+                vectorstore, user_query, user_region, refined_query, query_embedding,
+                retrieved_docs, conversation_history
+            )
 
     except Exception as e:
         print(f"Pipeline error: {str(e)}")
-        raise Exception(f"Failed to process query: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Failed to process query: {str(e)}")
+
+@traceable(name="rag_pipeline_streaming")
+async def astream_query(user_query: str, user_region: str, conversation_history: List[Message] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Streaming RAG pipeline.
+
+    Yields ``{"event": ..., "data": ...}`` dicts: ``refined_query``, ``sources``
+    (the retrieved chunks), ``token`` for every answer delta, ``reroute`` when
+    the answer is replaced by a fallback tier (clients should discard the
+    tokens received so far), and finally ``result`` carrying the same dict
+    ``aprocess_query`` returns.
+    """
+    vectorstore = await aroute_vectorstore(user_region)
+
+    refined_query = await atranslate_query(user_query, conversation_history)
+    yield {"event": "refined_query", "data": {"refined_query": refined_query}}
+
+    query_embedding, retrieved_docs = await agather_documents(vectorstore, refined_query, conversation_history)
+    yield {"event": "sources", "data": {"sources": [
+        {
+            "page_number": doc["metadata"].get("page_number"),
+            "document_id": doc["metadata"].get("document_id"),
+        }
+        for doc in retrieved_docs
+    ]}}
+
+    cached = lookup_cached_answer(query_embedding, retrieved_docs)
+    if cached:
+        yield {"event": "token", "data": {"text": cached["answer"]}}
+        yield {"event": "result", "data": build_pipeline_result(
+            user_query, user_region, refined_query, cached["answer"], retrieved_docs,
+            conversation_history, cached["confidence"], cached["response_type"],
+            cached["sources"], cache_hit=True
+        )}
+        return
+
+    context_docs = await aselect_context(refined_query, retrieved_docs)
+    rag_chain = create_rag_chain(vectorstore, conversation_history)
+    initial_response: Dict[str, Any] = {}
+    with track_stage("generation"):
+        async for event in astream_rag_answer(rag_chain, {
+            "question": user_query,
+            "retrieved_docs": context_docs
+        }):
+            if event["event"] == "response":
+                initial_response = event["data"]
+            else:
+                yield event
+
+    outcome = rag_outcome(initial_response)
+    confidence, should_fallback = route_response(initial_response)
+    if should_fallback:
+        # Clients discard the tokens received so far on every reroute
+        yield {"event": "reroute", "data": {"confidence": confidence, "tier": "expanded_rag"}}
+        try:
+            async for event in astream_fallback(vectorstore, user_query, user_region, refined_query,
+                                                query_embedding, retrieved_docs, conversation_history):
+                if event["event"] == "outcome":
+                    outcome = event["data"]
+                else:
+                    yield event
+        except Exception as e:
+            outcome = fallback_failed(initial_response, e)
+
+    result = finish_answer(user_query, user_region, refined_query, query_embedding,
+                           retrieved_docs, conversation_history, outcome)
+    yield {"event": "result", "data": result}
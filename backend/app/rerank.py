@@ -0,0 +1,145 @@
+import math
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from .fallback import count_tokens
+from .text_utils import tokenize
+
+RERANKER = os.getenv("RERANKER", "lexical").lower()
+RERANK_TOKEN_BUDGET = int(os.getenv("RERANK_TOKEN_BUDGET", "4000"))
+RERANK_MAX_DOCS = int(os.getenv("RERANK_MAX_DOCS", "8"))
+CROSS_ENCODER_MODEL = os.getenv("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+
+class Reranker:
+    """Scores retrieved chunks against the query; higher is more relevant"""
+    name = "none"
+    # Heavy rerankers are run off the event loop
+    blocking = False
+
+    def score(self, query: str, docs: List[Dict[str, Any]]) -> List[float]:
+        # Keep retrieval order
+        return [float(len(docs) - rank) for rank in range(len(docs))]
+
+
+class LexicalOverlapReranker(Reranker):
+    """TF-IDF overlap between query and chunk terms, computed over the candidates.
+
+    A small prior on the original rank breaks ties in favor of what retrieval
+    ranked higher.
+    """
+    name = "lexical"
+
+    def __init__(self, rank_prior: float = 0.1):
+        self.rank_prior = rank_prior
+
+    def score(self, query: str, docs: List[Dict[str, Any]]) -> List[float]:
+        query_terms = set(tokenize(query))
+        doc_terms = [Counter(tokenize(doc["page_content"])) for doc in docs]
+        total = len(docs)
+        idf = {
+            term: math.log(1 + total / (1 + sum(1 for terms in doc_terms if term in terms)))
+            for term in query_terms
+        }
+        max_score = sum(idf.values()) or 1.0
+        return [
+            sum(idf[term] * (1 + math.log(terms[term])) for term in query_terms if terms[term]) / max_score
+            + self.rank_prior / (rank + 1)
+            for rank, terms in enumerate(doc_terms)
+        ]
+
+
+class CrossEncoderReranker(Reranker):
+    """Small CPU cross-encoder (sentence-transformers), loaded on first use"""
+    name = "cross-encoder"
+    blocking = True
+
+    def __init__(self, model_name: str = CROSS_ENCODER_MODEL):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name, device="cpu")
+
+    def score(self, query: str, docs: List[Dict[str, Any]]) -> List[float]:
+        return [float(score) for score in self.model.predict([(query, doc["page_content"]) for doc in docs])]
+
+
+def get_reranker(name: str = RERANKER) -> Reranker:
+    if name in ("cross-encoder", "cross_encoder"):
+        try:
+            return CrossEncoderReranker()
+        except Exception as e:
+            print(f"Cross-encoder reranker unavailable ({str(e)}), using lexical reranker")
+            return LexicalOverlapReranker()
+    if name == "lexical":
+        return LexicalOverlapReranker()
+    return Reranker()
+
+
+class RerankStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.docs_in = 0
+        self.docs_out = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.seconds = 0.0
+
+    def record(self, docs_in: int, docs_out: int, tokens_in: int, tokens_out: int, seconds: float) -> None:
+        with self._lock:
+            self.calls += 1
+            self.docs_in += docs_in
+            self.docs_out += docs_out
+            self.tokens_in += tokens_in
+            self.tokens_out += tokens_out
+            self.seconds += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "reranker": RERANKER,
+            "calls": self.calls,
+            "docs_in": self.docs_in,
+            "docs_out": self.docs_out,
+            "prompt_tokens_in": self.tokens_in,
+            "prompt_tokens_out": self.tokens_out,
+            "prompt_tokens_saved": self.tokens_in - self.tokens_out,
+            "token_reduction": round(1 - self.tokens_out / self.tokens_in, 4) if self.tokens_in else 0.0,
+            "avg_rerank_ms": round(1000 * self.seconds / self.calls, 2) if self.calls else 0.0,
+        }
+
+
+def rerank_documents(reranker: Reranker, query: str, docs: List[Dict[str, Any]],
+                     token_budget: int = RERANK_TOKEN_BUDGET, max_docs: int = RERANK_MAX_DOCS,
+                     stats: Optional[RerankStats] = None) -> List[Dict[str, Any]]:
+    """Keep the best-scoring chunks that fit within ``token_budget``.
+
+    At least one chunk is always kept so generation never runs without context.
+    """
+    if not docs:
+        return docs
+
+    start = time.perf_counter()
+    scores = reranker.score(query, docs)
+    ranked = sorted(zip(docs, scores), key=lambda item: item[1], reverse=True)
+
+    tokens = [count_tokens(doc["page_content"]) for doc in docs]
+    token_by_doc = {id(doc): count for doc, count in zip(docs, tokens)}
+    kept, used = [], 0
+    for doc, score in ranked:
+        if len(kept) >= max_docs:
+            break
+        doc_tokens = token_by_doc[id(doc)]
+        if kept and used + doc_tokens > token_budget:
+            continue
+        kept.append({**doc, "rerank_score": score})
+        used += doc_tokens
+
+    if stats is not None:
+        stats.record(len(docs), len(kept), sum(tokens), used, time.perf_counter() - start)
+    return kept
+
+
+reranker = get_reranker()
+rerank_stats = RerankStats()
@@ -0,0 +1,35 @@
+import asyncio
+import random
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+# Retry helpers for model calls, shared by the batch runner and the answer
+# job queue. No RAG imports, so importing this does not load the models.
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429 or "RateLimit" in type(error).__name__
+
+
+def retry_after_seconds(error: Exception, attempt: int) -> float:
+    """Server-suggested wait if present, otherwise exponential backoff with jitter"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+
+
+async def retry_rate_limited(call: Callable[[], Awaitable[T]], max_retries: int, label: str = "Request") -> T:
+    """Await ``call()``, retrying rate-limited attempts after the suggested wait"""
+    for attempt in range(max_retries + 1):
+        try:
+            return await call()
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == max_retries:
+                raise
+            delay = retry_after_seconds(e, attempt)
+            print(f"{label} rate limited, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
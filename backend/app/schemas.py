@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, field_validator
+from datetime import datetime, timezone
 from typing import List, Optional, Dict, Any
 
 class UserBase(BaseModel):
@@ -52,6 +52,14 @@ class MessageCreate(MessageBase):
     id: str
     timestamp: datetime
 
+    @field_validator("timestamp")
+    @classmethod
+    def to_naive_utc(cls, value: datetime) -> datetime:
+        """Clients send ISO strings ending in Z; the columns hold naive UTC like datetime.utcnow()"""
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
 class AIMessageResponse(BaseModel):
     id: str
     content: str
@@ -64,10 +72,20 @@ class Message(MessageBase):
     id: str
     timestamp: datetime
     aiResponse: Optional[AIMessageResponse] = None
+    # Set when the answer is being generated in the background; poll /api/jobs/{id}
+    pendingResponseId: Optional[str] = None
 
     class Config:
         from_attributes = True
 
+class AnswerJob(BaseModel):
+    id: str
+    status: str  # pending, running, complete or failed
+    attempts: int
+    error: Optional[str] = None
+    chatSessionId: str
+    aiResponse: Optional[AIMessageResponse] = None
+
 class ChatSessionBase(BaseModel):
     title: str
     userId: str
@@ -0,0 +1,144 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+def chunk_id(page_content: str) -> str:
+    """Stable id of a retrieved chunk, derived from its text"""
+    return hashlib.sha1(page_content.encode("utf-8")).hexdigest()
+
+
+def chunk_set_key(chunk_ids: Iterable[str]) -> str:
+    """Order-independent key for a set of retrieved chunks"""
+    return hashlib.sha1("|".join(sorted(set(chunk_ids))).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    embedding: np.ndarray
+    chunk_key: str
+    answer: str
+    sources: List[Dict[str, Any]]
+    confidence: float
+    response_type: str
+    created_at: float
+
+
+class SemanticCache:
+    """Answer cache keyed on refined-query embeddings.
+
+    A lookup hits when a stored entry was produced from the same set of
+    retrieved chunks and its query embedding has a cosine similarity of at
+    least ``similarity_threshold`` with the new one. Entries expire after
+    ``ttl_seconds`` and the least recently used entry is evicted once
+    ``max_entries`` is reached.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600,
+                 similarity_threshold: float = 0.95, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls) -> "SemanticCache":
+        return cls(
+            max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "512")),
+            ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL", "3600")),
+            similarity_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+            enabled=os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true",
+        )
+
+    def lookup(self, embedding: List[float], chunk_ids: Iterable[str]) -> Optional[Dict[str, Any]]:
+        """Return the cached answer for a similar query over the same chunks"""
+        if not self.enabled:
+            return None
+
+        query = _normalize(embedding)
+        key = chunk_set_key(chunk_ids)
+        now = time.time()
+
+        with self._lock:
+            best_id, best_score = None, -1.0
+            for entry_id, entry in list(self._entries.items()):
+                if now - entry.created_at > self.ttl_seconds:
+                    del self._entries[entry_id]
+                    continue
+                if entry.chunk_key != key:
+                    continue
+                score = float(np.dot(query, entry.embedding))
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None or best_score < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            entry = self._entries[best_id]
+            return {
+                "answer": entry.answer,
+                "sources": entry.sources,
+                "confidence": entry.confidence,
+                "response_type": entry.response_type,
+                "similarity": best_score,
+            }
+
+    def store(self, embedding: List[float], chunk_ids: Iterable[str], answer: str,
+              sources: List[Dict[str, Any]], confidence: float, response_type: str) -> None:
+        if not self.enabled:
+            return
+
+        entry = CacheEntry(
+            embedding=_normalize(embedding),
+            chunk_key=chunk_set_key(chunk_ids),
+            answer=answer,
+            sources=sources,
+            confidence=confidence,
+            response_type=response_type,
+            created_at=time.time(),
+        )
+        with self._lock:
+            self._entries[uuid.uuid4().hex] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self) -> None:
+        """Drop every entry, e.g. after the index has been rebuilt"""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def _normalize(embedding: List[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,134 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+# background: serve at once and load the RAG subsystem alongside,
+# blocking: finish loading before the first request, off: load on first use
+RAG_WARM_UP = os.getenv("RAG_WARM_UP", "background").lower()
+
+
+class RAGService:
+    """Lazily loaded entry point to the RAG subsystem.
+
+    Importing ``rag`` pulls in LangChain, the OpenAI SDK and FAISS, which
+    takes seconds. The web app only imports this module, so workers and
+    ``--reload`` cycles come up quickly; ``warm_up`` does the import, builds
+    the model clients and loads the index during startup, and a request that
+    arrives first loads whatever is missing on demand.
+    """
+
+    def __init__(self):
+        self._module = None
+        self._lock = threading.Lock()
+        self.import_seconds: Optional[float] = None
+        self.warm_up_seconds: Optional[float] = None
+        self.warm_up_task: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def load(self):
+        """Import the RAG module once and return it"""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    from dotenv import load_dotenv
+                    # Before the import, so .env applies to settings read at import time
+                    load_dotenv()
+                    from . import rag
+                    self.import_seconds = time.perf_counter() - start
+                    self._module = rag
+        return self._module
+
+    async def aload(self):
+        """``load`` without blocking the event loop"""
+        if self._module is not None:
+            return self._module
+        return await asyncio.to_thread(self.load)
+
+    def warm_up(self, load_index: bool = True) -> None:
+        """Import the subsystem, build the model clients and load the default index"""
+        start = time.perf_counter()
+        try:
+            rag = self.load()
+            rag.chat_model()
+            rag.fast_chat_model()
+            rag.embedding_model()
+        except Exception as e:
+            print(f"RAG warm-up failed: {str(e)}")
+            return
+        if load_index:
+            try:
+                rag.get_vectorstore()
+            except Exception as e:
+                print(f"Vector store not loaded at startup: {str(e)}")
+        self.warm_up_seconds = time.perf_counter() - start
+        print(f"RAG service ready in {self.warm_up_seconds:.2f}s (import {self.import_seconds:.2f}s)")
+
+    async def start(self, mode: str = RAG_WARM_UP) -> Optional[asyncio.Task]:
+        """Warm up according to RAG_WARM_UP; returns the task when it runs in the background"""
+        if mode == "blocking":
+            await asyncio.to_thread(self.warm_up)
+        elif mode == "background":
+            self.warm_up_task = asyncio.create_task(asyncio.to_thread(self.warm_up))
+            self.warm_up_task.add_done_callback(self._warm_up_done)
+            return self.warm_up_task
+        return None
+
+    @staticmethod
+    def _warm_up_done(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            print(f"RAG warm-up failed: {str(task.exception())}")
+
+    async def stop(self) -> None:
+        """Stop waiting for a background warm-up that is still running.
+
+        The thread itself cannot be interrupted and finishes on its own.
+        """
+        task, self.warm_up_task = self.warm_up_task, None
+        if task is None or task.done():
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def aprocess_query(self, user_query: str, user_region: str,
+                             conversation_history: List[Dict[str, str]] = None) -> Dict[str, Any]:
+        rag = await self.aload()
+        return await rag.aprocess_query(user_query, user_region, conversation_history)
+
+    async def astream_query(self, user_query: str, user_region: str,
+                            conversation_history: List[Dict[str, str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        rag = await self.aload()
+        async for event in rag.astream_query(user_query, user_region, conversation_history):
+            yield event
+
+    async def asummarize_history(self, previous_summary: Optional[str], messages: List[Dict[str, str]]) -> str:
+        rag = await self.aload()
+        return await rag.asummarize_history(previous_summary, messages)
+
+    def vectorstore_stats(self) -> Dict[str, Any]:
+        return self._module.vectorstore_registry.stats() if self.loaded else {}
+
+    def evict_idle_shards(self) -> List[str]:
+        # Nothing to evict before the subsystem is loaded; do not load it for that
+        return self._module.evict_idle_shards() if self.loaded else []
+
+    def stats(self) -> Dict[str, Any]:
+        service = {
+            "loaded": self.loaded,
+            "import_seconds": round(self.import_seconds, 3) if self.import_seconds is not None else None,
+            "warm_up_seconds": round(self.warm_up_seconds, 3) if self.warm_up_seconds is not None else None,
+        }
+        if not self.loaded:
+            return {"service": service}
+        return {"service": service, **self._module.get_stats()}
+
+
+rag_service = RAGService()
@@ -0,0 +1,66 @@
+import asyncio
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Region documents live in docs/regions/<region>/*.md, global ones in docs/*.md
+REGIONS_DIR = "regions"
+REGION_STORE_PREFIX = "region:"
+# Region shards not searched for this long are dropped from memory (0 disables eviction)
+SHARD_IDLE_SECONDS = float(os.getenv("SHARD_IDLE_SECONDS", "900"))
+SHARD_EVICT_INTERVAL = float(os.getenv("SHARD_EVICT_INTERVAL", "60"))
+
+
+def region_slug(region: Optional[str]) -> Optional[str]:
+    """Normalize a user region ("EMEA", "North America") to a directory name"""
+    if not region:
+        return None
+    slug = re.sub(r"[^a-z0-9]+", "-", region.strip().lower()).strip("-")
+    return slug or None
+
+
+def region_store_name(slug: str) -> str:
+    return f"{REGION_STORE_PREFIX}{slug}"
+
+
+class MergedDocstore:
+    """Read-only union of the docstores of several shards"""
+
+    def __init__(self, shards: List[Any]):
+        self._dict: Dict[str, Any] = {}
+        for shard in shards:
+            self._dict.update(getattr(shard.docstore, "_dict", {}))
+
+    def search(self, search: str):
+        return self._dict.get(search, f"ID {search} not found.")
+
+
+class ShardedStore:
+    """Searches a set of FAISS shards as one vector store.
+
+    Each shard is searched with the same query vector and the hits are merged
+    by distance, so the search cost follows the size of the shards a user may
+    access rather than the whole corpus. Only the read paths used by retrieval
+    are implemented; shards are updated through their own indexers.
+    """
+
+    def __init__(self, shards: Dict[str, Any]):
+        self.shards = shards
+        self.docstore = MergedDocstore(list(shards.values()))
+
+    @property
+    def members(self) -> Tuple[int, ...]:
+        return tuple(id(shard) for shard in self.shards.values())
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs):
+        results = []
+        for shard in self.shards.values():
+            results.extend(shard.similarity_search_with_score_by_vector(embedding, k=k, **kwargs))
+        return sorted(results, key=lambda item: item[1])[:k]
+
+    async def asimilarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs):
+        per_shard = await asyncio.gather(*(
+            shard.asimilarity_search_with_score_by_vector(embedding, k=k, **kwargs)
+            for shard in self.shards.values()
+        ))
+        return sorted((item for results in per_shard for item in results), key=lambda item: item[1])[:k]
@@ -0,0 +1,86 @@
+import os
+import threading
+from typing import Any, Dict, List
+
+from .text_utils import content_words
+
+# Launch the fallback alongside the primary chain when it is predicted
+SPECULATIVE_FALLBACK = os.getenv("RAG_SPECULATIVE_FALLBACK", "false").lower() == "true"
+
+
+class FallbackPredictor:
+    """Cheap local estimate of whether a query will need the fallback path.
+
+    Combines two signals that are available before generation starts: how far
+    the best retrieved chunk is from the query (L2 distance of normalized
+    embeddings, 0 = identical, 2 = opposite) and how many of the query's
+    content words appear in the retrieved text at all.
+    """
+
+    def __init__(self, threshold: float = 0.5, distance_floor: float = 0.6,
+                 distance_ceiling: float = 1.2):
+        self.threshold = threshold
+        self.distance_floor = distance_floor
+        self.distance_ceiling = distance_ceiling
+
+    def score(self, refined_query: str, retrieved_docs: List[Dict[str, Any]]) -> float:
+        """Return a 0-1 score; higher means fallback is more likely"""
+        if not retrieved_docs:
+            return 1.0
+
+        signals = []
+        scores = [doc["score"] for doc in retrieved_docs if doc.get("score") is not None]
+        if scores:
+            span = self.distance_ceiling - self.distance_floor
+            distance = (min(scores) - self.distance_floor) / span
+            signals.append(min(max(distance, 0.0), 1.0))
+
+        words = set(content_words(refined_query))
+        if words:
+            text = " ".join(doc["page_content"].lower() for doc in retrieved_docs)
+            covered = sum(1 for word in words if word in text)
+            signals.append(1.0 - covered / len(words))
+
+        return sum(signals) / len(signals) if signals else 0.0
+
+    def predict(self, refined_query: str, retrieved_docs: List[Dict[str, Any]]) -> bool:
+        return self.score(refined_query, retrieved_docs) >= self.threshold
+
+
+class SpeculationStats:
+    """Outcome counters for speculative fallback execution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.launched = 0
+        self.paid_off = 0
+        self.wasted = 0
+        self.missed = 0
+
+    def record(self, speculated: bool, needed_fallback: bool) -> None:
+        with self._lock:
+            if speculated:
+                self.launched += 1
+                if needed_fallback:
+                    self.paid_off += 1
+                else:
+                    self.wasted += 1
+            elif needed_fallback:
+                # Fallback ran serially because the predictor said no
+                self.missed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": SPECULATIVE_FALLBACK,
+            "launched": self.launched,
+            "paid_off": self.paid_off,
+            "wasted": self.wasted,
+            "missed": self.missed,
+            "payoff_rate": round(self.paid_off / self.launched, 4) if self.launched else 0.0,
+        }
+
+
+fallback_predictor = FallbackPredictor(
+    threshold=float(os.getenv("RAG_SPECULATIVE_THRESHOLD", "0.5"))
+)
+speculation_stats = SpeculationStats()
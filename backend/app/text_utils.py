@@ -0,0 +1,39 @@
+import re
+from typing import List
+
+# Words that carry no retrieval signal
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from",
+    "how", "i", "in", "is", "it", "of", "on", "or", "should", "that", "the", "there",
+    "these", "this", "to", "what", "when", "where", "which", "who", "why", "with",
+}
+WORD_PATTERN = re.compile(r"[a-z0-9][a-z0-9.\-]*")
+
+# A section id: 2516.03, 2516.03.A.1.b, ...
+SECTION_ID = r"\d{4}\.\d{2}(?:\.[A-Za-z0-9]+)*"
+# One that starts a heading or line, which is how the guidelines number their sections
+SECTION_PATTERN = re.compile(rf"^(?:#{{1,6}}\s+)?({SECTION_ID})\b")
+# One anywhere in free text, such as a query or a chunk body
+SECTION_SEARCH_PATTERN = re.compile(rf"\b({SECTION_ID})\b")
+
+# Section codes are kept as single tokens
+TOKEN_PATTERN = re.compile(rf"{SECTION_ID}|[a-z0-9]+", re.IGNORECASE)
+SECTION_TOKEN_PATTERN = re.compile(rf"^{SECTION_ID}$", re.IGNORECASE)
+
+
+def content_words(text: str) -> List[str]:
+    return [word for word in WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS]
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; section codes also emit their parent sections"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if SECTION_TOKEN_PATTERN.match(token):
+            # 2516.03.a.1 also matches queries for 2516.03.a and 2516.03
+            parts = token.split(".")
+            tokens.extend(".".join(parts[:end]) for end in range(2, len(parts)))
+    return tokens
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Language that makes a question depend on earlier turns
+REFERENTIAL_PATTERN = re.compile(
+    r"\b(it|its|it's|they|them|their|these|those|that|this|there|he|she|"
+    r"same|above|previous|former|latter|also|else|another|other|ones?|"
+    r"what about|how about|and what|and how|what if)\b",
+    re.IGNORECASE
+)
+QUESTION_WORDS = {"what", "how", "why", "when", "where", "which", "who", "does", "do", "is", "are", "can", "should", "must"}
+KEYWORD_QUERY_MAX_WORDS = 4
+
+
+def translation_decision(query: str, conversation_history: Optional[List[Dict[str, str]]]) -> Tuple[bool, str]:
+    """Decide locally whether a query needs the LLM rewrite.
+
+    Returns (needs_translation, reason). The rewrite only adds value when the
+    question leans on earlier turns, so it is skipped for the first message of
+    a session, for short keyword queries and for questions without referential
+    language.
+    """
+    if not prior_turns(query, conversation_history):
+        return False, "no_history"
+
+    words = query.lower().split()
+    if len(words) <= KEYWORD_QUERY_MAX_WORDS and not QUESTION_WORDS.intersection(words) \
+            and not REFERENTIAL_PATTERN.search(query):
+        return False, "keyword_query"
+
+    if not REFERENTIAL_PATTERN.search(query):
+        return False, "standalone"
+
+    return True, "referential"
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a question, for cache and coalescing keys"""
+    return " ".join(query.lower().split())
+
+
+def prior_turns(query: str, conversation_history: Optional[List[Dict[str, str]]]) -> List[Dict[str, str]]:
+    """The history before ``query``.
+
+    Endpoints save the question before loading the history, so it usually
+    arrives as the last turn; on the first message of a session it is the
+    only one.
+    """
+    history = list(conversation_history or [])
+    if history and history[-1].get("role") == "user" \
+            and normalize_query(history[-1].get("content", "")) == normalize_query(query):
+        history.pop()
+    return history
+
+
+def history_fingerprint(conversation_history: Optional[List[Dict[str, str]]]) -> str:
+    digest = hashlib.sha256()
+    for msg in conversation_history or []:
+        digest.update(f"{msg['role']}\0{msg['content']}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class TranslationGate:
+    """Local gate and LRU cache in front of the query rewrite call"""
+
+    def __init__(self, max_entries: int = 1024, enabled: bool = True):
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.llm_calls = 0
+        self.cache_hits = 0
+        self.skipped: Dict[str, int] = {}
+
+    def _key(self, query: str, conversation_history) -> Tuple[str, str]:
+        return history_fingerprint(conversation_history), normalize_query(query)
+
+    def resolve(self, query: str, conversation_history) -> Optional[str]:
+        """Return the query to use without an LLM call, or None if one is needed"""
+        if not self.enabled:
+            return None
+
+        needed, reason = translation_decision(query, conversation_history)
+        with self._lock:
+            if not needed:
+                self.skipped[reason] = self.skipped.get(reason, 0) + 1
+                return query
+
+            key = self._key(query, conversation_history)
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return cached
+        return None
+
+    def store(self, query: str, conversation_history, refined_query: str) -> None:
+        with self._lock:
+            self.llm_calls += 1
+            if not self.enabled:
+                return
+            self._cache[self._key(query, conversation_history)] = refined_query
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        avoided = self.cache_hits + sum(self.skipped.values())
+        total = avoided + self.llm_calls
+        return {
+            "enabled": self.enabled,
+            "llm_calls": self.llm_calls,
+            "avoided": avoided,
+            "cache_hits": self.cache_hits,
+            "skipped": dict(self.skipped),
+            "avoided_rate": round(avoided / total, 4) if total else 0.0,
+        }
+
+
+translation_gate = TranslationGate(
+    max_entries=int(os.getenv("TRANSLATION_CACHE_SIZE", "1024")),
+    enabled=os.getenv("QUERY_TRANSLATION_GATE", "true").lower() == "true"
+)
@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class UserCache:
+    """Short-lived snapshots of authenticated users, keyed on user id.
+
+    Protected endpoints resolve the token's user on every request; a hit
+    skips the database round trip. Snapshots are plain column values, never
+    session-bound objects, so one request cannot see another's session
+    state. Entries expire after ``ttl_seconds``, which bounds staleness
+    across worker processes; within a process ``invalidate`` drops an entry
+    as soon as the user row changes.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 30, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls) -> "UserCache":
+        return cls(
+            max_entries=int(os.getenv("USER_CACHE_SIZE", "10000")),
+            ttl_seconds=float(os.getenv("USER_CACHE_TTL", "30")),
+            enabled=os.getenv("USER_CACHE_ENABLED", "true").lower() == "true",
+        )
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or now - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: str, snapshot: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic(), snapshot)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
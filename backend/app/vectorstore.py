@@ -0,0 +1,152 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_STORE = "default"
+
+
+@dataclass
+class LoadedStore:
+    """A vector store held in memory together with its load statistics"""
+    vectorstore: Any
+    version: int
+    loaded_at: float
+    load_seconds: float
+    memory_bytes: int
+    last_used: float = 0.0
+
+
+def estimate_memory_bytes(vectorstore) -> int:
+    """Estimate the resident size of a FAISS vector store (vectors + docstore text)"""
+    index = vectorstore.index
+    try:
+        vector_bytes = index.sa_code_size() * index.ntotal
+    except RuntimeError:
+        # Graph / IVF indexes have no standalone codec; assume raw float32 vectors
+        vector_bytes = index.d * 4 * index.ntotal
+
+    docstore = getattr(vectorstore.docstore, "_dict", {})
+    text_bytes = sum(
+        len(doc.page_content.encode("utf-8")) + len(str(doc.metadata))
+        for doc in docstore.values()
+    )
+    return vector_bytes + text_bytes
+
+
+class VectorStoreRegistry:
+    """Keeps loaded vector stores in memory for the life of the process.
+
+    Readers call ``get`` and receive whatever store is current; a rebuild calls
+    ``swap`` which replaces the entry atomically, so in-flight queries finish on
+    the old index while new queries see the new one. Swap listeners hear about
+    ``load`` and ``swap``, not about first loads on demand through ``get``,
+    which only bring the saved index into memory.
+    """
+
+    def __init__(self):
+        self._stores: Dict[str, LoadedStore] = {}
+        self._lock = threading.Lock()
+        self._swap_listeners: List[Callable[[str, int], None]] = []
+        self._version = 0
+
+    def get(self, name: str = DEFAULT_STORE, loader: Optional[Callable[[], Any]] = None):
+        """Return the loaded store, loading it with ``loader`` on first use"""
+        entry = self._stores.get(name)
+        if entry is not None:
+            entry.last_used = time.time()
+            return entry.vectorstore
+        if loader is None:
+            raise KeyError(f"Vector store '{name}' is not loaded")
+
+        with self._lock:
+            # Another thread may have finished loading while we waited
+            entry = self._stores.get(name)
+            if entry is not None:
+                return entry.vectorstore
+            return self._load_locked(name, loader, notify=False).vectorstore
+
+    def load(self, name: str, loader: Callable[[], Any]):
+        """(Re)load a store with ``loader`` and swap it in"""
+        with self._lock:
+            return self._load_locked(name, loader).vectorstore
+
+    def swap(self, name: str, vectorstore, load_seconds: float = 0.0, notify: bool = True) -> LoadedStore:
+        """Atomically replace the store registered under ``name``.
+
+        Pass ``notify=False`` when the contents are unchanged (e.g. bringing
+        an evicted shard back) so listeners keep what they derived from it.
+        """
+        with self._lock:
+            return self._swap_locked(name, vectorstore, load_seconds, notify)
+
+    def evict(self, name: str) -> bool:
+        """Drop a store from memory; returns whether anything was evicted"""
+        with self._lock:
+            return self._stores.pop(name, None) is not None
+
+    def evict_idle(self, max_idle_seconds: float, keep: tuple = (DEFAULT_STORE,)) -> List[str]:
+        """Evict stores not used for ``max_idle_seconds``; returns their names"""
+        cutoff = time.time() - max_idle_seconds
+        with self._lock:
+            idle = [
+                name for name, entry in self._stores.items()
+                if name not in keep and entry.last_used < cutoff
+            ]
+            for name in idle:
+                del self._stores[name]
+        for name in idle:
+            print(f"Vector store '{name}' evicted after {max_idle_seconds:.0f}s idle")
+        return idle
+
+    def is_loaded(self, name: str = DEFAULT_STORE) -> bool:
+        return name in self._stores
+
+    def add_swap_listener(self, callback: Callable[[str, int], None]) -> None:
+        """Register a callback invoked with (name, version) when a store's contents may have changed"""
+        self._swap_listeners.append(callback)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Report load time, memory footprint and size of every loaded store"""
+        return {
+            name: {
+                "version": entry.version,
+                "loaded_at": entry.loaded_at,
+                "idle_seconds": round(time.time() - entry.last_used, 1),
+                "load_seconds": round(entry.load_seconds, 4),
+                "memory_bytes": entry.memory_bytes,
+                "vectors": entry.vectorstore.index.ntotal,
+                "dimensions": entry.vectorstore.index.d,
+            }
+            for name, entry in list(self._stores.items())
+        }
+
+    def _load_locked(self, name: str, loader: Callable[[], Any], notify: bool = True) -> LoadedStore:
+        start = time.perf_counter()
+        vectorstore = loader()
+        load_seconds = time.perf_counter() - start
+        return self._swap_locked(name, vectorstore, load_seconds, notify)
+
+    def _swap_locked(self, name: str, vectorstore, load_seconds: float, notify: bool = True) -> LoadedStore:
+        self._version += 1
+        entry = LoadedStore(
+            vectorstore=vectorstore,
+            version=self._version,
+            loaded_at=time.time(),
+            load_seconds=load_seconds,
+            memory_bytes=estimate_memory_bytes(vectorstore),
+            last_used=time.time(),
+        )
+        self._stores[name] = entry
+        print(
+            f"Vector store '{name}' v{entry.version} ready: "
+            f"{vectorstore.index.ntotal} vectors, "
+            f"{entry.memory_bytes / 1024 / 1024:.1f} MiB, "
+            f"loaded in {load_seconds:.2f}s"
+        )
+        for callback in self._swap_listeners if notify else []:
+            try:
+                callback(name, entry.version)
+            except Exception as e:
+                print(f"Vector store swap listener failed: {str(e)}")
+        return entry
@@ -0,0 +1,143 @@
+"""Cold import time of the backend, measured in fresh interpreters.
+
+Run from backend/:
+
+    python -m benchmarks.import_benchmark
+    python -m benchmarks.import_benchmark --runs 10 --top 15
+
+Every sample starts a new Python process, so nothing is cached in
+sys.modules, and runs in a temporary directory (app.main creates chat.db
+where it starts). Three things are timed: importing app.main (what a
+uvicorn worker or --reload pays before it can serve), importing app.rag,
+and importing app.main followed by the RAG warm-up without the index load
+(the time until the model clients exist). The slowest modules of the first
+app.main import are listed from ``python -X importtime``. Results are written
+to benchmarks/results/ and compared with the previous run.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.pipeline_benchmark import RESULTS_DIR, delta, git_commit
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+TARGETS = {
+    "import app.main": "import app.main",
+    "import app.rag": "import app.rag",
+    "app.main + warm_up": "import app.main; app.main.rag_service.warm_up(load_index=False)",
+}
+
+TIMER = "import time; _start = time.perf_counter(); {statement}; print('SECONDS', time.perf_counter() - _start)"
+
+
+def environment() -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = str(BACKEND_DIR) + os.pathsep + env.get("PYTHONPATH", "")
+    # Constructing the OpenAI clients needs a key, not a valid one
+    env["OPENAI_API_KEY"] = env.get("OPENAI_API_KEY") or "benchmark"
+    env["LANGCHAIN_API_KEY"] = ""
+    return env
+
+
+def measure(statement: str, workdir: str, importtime: bool = False) -> Tuple[float, str]:
+    """Run ``statement`` in a fresh interpreter; returns (seconds, stderr)"""
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", TIMER.format(statement=statement)]
+    completed = subprocess.run(command, cwd=workdir, env=environment(), capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"'{statement}' failed:\n{completed.stderr[-2000:]}")
+    seconds = next(float(line.split()[1]) for line in completed.stdout.splitlines() if line.startswith("SECONDS"))
+    return seconds, completed.stderr
+
+
+def slowest_modules(importtime_output: str, top: int) -> List[Dict[str, Any]]:
+    """Top-level packages ranked by cumulative import time"""
+    packages: Dict[str, int] = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if not cumulative.isdigit():
+            continue
+        package = name.split(".")[0] if not name.startswith("app.") else name
+        # Nested imports appear before their parent; keep the largest (outermost) figure
+        packages[package] = max(packages.get(package, 0), int(cumulative))
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for name, us in ranked]
+
+
+def run(runs: int, top: int) -> Dict[str, Any]:
+    result: Dict[str, Any] = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": sys.version.split()[0],
+        "runs": runs,
+        "targets": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="import-benchmark-") as workdir:
+        # Bytecode compilation and migrations would otherwise land in the first sample
+        measure(TARGETS["app.main + warm_up"], workdir)
+        for name, statement in TARGETS.items():
+            samples = [measure(statement, workdir)[0] for _ in range(runs)]
+            result["targets"][name] = {
+                "median_s": round(statistics.median(samples), 3),
+                "min_s": round(min(samples), 3),
+                "max_s": round(max(samples), 3),
+            }
+        _, importtime_output = measure(TARGETS["import app.main"], workdir, importtime=True)
+        result["slowest_modules"] = slowest_modules(importtime_output, top)
+    return result
+
+
+def previous_result(exclude: Path) -> Optional[Dict[str, Any]]:
+    runs = sorted(path for path in RESULTS_DIR.glob("imports-*.json") if path != exclude)
+    if not runs:
+        return None
+    with open(runs[-1], "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def print_report(result: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> None:
+    previous_targets = (previous or {}).get("targets", {})
+    header = f"{'target':<24} {'median s':>10} {'min s':>8} {'max s':>8} {'vs prev':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in result["targets"].items():
+        before = previous_targets.get(name, {}).get("median_s")
+        print(f"{name:<24} {stats['median_s']:>10.3f} {stats['min_s']:>8.3f} {stats['max_s']:>8.3f} "
+              f"{delta(stats['median_s'], before):>10}")
+    print("\nSlowest imports under app.main (cumulative ms):")
+    for entry in result["slowest_modules"]:
+        print(f"  {entry['module']:<40} {entry['cumulative_ms']:>8.1f}")
+    if previous:
+        print(f"\nCompared with {previous.get('git_commit')} from {previous.get('timestamp')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per target")
+    parser.add_argument("--top", type=int, default=12, help="slowest modules to list")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/imports-<time>.json)")
+    args = parser.parse_args()
+
+    result = run(args.runs, args.top)
+    output = Path(args.output) if args.output else \
+        RESULTS_DIR / f"imports-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{result['git_commit'] or 'local'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    previous = previous_result(output)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+    print_report(result, previous)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
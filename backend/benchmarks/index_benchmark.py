@@ -0,0 +1,150 @@
+"""Recall vs latency of the FAISS index options against the exact flat baseline.
+
+Run from backend/:
+
+    python -m benchmarks.index_benchmark                      # chunks of the saved index
+    python -m benchmarks.index_benchmark --queries q.txt      # your own questions, one per line
+    python -m benchmarks.index_benchmark --synthetic 50000    # random clustered vectors, no API calls
+
+Ground truth is the top-k of an exact flat search over full-dimension
+vectors. Recall@k is the share of those neighbours each configuration finds.
+Real embeddings come from the embedding cache, so repeated runs are free.
+Synthetic vectors have no Matryoshka structure, so their truncated rows only
+show speed and size, not real recall.
+"""
+import argparse
+import json
+import time
+from typing import Dict, List, Tuple
+
+import faiss
+import numpy as np
+
+from app.index_factory import TruncatedEmbeddings, build_index, factory_string
+
+DEFAULT_TYPES = "flat,hnsw,ivf,ivfpq,sq8,ivfsq8"
+DEFAULT_DIMENSIONS = "0,1024,256"
+
+
+def truncate(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    if not dimensions or dimensions >= vectors.shape[1]:
+        return vectors
+    cut = vectors[:, :dimensions]
+    return np.ascontiguousarray(cut / np.linalg.norm(cut, axis=1, keepdims=True))
+
+
+def synthetic_vectors(n: int, queries: int, d: int = 3072, clusters: int = 64,
+                      seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Normalized vectors scattered around random centers, like topical chunks"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, d)).astype(np.float32)
+    def sample(count):
+        points = centers[rng.integers(0, clusters, count)] + 0.8 * rng.standard_normal((count, d)).astype(np.float32)
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+    return sample(n), sample(queries)
+
+
+def corpus_vectors(query_file: str = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectors of the saved index's chunks and of the benchmark questions"""
+    from app import rag
+
+    vectorstore = rag.load_vectorstore(rag.VECTORSTORE_PATH) or rag.build_vectorstore()
+    texts = [doc.page_content for doc in vectorstore.docstore._dict.values()]
+    if query_file:
+        with open(query_file, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    else:
+        # Headings make reasonable stand-ins for user questions
+        questions = sorted({doc.metadata["heading"] for doc in vectorstore.docstore._dict.values()
+                            if doc.metadata.get("heading")})
+    # Always benchmark full vectors; truncation is part of the sweep
+    full = rag.embeddings.underlying if isinstance(rag.embeddings, TruncatedEmbeddings) else rag.embeddings
+    base = np.asarray(full.embed_documents(texts), dtype=np.float32)
+    queries = np.asarray(full.embed_documents(questions), dtype=np.float32)
+    return base, queries
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    return float(np.percentile(samples, pct)) if samples else 0.0
+
+
+def run(base: np.ndarray, queries: np.ndarray, index_types: List[str], dimensions: List[int],
+        k: int) -> List[Dict]:
+    exact = faiss.IndexFlatL2(base.shape[1])
+    exact.add(base)
+    _, truth = exact.search(queries, k)
+
+    results = []
+    for dims in dimensions:
+        base_d, queries_d = truncate(base, dims), truncate(queries, dims)
+        for index_type in index_types:
+            spec = factory_string(index_type, base_d.shape[1], base_d.shape[0])
+            start = time.perf_counter()
+            try:
+                index = build_index(base_d, index_type)
+            except RuntimeError as e:
+                print(f"skip {index_type}/{dims or 'full'} ({spec}): {str(e).splitlines()[0]}")
+                continue
+            build_seconds = time.perf_counter() - start
+
+            latencies, found = [], 0
+            for query_idx in range(len(queries_d)):
+                start = time.perf_counter()
+                _, labels = index.search(queries_d[query_idx:query_idx + 1], k)
+                latencies.append(1000 * (time.perf_counter() - start))
+                found += len(set(labels[0]) & set(truth[query_idx]))
+
+            results.append({
+                "index_type": index_type,
+                "factory": spec,
+                "dimensions": base_d.shape[1],
+                "recall_at_k": round(found / (k * len(queries_d)), 4),
+                "p50_ms": round(percentile(latencies, 50), 3),
+                "p95_ms": round(percentile(latencies, 95), 3),
+                "index_mib": round(faiss.serialize_index(index).nbytes / 2 ** 20, 2),
+                "build_seconds": round(build_seconds, 3),
+            })
+    return results
+
+
+def print_table(results: List[Dict], k: int) -> None:
+    header = f"{'index':<10} {'factory':<22} {'dims':>5} {f'recall@{k}':>10} {'p50 ms':>8} {'p95 ms':>8} {'MiB':>8} {'build s':>8}"
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        print(f"{row['index_type']:<10} {row['factory']:<22} {row['dimensions']:>5} {row['recall_at_k']:>10.4f} "
+              f"{row['p50_ms']:>8.3f} {row['p95_ms']:>8.3f} {row['index_mib']:>8.2f} {row['build_seconds']:>8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--types", default=DEFAULT_TYPES, help="comma-separated index types or factory strings")
+    parser.add_argument("--dimensions", default=DEFAULT_DIMENSIONS, help="comma-separated dims, 0 = full")
+    parser.add_argument("--k", type=int, default=15, help="neighbours per query (retrieval uses 15)")
+    parser.add_argument("--queries", help="file with one question per line")
+    parser.add_argument("--synthetic", type=int, default=0, help="number of random vectors instead of the corpus")
+    parser.add_argument("--synthetic-queries", type=int, default=200)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        base, queries = synthetic_vectors(args.synthetic, args.synthetic_queries)
+    else:
+        base, queries = corpus_vectors(args.queries)
+    k = min(args.k, len(base))
+    print(f"{len(base)} vectors, {len(queries)} queries, {base.shape[1]} dims, k={k}")
+
+    results = run(
+        base, queries,
+        [index_type.strip() for index_type in args.types.split(",") if index_type.strip()],
+        [int(dims) for dims in args.dimensions.split(",")],
+        k
+    )
+    print_table(results, k)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"vectors": len(base), "queries": len(queries), "k": k, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
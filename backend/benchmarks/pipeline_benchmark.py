@@ -0,0 +1,341 @@
+"""Latency and throughput of the RAG pipeline against local stub models.
+
+Run from backend/:
+
+    python -m benchmarks.pipeline_benchmark
+    python -m benchmarks.pipeline_benchmark --queries 50 --concurrency 16 --llm-first-token-ms 800
+
+Chat and embedding models are replaced with the deterministic stand-ins in
+benchmarks/stubs.py, so no API key or network is needed. The index, chat
+database and embedding cache live in a temporary directory. Results are
+written to benchmarks/results/ and compared with the previous run, so a
+regression shows up as a delta.
+"""
+import argparse
+import asyncio
+import functools
+import inspect
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def configure_environment(workdir: str, caches: bool, coalesce: bool) -> None:
+    """Must run before the app is imported; module settings are read at import"""
+    os.environ["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY") or "benchmark"
+    # No tracing uploads from benchmark runs (.env values do not override these)
+    os.environ["LANGCHAIN_API_KEY"] = ""
+    os.environ["LANGSMITH_TRACING"] = "false"
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "embedding_cache.sqlite")
+    os.environ["SEMANTIC_CACHE_ENABLED"] = "true" if caches else "false"
+    # The query list repeats questions; sharing their runs would hide per-call cost
+    os.environ["RAG_COALESCE_ENABLED"] = "true" if coalesce else "false"
+    # chat.db is opened relative to the working directory
+    os.chdir(workdir)
+
+
+class StageTimer:
+    """Wraps module functions in place and records how long each call took"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def wrap(self, module: Any, name: str, stage: str) -> None:
+        function = getattr(module, name)
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    self.samples[stage].append(time.perf_counter() - start)
+        else:
+            @functools.wraps(function)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.samples[stage].append(time.perf_counter() - start)
+        setattr(module, name, timed)
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.samples[stage].append(seconds)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(values.mean()), 2),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+    }
+
+
+def benchmark_queries(vectorstore, count: int) -> List[str]:
+    """Questions built from chunk headings, plus a few direct section lookups"""
+    # Without their section ids, so the questions take the vector search path
+    headings = sorted({
+        re.sub(r"^[\d.A-Za-z]*\d[\d.A-Za-z]*\s+", "", doc.metadata["heading"])
+        for doc in vectorstore.docstore._dict.values() if doc.metadata.get("heading")
+    })
+    queries = []
+    for idx in range(count):
+        if idx % 10 == 9:
+            queries.append("2516.03")
+        else:
+            queries.append(f"What are the requirements for {headings[idx % len(headings)].lower()}?")
+    return queries
+
+
+async def run_concurrently(count: int, concurrency: int, make_call: Callable[[int], Any]) -> float:
+    """Run ``count`` calls with at most ``concurrency`` in flight; returns wall seconds"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(idx: int):
+        async with semaphore:
+            await make_call(idx)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(idx) for idx in range(count)))
+    return time.perf_counter() - start
+
+
+async def benchmark_endpoints(app_module, queries: List[str], concurrency: int,
+                              timer: StageTimer) -> Dict[str, float]:
+    import httpx
+    import uuid
+
+    transport = httpx.ASGITransport(app=app_module.app)
+    throughput = {}
+    # ASGITransport does not send lifespan events; startup creates the tables
+    async with app_module.app.router.lifespan_context(app_module.app), \
+            httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=300) as client:
+        email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+        response = await client.post("/api/auth/register", json={
+            "email": email, "username": email, "region": "US", "password": "benchmark"
+        })
+        response.raise_for_status()
+        user_id = response.json()["id"]
+        response = await client.post("/api/auth/login", data={"username": email, "password": "benchmark"})
+        client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+        async def rag_query(idx: int):
+            start = time.perf_counter()
+            response = await client.post("/api/rag-query", json={"query": queries[idx]})
+            response.raise_for_status()
+            timer.record("endpoint /api/rag-query", time.perf_counter() - start)
+
+        seconds = await run_concurrently(len(queries), concurrency, rag_query)
+        throughput["endpoint /api/rag-query"] = round(len(queries) / seconds, 2)
+
+        async def message(idx: int):
+            session_id = str(uuid.uuid4())
+            await client.post("/api/chat-sessions", json={"id": session_id, "title": "benchmark", "userId": user_id})
+            start = time.perf_counter()
+            response = await client.post("/api/messages", json={
+                "id": str(uuid.uuid4()),
+                "content": queries[idx],
+                "sender": "user",
+                "chatSessionId": session_id,
+                "timestamp": datetime.utcnow().isoformat(),
+            })
+            response.raise_for_status()
+            timer.record("endpoint /api/messages", time.perf_counter() - start)
+            # The answer is generated by the job queue; time until it is available
+            job_id = response.json()["pendingResponseId"]
+            while True:
+                job = (await client.get(f"/api/jobs/{job_id}", params={"wait": 60})).json()
+                if job["status"] in ("complete", "failed"):
+                    break
+            timer.record("endpoint /api/messages done", time.perf_counter() - start)
+
+        seconds = await run_concurrently(len(queries), concurrency, message)
+        throughput["endpoint /api/messages"] = round(len(queries) / seconds, 2)
+    return throughput
+
+
+def run(args) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="rag-benchmark-")
+    configure_environment(workdir, args.caches, args.coalesce)
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    from langchain_community.document_loaders import TextLoader
+    from app import rag
+    from app.embedding_cache import CachedEmbeddings
+    from benchmarks.stubs import StubChatModel, StubEmbeddings
+
+    stub_embeddings = StubEmbeddings(call_ms=args.embed_call_ms, per_text_ms=args.embed_per_text_ms)
+    rag.llm = StubChatModel(first_token_ms=args.llm_first_token_ms, token_ms=args.llm_token_ms,
+                            low_confidence_rate=args.low_confidence_rate)
+    rag.fast_llm = StubChatModel(first_token_ms=args.llm_first_token_ms / 2, token_ms=args.llm_token_ms / 2)
+    rag.embeddings = CachedEmbeddings(stub_embeddings, path=os.environ["EMBEDDING_CACHE_PATH"]) \
+        if args.caches else stub_embeddings
+    rag.VECTORSTORE_PATH = os.path.join(workdir, "faiss_index")
+
+    timer = StageTimer()
+    throughput: Dict[str, float] = {}
+
+    # Offline stages
+    documents = TextLoader(str(rag.get_guidelines_path()), encoding="utf-8").load()
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        rag.prepare_documents(documents)
+        timer.record("prepare_documents", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    vectorstore = rag.get_vectorstore()
+    timer.record("index_build", time.perf_counter() - start)
+
+    queries = benchmark_queries(vectorstore, args.queries)
+    for query in queries:
+        start = time.perf_counter()
+        rag.retrieve_documents(vectorstore, query)
+        timer.record("retrieve_documents", time.perf_counter() - start)
+
+    # Per-stage timings inside the online pipelines. aselect_context calls
+    # select_context, so wrapping it too would count async reranks twice.
+    for name, stage in (
+        ("translate_query", "stage translate"), ("atranslate_query", "stage translate"),
+        ("gather_documents", "stage retrieve"), ("agather_documents", "stage retrieve"),
+        ("select_context", "stage rerank"),
+        ("run_fallback", "stage fallback"), ("arun_fallback", "stage fallback"),
+    ):
+        timer.wrap(rag, name, stage)
+
+    for query in queries:
+        start = time.perf_counter()
+        rag.process_query(query, "US", [])
+        timer.record("process_query", time.perf_counter() - start)
+
+    async def online():
+        async def one(idx: int):
+            start = time.perf_counter()
+            await rag.aprocess_query(queries[idx], "US", [])
+            timer.record("aprocess_query", time.perf_counter() - start)
+
+        seconds = await run_concurrently(len(queries), args.concurrency, one)
+        throughput["aprocess_query"] = round(len(queries) / seconds, 2)
+
+        # A review burst: many users asking the same question at the same moment
+        async def asked(idx: int):
+            start = time.perf_counter()
+            await rag.aprocess_query(queries[0], "US", [])
+            timer.record("aprocess_query burst", time.perf_counter() - start)
+
+        seconds = await run_concurrently(args.burst, args.burst, asked)
+        throughput["aprocess_query burst"] = round(args.burst / seconds, 2)
+
+        if not args.skip_endpoints:
+            from app import main
+            throughput.update(await benchmark_endpoints(main, queries, args.concurrency, timer))
+
+    asyncio.run(online())
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "stages": {stage: summarize(samples) for stage, samples in timer.samples.items()},
+        "throughput_rps": throughput,
+        "embedding_calls": stub_embeddings.calls,
+        "llm_calls": rag.llm.calls + rag.fast_llm.calls,
+        "coalescing": rag.pipeline_flights.stats(),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_result(exclude: Path) -> Optional[Dict[str, Any]]:
+    runs = sorted(path for path in RESULTS_DIR.glob("pipeline-*.json") if path != exclude)
+    if not runs:
+        return None
+    with open(runs[-1], "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def delta(current: float, previous: Optional[float]) -> str:
+    if not previous:
+        return ""
+    return f"{100 * (current - previous) / previous:+.1f}%"
+
+
+def print_report(result: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> None:
+    previous_stages = (previous or {}).get("stages", {})
+    header = f"{'stage':<28} {'n':>5} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'p50 vs prev':>12} {'p95 vs prev':>12}"
+    print(header)
+    print("-" * len(header))
+    for stage, stats in result["stages"].items():
+        before = previous_stages.get(stage, {})
+        print(f"{stage:<28} {stats['count']:>5} {stats['p50_ms']:>10.1f} {stats['p95_ms']:>10.1f} "
+              f"{stats['p99_ms']:>10.1f} {delta(stats['p50_ms'], before.get('p50_ms')):>12} "
+              f"{delta(stats['p95_ms'], before.get('p95_ms')):>12}")
+    print()
+    previous_rps = (previous or {}).get("throughput_rps", {})
+    for name, rps in result["throughput_rps"].items():
+        print(f"{name:<28} {rps:>8.2f} req/s {delta(rps, previous_rps.get(name)):>12}")
+    coalescing = result.get("coalescing", {})
+    if coalescing.get("enabled"):
+        print(f"\nCoalesced {coalescing['coalesced']} of {coalescing['executions'] + coalescing['coalesced']} pipeline calls")
+    if previous:
+        print(f"\nCompared with {previous.get('git_commit')} from {previous.get('timestamp')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3, help="prepare_documents repetitions")
+    parser.add_argument("--llm-first-token-ms", type=float, default=400.0)
+    parser.add_argument("--llm-token-ms", type=float, default=15.0)
+    parser.add_argument("--embed-call-ms", type=float, default=150.0)
+    parser.add_argument("--embed-per-text-ms", type=float, default=0.5)
+    parser.add_argument("--low-confidence-rate", type=float, default=0.1)
+    parser.add_argument("--caches", action="store_true", help="keep the semantic and embedding caches enabled")
+    parser.add_argument("--coalesce", action="store_true", help="share runs of identical concurrent questions")
+    parser.add_argument("--burst", type=int, default=20, help="identical questions asked at once")
+    parser.add_argument("--skip-endpoints", action="store_true")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/pipeline-<time>.json)")
+    args = parser.parse_args()
+    if args.output:
+        # The run changes into a temporary directory
+        args.output = os.path.abspath(args.output)
+
+    result = run(args)
+    output = Path(args.output) if args.output else \
+        RESULTS_DIR / f"pipeline-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{result['git_commit'] or 'local'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    previous = previous_result(output)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+    print_report(result, previous)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
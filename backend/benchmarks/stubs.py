@@ -0,0 +1,142 @@
+"""Deterministic local stand-ins for the OpenAI chat and embedding models.
+
+Replies and vectors depend only on the input text, so runs are repeatable,
+and every call sleeps for a configurable latency so timings resemble a real
+provider without network access or API keys.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+VOCABULARY = (
+    "fire sprinkler corridor guest room door rating system alarm shall must provide "
+    "required minimum per section hotel design standard installed approved code"
+).split()
+
+
+def _digest(text: str) -> int:
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest(), 16)
+
+
+class StubChatModel(BaseChatModel):
+    """Chat model that answers instantly from a hash of the prompt, then sleeps.
+
+    Prompts that ask for the RAG JSON format get a JSON answer, and
+    ``low_confidence_rate`` of them report low confidence so the fallback
+    path is exercised too. Other prompts (query rewrite, summaries, full
+    document) get plain text.
+    """
+    first_token_ms: float = 400.0
+    token_ms: float = 15.0
+    answer_tokens: int = 60
+    low_confidence_rate: float = 0.1
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        self.calls += 1
+        prompt = "\n".join(str(message.content) for message in messages)
+        digest = _digest(prompt)
+        words = " ".join(VOCABULARY[(digest >> (4 * i)) % len(VOCABULARY)] for i in range(self.answer_tokens))
+        if "JSON format" not in prompt:
+            return words
+        low = (digest % 1000) / 1000 < self.low_confidence_rate
+        return json.dumps({
+            "answer": words,
+            "confidence": 0.4 if low else 0.9,
+            "sources": [{"page_number": 240, "section": "2516.01", "content": words[:80]}],
+            "needs_rerouting": low,
+        })
+
+    def _tokens(self, text: str) -> List[str]:
+        pieces = text.split(" ")
+        return [piece + (" " if idx < len(pieces) - 1 else "") for idx, piece in enumerate(pieces)]
+
+    def _seconds(self, text: str) -> float:
+        return (self.first_token_ms + self.token_ms * len(self._tokens(text))) / 1000
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        text = self._reply(messages)
+        time.sleep(self._seconds(text))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        text = self._reply(messages)
+        await asyncio.sleep(self._seconds(text))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_ms / 1000)
+        for token in self._tokens(self._reply(messages)):
+            time.sleep(self.token_ms / 1000)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_ms / 1000)
+        for token in self._tokens(self._reply(messages)):
+            await asyncio.sleep(self.token_ms / 1000)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+class StubEmbeddings(Embeddings):
+    """Unit vectors seeded from a hash of the text, with per-call latency.
+
+    Texts sharing words get nearby vectors (a bag of hashed words), so
+    retrieval results are meaningful enough for ranking code to do real work.
+    """
+
+    def __init__(self, dimensions: int = 3072, call_ms: float = 150.0, per_text_ms: float = 0.5):
+        self.dimensions = dimensions
+        self.call_ms = call_ms
+        self.per_text_ms = per_text_ms
+        self.calls = 0
+        self._word_vectors: Dict[str, np.ndarray] = {}
+
+    def _word_vector(self, word: str) -> np.ndarray:
+        vector = self._word_vectors.get(word)
+        if vector is None:
+            rng = np.random.default_rng(_digest(word) % (2 ** 32))
+            vector = rng.standard_normal(self.dimensions).astype(np.float32)
+            self._word_vectors[word] = vector
+        return vector
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in text.lower().split():
+            vector += self._word_vector(word)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def _seconds(self, count: int) -> float:
+        return (self.call_ms + self.per_text_ms * count) / 1000
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        time.sleep(self._seconds(len(texts)))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        await asyncio.sleep(self._seconds(len(texts)))
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
@@ -0,0 +1,48 @@
+import asyncio
+import os
+import tempfile
+import uuid
+from datetime import datetime
+
+import pytest
+
+# The engine and module settings are read at import, so configure them before any app import
+_workdir = tempfile.mkdtemp(prefix="chat-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'chat.db')}"
+os.environ["RAG_WARM_UP"] = "off"
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["LANGSMITH_TRACING"] = "false"
+os.environ["LANGCHAIN_TRACING_V2"] = "false"
+
+from app import models  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+from app.migrations import init_database  # noqa: E402
+
+
+def run(coroutine):
+    """Run a coroutine on a fresh loop; pooled connections are bound to it, so drop them after"""
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await engine.dispose()
+    return asyncio.run(main())
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    run(init_database(engine, models.Base.metadata))
+
+
+async def add_chat_session(user_id: str = None) -> models.ChatSession:
+    """A user with one chat session"""
+    async with SessionLocal() as db:
+        if user_id is None:
+            user_id = str(uuid.uuid4())
+            db.add(models.User(id=user_id, email=f"{user_id}@example.com", username=user_id,
+                               hashed_password="x", region="US"))
+        session = models.ChatSession(id=str(uuid.uuid4()), title="test", user_id=user_id,
+                                     created_at=datetime.utcnow(), updated_at=datetime.utcnow())
+        db.add(session)
+        await db.commit()
+        return session
@@ -0,0 +1,143 @@
+import asyncio
+
+from app.coalescing import SingleFlight
+
+
+class SlowCall:
+    """A call that blocks until released; counts starts and cancellations"""
+
+    def __init__(self, result="answer", error: Exception = None):
+        self.result = result
+        self.error = error
+        self.started = 0
+        self.cancelled = 0
+        self.release = None
+
+    async def __call__(self):
+        self.started += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        return self.result
+
+
+async def settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_followers_share_one_execution():
+    async def scenario():
+        flights, call = SingleFlight(), SlowCall()
+        call.release = asyncio.Event()
+        callers = [asyncio.create_task(flights.run("key", call)) for _ in range(4)]
+        await settle()
+        call.release.set()
+        return flights, call, await asyncio.gather(*callers)
+
+    flights, call, results = asyncio.run(scenario())
+    assert call.started == 1
+    assert results == [("answer", False), ("answer", True), ("answer", True), ("answer", True)]
+    assert flights.stats()["executions"] == 1
+    assert flights.stats()["coalesced"] == 3
+    assert flights.stats()["max_waiters"] == 4
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_finished_calls_are_not_reused():
+    async def scenario():
+        flights, call = SingleFlight(), SlowCall()
+        call.release = asyncio.Event()
+        call.release.set()
+        first = await flights.run("key", call)
+        second = await flights.run("key", call)
+        return call, first, second
+
+    call, first, second = asyncio.run(scenario())
+    assert call.started == 2
+    assert first == second == ("answer", False)
+
+
+def test_different_keys_run_separately():
+    async def scenario():
+        flights, call = SingleFlight(), SlowCall()
+        call.release = asyncio.Event()
+        callers = [asyncio.create_task(flights.run(key, call)) for key in ("a", "b")]
+        await settle()
+        call.release.set()
+        await asyncio.gather(*callers)
+        return call
+
+    assert asyncio.run(scenario()).started == 2
+
+
+def test_errors_reach_every_caller():
+    async def scenario():
+        flights, call = SingleFlight(), SlowCall(error=RuntimeError("model unavailable"))
+        call.release = asyncio.Event()
+        callers = [asyncio.create_task(flights.run("key", call)) for _ in range(3)]
+        await settle()
+        call.release.set()
+        return await asyncio.gather(*callers, return_exceptions=True)
+
+    errors = asyncio.run(scenario())
+    assert [str(error) for error in errors] == ["model unavailable"] * 3
+
+
+def test_cancelled_follower_leaves_the_call_running():
+    async def scenario():
+        flights, call = SingleFlight(), SlowCall()
+        call.release = asyncio.Event()
+        leader = asyncio.create_task(flights.run("key", call))
+        follower = asyncio.create_task(flights.run("key", call))
+        await settle()
+        follower.cancel()
+        await settle()
+        call.release.set()
+        return call, await leader, follower
+
+    call, result, follower = asyncio.run(scenario())
+    assert follower.cancelled()
+    assert result == ("answer", False)
+    assert call.cancelled == 0
+
+
+def test_last_waiter_leaving_cancels_the_call():
+    async def scenario():
+        flights, call = SingleFlight(), SlowCall()
+        call.release = asyncio.Event()
+        callers = [asyncio.create_task(flights.run("key", call)) for _ in range(2)]
+        await settle()
+        for caller in callers:
+            caller.cancel()
+        await settle()
+        in_flight = flights.stats()["in_flight"]
+        # A caller arriving afterwards starts a fresh call instead of joining the cancelled one
+        call.release.set()
+        again = await flights.run("key", call)
+        return flights, call, in_flight, again
+
+    flights, call, in_flight, again = asyncio.run(scenario())
+    assert call.cancelled == 1
+    assert in_flight == 0
+    assert again == ("answer", False)
+    assert call.started == 2
+    assert flights.stats()["executions"] == 2
+
+
+def test_disabled_runs_every_call():
+    async def scenario():
+        flights, call = SingleFlight(enabled=False), SlowCall()
+        call.release = asyncio.Event()
+        callers = [asyncio.create_task(flights.run("key", call)) for _ in range(3)]
+        await settle()
+        call.release.set()
+        return call, await asyncio.gather(*callers)
+
+    call, results = asyncio.run(scenario())
+    assert call.started == 3
+    assert results == [("answer", False)] * 3
@@ -0,0 +1,135 @@
+import json
+from pathlib import Path
+from typing import List
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.chunking import split_markdown_sections
+from app.indexer import CHUNK_ID_VERSION, IncrementalIndexer, chunk_hash
+from app.persistence import load_store
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """Fake embeddings that remember every text they were asked to embed"""
+
+    embedded: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+def split(documents):
+    chunks = [chunk for document in documents for chunk in split_markdown_sections(document)]
+    for chunk_index, chunk in enumerate(chunks):
+        chunk.metadata["chunk_index"] = chunk_index
+    return chunks
+
+
+def section(number: str, body: str) -> str:
+    return f"## {number} Heading\n{body}\n"
+
+
+@pytest.fixture
+def docs(tmp_path):
+    root = tmp_path / "docs"
+    root.mkdir()
+    (root / "fire.md").write_text(section("2516.01", "Doors close themselves.") + section("2516.02", "Exits are lit."))
+    (root / "pools.md").write_text(section("2600.01", "Fences are 1.2 m high."))
+    return root
+
+
+@pytest.fixture
+def embeddings():
+    return CountingEmbeddings(size=8, embedded=[])
+
+
+def make_indexer(tmp_path: Path, docs: Path, embeddings, chunker_version: str = "test-1") -> IncrementalIndexer:
+    """A fresh indexer over the current docs; a store keeps the embeddings it was built with"""
+    embeddings.embedded.clear()
+    return IncrementalIndexer(
+        str(tmp_path / "index"), sorted(docs.glob("*.md")), embeddings,
+        split, docs_root=docs, chunker_version=chunker_version
+    )
+
+
+def test_first_sync_builds_index_and_manifest(tmp_path, docs, embeddings):
+    indexer = make_indexer(tmp_path, docs, embeddings)
+    vectorstore, report = indexer.sync(None)
+
+    assert report["full_rebuild"] and report["added"] == 3
+    manifest = json.loads(Path(indexer.manifest_path).read_text())
+    assert manifest["chunker"] == "test-1"
+    assert manifest["chunk_ids"] == CHUNK_ID_VERSION
+    assert set(manifest["sources"]) == {"fire.md", "pools.md"}
+    ids = [chunk for entry in manifest["sources"].values() for chunk in entry["chunks"]]
+    assert sorted(ids) == sorted(vectorstore.index_to_docstore_id.values())
+    assert load_store(indexer.index_path, indexer.embeddings).index.ntotal == 3
+
+
+def test_unchanged_sources_are_not_reembedded(tmp_path, docs, embeddings):
+    vectorstore, _ = make_indexer(tmp_path, docs, embeddings).sync(None)
+    indexer = make_indexer(tmp_path, docs, embeddings)
+    _, report = indexer.sync(vectorstore)
+
+    assert not report["changed"]
+    assert report["unchanged_sources"] == 2
+    assert indexer.embeddings.embedded == []
+
+
+def test_edit_only_embeds_changed_chunks(tmp_path, docs, embeddings):
+    vectorstore, _ = make_indexer(tmp_path, docs, embeddings).sync(None)
+    (docs / "fire.md").write_text(section("2516.01", "Doors close themselves.") + section("2516.02", "Exits are lit green."))
+    indexer = make_indexer(tmp_path, docs, embeddings)
+    vectorstore, report = indexer.sync(vectorstore)
+
+    assert (report["added"], report["deleted"], report["unchanged_sources"]) == (1, 1, 1)
+    assert indexer.embeddings.embedded == ["## 2516.02 Heading\nExits are lit green."]
+    assert vectorstore.index.ntotal == 3
+    manifest = indexer.load_manifest()
+    assert chunk_hash("fire.md", "## 2516.02 Heading\nExits are lit green.") in manifest["sources"]["fire.md"]["chunks"]
+
+
+def test_moved_chunks_keep_vectors_and_get_new_metadata(tmp_path, docs, embeddings):
+    vectorstore, _ = make_indexer(tmp_path, docs, embeddings).sync(None)
+    (docs / "fire.md").write_text(
+        section("2516.00", "Scope.") + section("2516.01", "Doors close themselves.") + section("2516.02", "Exits are lit.")
+    )
+    indexer = make_indexer(tmp_path, docs, embeddings)
+    vectorstore, report = indexer.sync(vectorstore)
+
+    assert (report["added"], report["deleted"], report["refreshed"]) == (1, 0, 2)
+    assert indexer.embeddings.embedded == ["## 2516.00 Heading\nScope."]
+    moved = vectorstore.docstore.search(chunk_hash("fire.md", "## 2516.02 Heading\nExits are lit."))
+    assert moved.metadata["chunk_index"] == 2
+
+
+def test_removed_source_drops_its_chunks(tmp_path, docs, embeddings):
+    vectorstore, _ = make_indexer(tmp_path, docs, embeddings).sync(None)
+    (docs / "pools.md").unlink()
+    indexer = make_indexer(tmp_path, docs, embeddings)
+    vectorstore, report = indexer.sync(vectorstore)
+
+    assert report["deleted"] == 1 and report["changed"]
+    assert set(indexer.load_manifest()["sources"]) == {"fire.md"}
+    assert vectorstore.index.ntotal == 2
+
+
+def test_chunker_change_rechunks_without_reembedding_same_chunks(tmp_path, docs, embeddings):
+    vectorstore, _ = make_indexer(tmp_path, docs, embeddings).sync(None)
+    indexer = make_indexer(tmp_path, docs, embeddings, chunker_version="test-2")
+    _, report = indexer.sync(vectorstore)
+
+    assert report["changed"] and report["unchanged_sources"] == 0
+    assert (report["added"], report["deleted"]) == (0, 0)
+    assert indexer.embeddings.embedded == []
+    assert indexer.load_manifest()["chunker"] == "test-2"
+
+
+def test_repeated_chunks_get_distinct_ids(tmp_path, docs, embeddings):
+    (docs / "fire.md").write_text(section("2516.01", "Same text.") + section("2516.01", "Same text."))
+    vectorstore, report = make_indexer(tmp_path, docs, embeddings).sync(None)
+
+    assert report["added"] == 3
+    assert len(set(vectorstore.index_to_docstore_id.values())) == 3
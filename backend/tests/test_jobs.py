@@ -0,0 +1,180 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import jobs, models
+from app.database import SessionLocal
+from app.jobs import COMPLETE, FAILED, PENDING, RUNNING, AnswerQueue
+
+from .conftest import add_chat_session, run
+
+ANSWER = {"response": "An answer", "confidence": 0.9, "response_type": "rag", "sources": []}
+
+
+async def add_job(status: str = PENDING, updated_at: datetime = None) -> str:
+    session = await add_chat_session()
+    async with SessionLocal() as db:
+        message = models.Message(id=str(uuid.uuid4()), content="A question?", sender="user",
+                                 chat_session_id=session.id, timestamp=datetime.utcnow())
+        job = jobs.new_job(session.id, message.id, message.content, "US")
+        job.status = status
+        job.attempts = 1 if status == RUNNING else 0
+        job.updated_at = updated_at or datetime.utcnow()
+        db.add_all([message, job])
+        await db.commit()
+        return job.id
+
+
+async def get_job(job_id: str) -> models.AnswerJob:
+    async with SessionLocal() as db:
+        return await db.get(models.AnswerJob, job_id)
+
+
+async def wait_for_status(job_id: str, statuses, timeout: float = 5.0) -> models.AnswerJob:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        job = await get_job(job_id)
+        if job.status in statuses or asyncio.get_running_loop().time() > deadline:
+            return job
+        await asyncio.sleep(0.02)
+
+
+@pytest.fixture
+def answers(monkeypatch):
+    """Replace generation; set ``answers.error`` to make it fail"""
+    class Answers:
+        calls = 0
+        error = None
+        delay = 0.0
+
+    async def aprocess_query(user_query, user_region, conversation_history=None):
+        Answers.calls += 1
+        await asyncio.sleep(Answers.delay)
+        if Answers.error:
+            raise Answers.error
+        return ANSWER
+
+    monkeypatch.setattr(jobs.rag_service, "aprocess_query", aprocess_query)
+    monkeypatch.setattr(jobs, "retry_after_seconds", lambda error, attempt: 0.01)
+    return Answers
+
+
+def test_claim_is_exclusive():
+    async def scenario():
+        job_id = await add_job()
+        queue = AnswerQueue()
+        claims = await asyncio.gather(*(queue._claim(job_id) for _ in range(5)))
+        return claims, await get_job(job_id)
+
+    claims, job = run(scenario())
+    assert sorted(claims, key=lambda claim: claim is None) == [1, None, None, None, None]
+    assert job.status == RUNNING and job.attempts == 1
+
+
+def test_job_completes_with_answer(answers):
+    async def scenario():
+        job_id = await add_job()
+        queue = AnswerQueue(workers=1)
+        await queue.start()
+        queue.submit(job_id)
+        job = await wait_for_status(job_id, (COMPLETE, FAILED))
+        await queue.stop()
+        return job
+
+    job = run(scenario())
+    assert job.status == COMPLETE
+    assert '"An answer"' in job.result
+
+
+def test_failed_attempts_are_retried_then_recorded(answers):
+    answers.error = RuntimeError("model unavailable")
+
+    async def scenario():
+        job_id = await add_job()
+        queue = AnswerQueue(workers=1, max_attempts=3)
+        await queue.start()
+        queue.submit(job_id)
+        job = await wait_for_status(job_id, (COMPLETE, FAILED))
+        await queue.stop()
+        return job, queue
+
+    job, queue = run(scenario())
+    assert job.status == FAILED
+    assert job.attempts == 3
+    assert job.error == "model unavailable"
+    assert (queue.retried, queue.failed) == (2, 1)
+
+
+def test_load_errors_are_retried(answers, monkeypatch):
+    calls = []
+
+    async def load_conversation_history(db, session, until=None):
+        calls.append(until)
+        if len(calls) == 1:
+            raise RuntimeError("pool timeout")
+        return []
+
+    monkeypatch.setattr(jobs, "load_conversation_history", load_conversation_history)
+
+    async def scenario():
+        job_id = await add_job()
+        queue = AnswerQueue(workers=1)
+        await queue.start()
+        queue.submit(job_id)
+        job = await wait_for_status(job_id, (COMPLETE, FAILED))
+        await queue.stop()
+        return job
+
+    job = run(scenario())
+    assert job.status == COMPLETE
+    assert job.attempts == 2
+
+
+def test_running_job_with_lapsed_lease_is_recovered(answers):
+    async def scenario():
+        # Left running by a worker that crashed a moment ago; fresh enough to survive startup recovery
+        job_id = await add_job(status=RUNNING)
+        queue = AnswerQueue(workers=1, stale_seconds=0.2, recover_interval=0.05)
+        await queue.start()
+        started = await get_job(job_id)
+        job = await wait_for_status(job_id, (COMPLETE, FAILED))
+        await queue.stop()
+        return started, job
+
+    started, job = run(scenario())
+    assert started.status == RUNNING
+    assert job.status == COMPLETE
+    assert job.attempts == 2
+
+
+def test_heartbeat_keeps_slow_job_from_being_recovered(answers):
+    answers.delay = 0.5
+
+    async def scenario():
+        job_id = await add_job()
+        queue = AnswerQueue(workers=2, stale_seconds=0.2, recover_interval=0.05, heartbeat_seconds=0.05)
+        await queue.start()
+        queue.submit(job_id)
+        job = await wait_for_status(job_id, (COMPLETE, FAILED))
+        await queue.stop()
+        return job
+
+    job = run(scenario())
+    assert job.status == COMPLETE
+    assert job.attempts == 1
+    assert answers.calls == 1
+
+
+def test_startup_requeues_pending_and_stale_jobs(answers):
+    async def scenario():
+        pending = await add_job()
+        stale = await add_job(status=RUNNING, updated_at=datetime.utcnow() - timedelta(hours=1))
+        queue = AnswerQueue(workers=2)
+        await queue.start()
+        jobs_done = [await wait_for_status(job_id, (COMPLETE, FAILED)) for job_id in (pending, stale)]
+        await queue.stop()
+        return jobs_done
+
+    assert [job.status for job in run(scenario())] == [COMPLETE, COMPLETE]
@@ -0,0 +1,107 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import select
+
+from app import models
+from app.database import SessionLocal
+from app.pagination import NEXT_CURSOR_HEADER, page_rows, rows_after
+
+from .conftest import add_chat_session, run
+
+
+async def add_messages(chat_session_id: str, timestamps) -> None:
+    async with SessionLocal() as db:
+        db.add_all(
+            models.Message(id=str(uuid.uuid4()), content=f"message {idx}", sender="user",
+                           chat_session_id=chat_session_id, timestamp=timestamp)
+            for idx, timestamp in enumerate(timestamps)
+        )
+        await db.commit()
+
+
+async def list_pages(chat_session_id: str, limit: int):
+    """Walk every page like the messages endpoint; returns the pages of message ids"""
+    scope = models.Message.chat_session_id == chat_session_id
+    pages, cursor = [], None
+    async with SessionLocal() as db:
+        while True:
+            query = select(models.Message).where(scope)
+            after = await rows_after(db, models.Message, models.Message.timestamp, cursor, scope)
+            if after is not None:
+                query = query.where(after)
+            rows = (await db.scalars(query.order_by(
+                models.Message.timestamp.desc(), models.Message.id.desc()
+            ).limit(limit + 1))).all()
+            response = Response()
+            pages.append([row.id for row in page_rows(rows, limit, response)])
+            cursor = response.headers.get(NEXT_CURSOR_HEADER)
+            if cursor is None:
+                return pages
+
+
+async def ids_newest_first(chat_session_id: str):
+    async with SessionLocal() as db:
+        return list(await db.scalars(select(models.Message.id).where(
+            models.Message.chat_session_id == chat_session_id
+        ).order_by(models.Message.timestamp.desc(), models.Message.id.desc())))
+
+
+def test_pages_cover_every_row_once_in_order():
+    async def scenario():
+        session = await add_chat_session()
+        start = datetime(2026, 1, 1)
+        await add_messages(session.id, [start + timedelta(seconds=idx) for idx in range(7)])
+        return await list_pages(session.id, limit=3), await ids_newest_first(session.id)
+
+    pages, expected = run(scenario())
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [message_id for page in pages for message_id in page] == expected
+
+
+def test_rows_with_equal_timestamps_are_split_by_id():
+    async def scenario():
+        session = await add_chat_session()
+        # Same-instant rows, microseconds included, as client timestamps can produce
+        moment = datetime(2026, 1, 1, 12, 0, 0, 123456)
+        await add_messages(session.id, [moment] * 5 + [moment + timedelta(microseconds=1)])
+        return await list_pages(session.id, limit=2), await ids_newest_first(session.id)
+
+    pages, expected = run(scenario())
+    assert [message_id for page in pages for message_id in page] == expected
+    assert len(pages) == 3
+
+
+def test_last_full_page_sets_no_cursor():
+    async def scenario():
+        session = await add_chat_session()
+        await add_messages(session.id, [datetime(2026, 1, 1) + timedelta(seconds=idx) for idx in range(4)])
+        return await list_pages(session.id, limit=4)
+
+    assert [len(page) for page in run(scenario())] == [4]
+
+
+def test_no_cursor_means_no_condition():
+    async def scenario():
+        async with SessionLocal() as db:
+            return await rows_after(db, models.Message, models.Message.timestamp, None)
+
+    assert run(scenario()) is None
+
+
+@pytest.mark.parametrize("foreign", [False, True])
+def test_unknown_or_foreign_cursor_is_rejected(foreign):
+    async def scenario():
+        session = await add_chat_session()
+        other = await add_chat_session()
+        await add_messages(other.id, [datetime(2026, 1, 1)])
+        cursor = (await ids_newest_first(other.id))[0] if foreign else str(uuid.uuid4())
+        async with SessionLocal() as db:
+            await rows_after(db, models.Message, models.Message.timestamp, cursor,
+                             models.Message.chat_session_id == session.id)
+
+    with pytest.raises(HTTPException) as error:
+        run(scenario())
+    assert error.value.status_code == 400
@@ -44,6 +44,10 @@ interface ChatHistorySidebarProps {
   onNewChat: () => void;
   onDeleteSession: (sessionId: string) => void;
   onRenameSession: (sessionId: string, newTitle: string) => void;
+  // Older sessions are fetched a page at a time
+  hasMore?: boolean;
+  isLoadingMore?: boolean;
+  onLoadMore?: () => void;
 }
 
 const SidebarContainer = styled(Box)(({ theme }) => ({
@@ -344,6 +348,9 @@ export const ChatHistorySidebar: React.FC<ChatHistorySidebarProps> = ({
   onNewChat,
   onDeleteSession,
   onRenameSession,
+  hasMore = false,
+  isLoadingMore = false,
+  onLoadMore,
 }) => {
   const [menuAnchor, setMenuAnchor] = useState<null | HTMLElement>(null);
   const [selectedSession, setSelectedSession] = useState<ChatSession | null>(null);
@@ -714,6 +721,18 @@ export const ChatHistorySidebar: React.FC<ChatHistorySidebarProps> = ({
             ))}
           </>
         )}
+
+        {hasMore && onLoadMore && (
+          <Box sx={{ display: 'flex', justifyContent: 'center', py: 1 }}>
+            <Button
+              size="small"
+              onClick={onLoadMore}
+              disabled={isLoadingMore}
+            >
+              {isLoadingMore ? 'Loading...' : 'Load older conversations'}
+            </Button>
+          </Box>
+        )}
       </SessionList>
 
       <StyledMenu
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { 
   Box, 
   Drawer, 
@@ -12,6 +12,7 @@ import {
   MenuItem, 
   Tooltip,
   Paper,
+  Button,
   alpha
 } from '@mui/material';
 import { 
@@ -369,6 +370,13 @@ const Chat = () => {
   const [currentSessionId, setCurrentSessionId] = useState<string>('');
   const [sessions, setSessions] = useState<ChatSession[]>([]);
   const [messages, setMessages] = useState<Message[]>([]);
+  // Cursors for the next page of sessions and of older messages; null once everything is loaded
+  const [sessionsCursor, setSessionsCursor] = useState<string | null>(null);
+  const [messagesCursor, setMessagesCursor] = useState<string | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+  const selectedSessionRef = useRef('');
+  // Distance from the bottom to restore after older messages are prepended
+  const keepScrollFromBottom = useRef<number | null>(null);
   const { user, logout } = useAuth();
   
   // Profile menu state
@@ -401,8 +409,10 @@ const Chat = () => {
   useEffect(() => {
     const loadSessions = async () => {
       try {
-        const userSessions = await getChatSessions();
+        const page = await getChatSessions();
+        const userSessions = page.items;
         setSessions(userSessions);
+        setSessionsCursor(page.nextCursor);
         if (userSessions.length > 0) {
           await handleSessionSelect(userSessions[0].id);
         }
@@ -413,24 +423,67 @@ const Chat = () => {
     loadSessions();
   }, []);
 
-  // Scroll to bottom when messages change
+  // Scroll to bottom when messages change, or keep the view in place when older ones were prepended
   useEffect(() => {
     const messageList = document.getElementById('message-list');
     if (messageList) {
-      messageList.scrollTop = messageList.scrollHeight;
+      messageList.scrollTop = keepScrollFromBottom.current === null
+        ? messageList.scrollHeight
+        : messageList.scrollHeight - keepScrollFromBottom.current;
     }
+    keepScrollFromBottom.current = null;
   }, [messages]);
 
   const handleSessionSelect = async (sessionId: string) => {
     setCurrentSessionId(sessionId);
+    selectedSessionRef.current = sessionId;
+    setMessagesCursor(null);
     try {
-      const sessionMessages = await getMessages(sessionId);
-      setMessages(sessionMessages);
+      const page = await getMessages(sessionId);
+      if (selectedSessionRef.current !== sessionId) return;
+      setMessages(page.items);
+      setMessagesCursor(page.nextCursor);
     } catch (error) {
       console.error('Error loading messages:', error);
     }
   };
 
+  const handleLoadMoreSessions = async () => {
+    if (!sessionsCursor || isLoadingMore) return;
+    setIsLoadingMore(true);
+    try {
+      const page = await getChatSessions(sessionsCursor);
+      // Sessions created or touched since the first page may already be listed
+      setSessions(prev => [
+        ...prev,
+        ...page.items.filter(session => !prev.some(existing => existing.id === session.id))
+      ]);
+      setSessionsCursor(page.nextCursor);
+    } catch (error) {
+      console.error('Error loading chat sessions:', error);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
+  const handleLoadOlderMessages = async () => {
+    if (!messagesCursor || isLoadingMore) return;
+    const sessionId = currentSessionId;
+    setIsLoadingMore(true);
+    try {
+      const page = await getMessages(sessionId, messagesCursor);
+      if (selectedSessionRef.current !== sessionId) return;
+      const messageList = document.getElementById('message-list');
+      keepScrollFromBottom.current = messageList ? messageList.scrollHeight - messageList.scrollTop : null;
+      setMessages(prev => [...page.items, ...prev]);
+      setMessagesCursor(page.nextCursor);
+    } catch (error) {
+      console.error('Error loading messages:', error);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   const handleNewChat = async () => {
     if (!user) return;
     
@@ -443,7 +496,9 @@ const Chat = () => {
       });
       setSessions([newSession, ...sessions]);
       setCurrentSessionId(newSession.id);
+      selectedSessionRef.current = newSession.id;
       setMessages([]);
+      setMessagesCursor(null);
     } catch (error) {
       console.error('Error creating new chat:', error);
     }
@@ -459,7 +514,9 @@ const Chat = () => {
           await handleSessionSelect(remainingSessions[0].id);
         } else {
           setCurrentSessionId('');
+          selectedSessionRef.current = '';
           setMessages([]);
+          setMessagesCursor(null);
         }
       }
     } catch (error) {
@@ -664,6 +721,9 @@ const Chat = () => {
             }}
             onDeleteSession={handleDeleteSession}
             onRenameSession={handleRenameSession}
+            hasMore={sessionsCursor !== null}
+            isLoadingMore={isLoadingMore}
+            onLoadMore={handleLoadMoreSessions}
           />
         </Drawer>
       ) : (
@@ -675,6 +735,9 @@ const Chat = () => {
             onNewChat={handleNewChat}
             onDeleteSession={handleDeleteSession}
             onRenameSession={handleRenameSession}
+            hasMore={sessionsCursor !== null}
+            isLoadingMore={isLoadingMore}
+            onLoadMore={handleLoadMoreSessions}
           />
         </Sidebar>
       )}
@@ -794,6 +857,17 @@ const Chat = () => {
           // Normal layout when there are messages
           <>
             <MessageList id="message-list">
+              {messagesCursor && (
+                <Button
+                  size="small"
+                  onClick={handleLoadOlderMessages}
+                  disabled={isLoadingMore}
+                  sx={{ alignSelf: 'center' }}
+                >
+                  {isLoadingMore ? 'Loading...' : 'Load earlier messages'}
+                </Button>
+              )}
+
               {messages.map((message) => (
                 <ChatMessage key={message.id} message={message} />
               ))}
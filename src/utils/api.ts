@@ -18,45 +18,61 @@ const getAuthHeaderForFileUpload = (): HeadersInit => {
     : {};
 };
 
-// Get all chat sessions for a user
-export const getChatSessions = async (): Promise<ChatSession[]> => {
-  const response = await fetch(`${API_BASE_URL}/chat-sessions`, {
+// One page of a list endpoint; nextCursor fetches the page after it, null on the last page
+export interface Page<T> {
+  items: T[];
+  nextCursor: string | null;
+}
+
+// The list endpoints return one page at a time and put the next page's cursor in X-Next-Cursor
+const fetchPage = async (url: string, cursor: string | null | undefined, errorMessage: string): Promise<Page<any>> => {
+  const separator = url.includes('?') ? '&' : '?';
+  const pageUrl = cursor ? `${url}${separator}cursor=${encodeURIComponent(cursor)}` : url;
+  const response = await fetch(pageUrl, {
     headers: getAuthHeader()
   });
-  
+
   if (!response.ok) {
     if (response.status === 401) {
       throw new Error('Unauthorized - Please login again');
     }
-    throw new Error('Failed to fetch chat sessions');
+    throw new Error(errorMessage);
   }
-  
-  const sessions = await response.json();
-  return sessions.map((session: any) => ({
-    ...session,
-    createdAt: new Date(session.createdAt),
-    updatedAt: new Date(session.updatedAt)
-  }));
+
+  return {
+    items: await response.json(),
+    nextCursor: response.headers.get('X-Next-Cursor')
+  };
 };
 
-// Get messages for a specific chat session
-export const getMessages = async (chatSessionId: string): Promise<Message[]> => {
-  const response = await fetch(`${API_BASE_URL}/messages?chat_session_id=${chatSessionId}`, {
-    headers: getAuthHeader()
-  });
-  
-  if (!response.ok) {
-    if (response.status === 401) {
-      throw new Error('Unauthorized - Please login again');
-    }
-    throw new Error('Failed to fetch messages');
-  }
-  
-  const messages = await response.json();
-  return messages.map((message: any) => ({
-    ...message,
-    timestamp: new Date(message.timestamp)
-  }));
+// Get a page of a user's chat sessions, most recently updated first
+export const getChatSessions = async (cursor?: string | null): Promise<Page<ChatSession>> => {
+  const page = await fetchPage(`${API_BASE_URL}/chat-sessions`, cursor, 'Failed to fetch chat sessions');
+  return {
+    ...page,
+    items: page.items.map((session: any) => ({
+      ...session,
+      createdAt: new Date(session.createdAt),
+      updatedAt: new Date(session.updatedAt)
+    }))
+  };
+};
+
+// Get a page of a chat session's messages; the first page is the latest, and
+// each page is chronological with its cursor leading to the older messages
+export const getMessages = async (chatSessionId: string, cursor?: string | null): Promise<Page<Message>> => {
+  const page = await fetchPage(
+    `${API_BASE_URL}/messages?chat_session_id=${chatSessionId}`,
+    cursor,
+    'Failed to fetch messages'
+  );
+  return {
+    ...page,
+    items: page.items.map((message: any) => ({
+      ...message,
+      timestamp: new Date(message.timestamp)
+    }))
+  };
 };
 
 // Create a new chat session
@@ -100,6 +116,11 @@ export const addMessage = async (message: Message): Promise<Message> => {
   }
   
   const newMessage = await response.json();
+
+  // User messages are answered in the background; wait for the answer job
+  if (newMessage.pendingResponseId) {
+    newMessage.aiResponse = await waitForAIResponse(newMessage.pendingResponseId);
+  }
   
   // Check if the response includes an aiResponse and return both the user message and AI message
   if (newMessage.aiResponse) {
@@ -119,6 +140,41 @@ export const addMessage = async (message: Message): Promise<Message> => {
   };
 };
 
+// Give up on an answer job after this long; the question stays saved either way
+const AI_RESPONSE_TIMEOUT_MS = 5 * 60 * 1000;
+
+// Long-poll an answer job until it finishes; resolves to undefined if generation failed or timed out
+const waitForAIResponse = async (jobId: string): Promise<Message['aiResponse']> => {
+  const deadline = Date.now() + AI_RESPONSE_TIMEOUT_MS;
+  for (;;) {
+    const remaining = deadline - Date.now();
+    if (remaining <= 0) {
+      console.error('AI response generation timed out:', jobId);
+      return undefined;
+    }
+    const wait = Math.max(1, Math.min(30, Math.ceil(remaining / 1000)));
+    const response = await fetch(`${API_BASE_URL}/jobs/${jobId}?wait=${wait}`, {
+      headers: getAuthHeader()
+    });
+
+    if (!response.ok) {
+      if (response.status === 401) {
+        throw new Error('Unauthorized - Please login again');
+      }
+      throw new Error('Failed to fetch AI response');
+    }
+
+    const job = await response.json();
+    if (job.status === 'complete') {
+      return job.aiResponse;
+    }
+    if (job.status === 'failed') {
+      console.error('AI response generation failed:', job.error);
+      return undefined;
+    }
+  }
+};
+
 // Update a chat session's title
 export const updateChatSessionTitle = async (
   sessionId: string,